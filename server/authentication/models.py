@@ -2,6 +2,11 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils import timezone
 
+from pairpad_server.fulltext import FullTextIndex
+
+# Full-text index over profile text, created by migration 0002
+PROFILE_SEARCH = FullTextIndex('auth_user', ['first_name', 'last_name', 'occupation', 'bio', 'interests'])
+
 class User(AbstractUser):
     ROLE_CHOICES = [
         ('student', 'Student'),
@@ -1,3 +1,82 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from pairpad_server.fulltext import check_full_text_triggers
+from .models import PROFILE_SEARCH
+
+User = get_user_model()
+
+
+class ProfileSearchTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user(
+            username='viewer', email='viewer@example.com', bio='I love hiking and climbing'
+        )
+        self.hiker = User.objects.create_user(
+            username='hiker', email='hiker@example.com',
+            bio='Weekend hiker. Hiking, hikes and more hiking.', interests='trail running'
+        )
+        self.cook = User.objects.create_user(
+            username='cook', email='cook@example.com', occupation='Chef', interests='cooking, hiking'
+        )
+        self.quiet = User.objects.create_user(username='quiet', email='quiet@example.com', bio='Reading and tea')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def search(self, query, **params):
+        return self.client.get('/api/auth/users/search/', {'q': query, **params}).data
+
+    def test_matches_are_ranked_and_exclude_the_viewer(self):
+        response = self.search('hiking')
+        self.assertEqual([user['username'] for user in response['results']], ['hiker', 'cook'])
+        self.assertEqual(response['count'], 2)
+        self.assertGreater(response['results'][0]['relevance'], response['results'][1]['relevance'])
+
+        # Every word must match, and the last may be a prefix
+        self.assertEqual([user['username'] for user in self.search('chef hik')['results']], ['cook'])
+        self.assertEqual(self.search('hiking', limit=1)['count'], 2)
+
+    def test_filters_apply_before_the_result_limit(self):
+        for index in range(3):
+            User.objects.create_user(
+                username=f'inactive{index}', email=f'inactive{index}@example.com',
+                bio='Hiking hiking hiking', is_active=False
+            )
+        searchable = User.objects.filter(is_active=True).exclude(id=self.hiker.id)
+        self.assertEqual([user_id for user_id, _rank in PROFILE_SEARCH.search('hiking', limit=1, within=searchable)], [self.cook.id])
+
+        response = self.search('hiking')
+        self.assertEqual((response['count'], response['count_capped']), (2, False))
+
+    def test_index_follows_profile_changes(self):
+        self.quiet.bio = 'Avid hiker'
+        self.quiet.save()
+        self.cook.delete()
+        self.assertEqual(sorted(user['username'] for user in self.search('hiker')['results']), ['hiker', 'quiet'])
+
+    def test_search_syntax_in_queries_is_treated_as_text(self):
+        self.assertEqual([user_id for user_id, _rank in PROFILE_SEARCH.search('"tea*" (')], [self.quiet.id])
+        self.assertEqual(self.search('  ')['results'], [])
+
+
+class FullTextTriggerTests(TransactionTestCase):
+    # The SQLite schema editor can't run inside a test transaction
+
+    def search(self, query):
+        return [user_id for user_id, _rank in PROFILE_SEARCH.search(query)]
+
+    def test_dropped_triggers_are_reported_and_restored(self):
+        self.assertEqual(check_full_text_triggers(databases=['default']), [])
+        with connection.schema_editor() as schema_editor:
+            schema_editor.execute(f'DROP TRIGGER {PROFILE_SEARCH.name}_update')
+        self.assertEqual([error.id for error in check_full_text_triggers(databases=['default'])], ['fulltext.E001'])
+
+        user = User.objects.create_user(username='quiet', email='quiet@example.com', bio='Reading and tea')
+        user.bio = 'Avid hiker'
+        user.save()
+        with connection.schema_editor() as schema_editor:
+            PROFILE_SEARCH.restore_triggers(schema_editor)
+        self.assertEqual(check_full_text_triggers(databases=['default']), [])
+        self.assertEqual(self.search('hiker'), [user.id])
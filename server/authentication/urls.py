@@ -12,6 +12,7 @@ urlpatterns = [
 
     # User profile endpoints
     path('profile/', views.UserProfileView.as_view(), name='user_profile'),
+    path('users/search/', views.search_users, name='search_users'),
     path('users/<int:pk>/', views.PublicUserProfileView.as_view(), name='public_user_profile'),
 
     # Onboarding progress endpoints
@@ -12,7 +12,8 @@ from .serializers import (
     OnboardingProgressSerializer,
     OnboardingProgressUpdateSerializer
 )
-from .models import OnboardingProgress
+from pairpad_server.fulltext import SEARCH_RESULT_LIMIT
+from .models import OnboardingProgress, PROFILE_SEARCH
 
 User = get_user_model()
 
@@ -67,6 +68,35 @@ class PublicUserProfileView(generics.RetrieveAPIView):
     queryset = User.objects.all()
     lookup_field = 'pk'
 
+USER_SEARCH_PAGE_SIZE = 20
+MAX_USER_SEARCH_PAGE_SIZE = 50
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def search_users(request):
+    """
+    Search user profiles by name, occupation, bio and interests, best match first
+    """
+    try:
+        limit = min(int(request.GET.get('limit', USER_SEARCH_PAGE_SIZE)), MAX_USER_SEARCH_PAGE_SIZE)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    searchable = User.objects.filter(is_active=True).exclude(id=request.user.id)
+    relevance = dict(PROFILE_SEARCH.search(request.GET.get('q', ''), within=searchable))
+    ranked = sorted(relevance, key=lambda user_id: (-relevance[user_id], user_id))[:limit]
+    users = User.objects.select_related('personality_profile').in_bulk(ranked)
+
+    return Response({
+        'results': [
+            dict(UserSerializer(users[user_id]).data, relevance=relevance[user_id])
+            for user_id in ranked if user_id in users
+        ],
+        'count': len(relevance),
+        # count only covers the best SEARCH_RESULT_LIMIT matches
+        'count_capped': len(relevance) >= SEARCH_RESULT_LIMIT,
+    }, status=status.HTTP_200_OK)
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def logout_view(request):
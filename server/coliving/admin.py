@@ -1,11 +1,18 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from .dashboard import invalidate_dashboard
+from .group import remove_member
 from .models import (
     LivingSpace, LivingSpaceMember, Task, Expense,
     ExpenseSplit, HouseRules, Room, LivingSpaceImage,
     RoomApplication, LivingSpaceReview
 )
 
+def invalidate_dashboards(living_space_ids):
+    """Invalidate shared dashboards after a bulk update, which skips the signals that would"""
+    for living_space_id in set(living_space_ids):
+        invalidate_dashboard(living_space_id)
+
 class LivingSpaceMemberInline(admin.TabularInline):
     model = LivingSpaceMember
     extra = 0
@@ -53,11 +60,13 @@ class LivingSpaceAdmin(admin.ModelAdmin):
 
     def activate_spaces(self, request, queryset):
         updated = queryset.update(is_active=True)
+        invalidate_dashboards(queryset.values_list('id', flat=True))
         self.message_user(request, f'{updated} living spaces were activated.')
     activate_spaces.short_description = "Activate selected living spaces"
 
     def deactivate_spaces(self, request, queryset):
         updated = queryset.update(is_active=False)
+        invalidate_dashboards(queryset.values_list('id', flat=True))
         self.message_user(request, f'{updated} living spaces were deactivated.')
     deactivate_spaces.short_description = "Deactivate selected living spaces"
 
@@ -99,7 +108,11 @@ class LivingSpaceMemberAdmin(admin.ModelAdmin):
 
     def remove_members(self, request, queryset):
         from django.utils import timezone
+        memberships = list(queryset.values_list('living_space_id', 'user_id'))
         updated = queryset.update(is_active=False, left_at=timezone.now())
+        # update() skips the signals that keep group compatibility in sync
+        for living_space_id, user_id in memberships:
+            remove_member(living_space_id, user_id)
         self.message_user(request, f'{updated} members were removed.')
     remove_members.short_description = "Remove selected members"
 
@@ -149,16 +162,19 @@ class TaskAdmin(admin.ModelAdmin):
     def mark_completed(self, request, queryset):
         from django.utils import timezone
         updated = queryset.update(status='completed', completed_at=timezone.now())
+        invalidate_dashboards(queryset.values_list('living_space_id', flat=True))
         self.message_user(request, f'{updated} tasks were marked as completed.')
     mark_completed.short_description = "Mark selected tasks as completed"
 
     def mark_pending(self, request, queryset):
         updated = queryset.update(status='pending', completed_at=None)
+        invalidate_dashboards(queryset.values_list('living_space_id', flat=True))
         self.message_user(request, f'{updated} tasks were marked as pending.')
     mark_pending.short_description = "Mark selected tasks as pending"
 
     def mark_overdue(self, request, queryset):
         updated = queryset.update(status='overdue')
+        invalidate_dashboards(queryset.values_list('living_space_id', flat=True))
         self.message_user(request, f'{updated} tasks were marked as overdue.')
     mark_overdue.short_description = "Mark selected tasks as overdue"
 
@@ -213,6 +229,7 @@ class ExpenseAdmin(admin.ModelAdmin):
         for expense in queryset:
             splits_updated = expense.splits.update(is_settled=True)
             total_updated += splits_updated
+        invalidate_dashboards(expense.living_space_id for expense in queryset)
         self.message_user(request, f'{total_updated} expense splits were marked as settled.')
     mark_all_splits_settled.short_description = "Mark all splits as settled for selected expenses"
 
@@ -244,11 +261,13 @@ class ExpenseSplitAdmin(admin.ModelAdmin):
     def mark_settled(self, request, queryset):
         from django.utils import timezone
         updated = queryset.update(is_settled=True, paid_at=timezone.now())
+        invalidate_dashboards(queryset.values_list('expense__living_space_id', flat=True))
         self.message_user(request, f'{updated} expense splits were marked as settled.')
     mark_settled.short_description = "Mark selected splits as settled"
 
     def mark_unsettled(self, request, queryset):
         updated = queryset.update(is_settled=False, paid_at=None)
+        invalidate_dashboards(queryset.values_list('expense__living_space_id', flat=True))
         self.message_user(request, f'{updated} expense splits were marked as unsettled.')
     mark_unsettled.short_description = "Mark selected splits as unsettled"
 
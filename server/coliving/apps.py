@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ColivingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'coliving'
+
+    def ready(self):
+        # Register dashboard snapshot invalidation handlers
+        from . import signals
@@ -0,0 +1,128 @@
+"""
+Cached shared-dashboard snapshots.
+
+Everything on a living space's shared dashboard except the viewer's own
+notifications is assembled into one snapshot with a fixed number of
+prefetching queries and cached. Snapshot keys include a per-space version
+token; ``coliving.signals`` drops the token whenever a model shown on the
+dashboard changes, so the next load builds a fresh snapshot under a new
+version while stale ones simply expire. The token is dropped once the
+change commits, so that a load racing with the transaction cannot cache
+the old data under the new version.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import (
+    Bill, BillSplit, CalendarEvent, Expense, ExpenseSplit, HouseRules,
+    ShoppingList, ShoppingListItem, Task
+)
+from .serializers import (
+    BillSerializer, CalendarEventSerializer, ExpenseSerializer,
+    ShoppingListSerializer, TaskSerializer
+)
+
+DASHBOARD_CACHE_TIMEOUT = 300  # seconds; also bounds how long past events linger
+DASHBOARD_ITEM_LIMIT = 10
+
+
+def _version_key(living_space_id):
+    return f'coliving:dashboard-version:{living_space_id}'
+
+
+def dashboard_version(living_space_id):
+    """Return the current snapshot version token of a living space"""
+    key = _version_key(living_space_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def invalidate_dashboard(living_space_id):
+    """Make the next dashboard load after the current transaction commits rebuild its snapshot"""
+    transaction.on_commit(lambda: cache.delete(_version_key(living_space_id)), robust=True)
+
+
+def build_dashboard_snapshot(living_space):
+    """Assemble the shared part of a living space's dashboard"""
+    tasks = Task.objects.filter(
+        living_space=living_space
+    ).select_related('assigned_to', 'created_by').order_by('due_date')[:DASHBOARD_ITEM_LIMIT]
+
+    expenses = Expense.objects.filter(
+        living_space=living_space
+    ).select_related('paid_by').prefetch_related(
+        'participants',
+        Prefetch('splits', queryset=ExpenseSplit.objects.select_related('user'))
+    ).order_by('-expense_date')[:DASHBOARD_ITEM_LIMIT]
+
+    shopping_lists = ShoppingList.objects.filter(
+        living_space=living_space
+    ).select_related('created_by').prefetch_related(
+        Prefetch('items', queryset=ShoppingListItem.objects.select_related('added_by', 'purchased_by'))
+    )
+
+    bills = Bill.objects.filter(
+        living_space=living_space,
+        status__in=['pending', 'overdue']
+    ).select_related('created_by', 'paid_by').prefetch_related(
+        'participants',
+        Prefetch('splits', queryset=BillSplit.objects.select_related('user'))
+    ).order_by('due_date')
+
+    upcoming_events = CalendarEvent.objects.filter(
+        living_space=living_space,
+        start_datetime__gte=timezone.now()
+    ).select_related('created_by').order_by('start_datetime')[:DASHBOARD_ITEM_LIMIT]
+
+    house_rules = HouseRules.objects.filter(living_space=living_space).first()
+    house_rules_data = {
+        'id': house_rules.id,
+        'quiet_hours_start': house_rules.quiet_hours_start,
+        'quiet_hours_end': house_rules.quiet_hours_end,
+        'guests_allowed': house_rules.overnight_guests_allowed,
+        'max_guests': house_rules.max_consecutive_guest_nights,
+        'smoking_allowed': house_rules.smoking_allowed,
+        'pets_allowed': house_rules.pets_allowed,
+        'custom_rules': house_rules.custom_rules,
+        'created_at': house_rules.created_at,
+        'updated_at': house_rules.updated_at,
+    } if house_rules else None
+
+    return {
+        'living_space': {
+            'id': living_space.id,
+            'name': living_space.name,
+            'description': living_space.description,
+        },
+        'tasks': list(TaskSerializer(tasks, many=True).data),
+        'expenses': list(ExpenseSerializer(expenses, many=True).data),
+        'shopping_lists': list(ShoppingListSerializer(shopping_lists, many=True).data),
+        'bills': list(BillSerializer(bills, many=True).data),
+        'calendar_events': list(CalendarEventSerializer(upcoming_events, many=True).data),
+        'house_rules': house_rules_data,
+    }
+
+
+def get_dashboard_snapshot(living_space):
+    """Return the cached dashboard snapshot of a living space, building it if needed"""
+    key = f'coliving:dashboard:{living_space.id}:{dashboard_version(living_space.id)}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_dashboard_snapshot(living_space)
+        cache.set(key, snapshot, DASHBOARD_CACHE_TIMEOUT)
+
+    # Events that started since the snapshot was built are no longer upcoming
+    now = timezone.now()
+    return dict(snapshot, calendar_events=[
+        event for event in snapshot['calendar_events']
+        if parse_datetime(event['start_datetime']) >= now
+    ])
@@ -0,0 +1,96 @@
+"""
+Grid-cell geospatial search.
+
+Every living space with coordinates is assigned the integer id of the
+``GRID_CELL_DEGREES`` square it falls in (``LivingSpace.grid_cell``,
+indexed). Cells are numbered row by row, so each row of a bounding box is
+one contiguous range of ids. A radius search therefore turns into a few
+indexed range lookups, and exact haversine distances are only computed for
+the spaces those ranges return.
+"""
+import math
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0
+GRID_CELL_DEGREES = 0.1  # about 11 km of latitude
+GRID_ROWS = round(180 / GRID_CELL_DEGREES)
+GRID_COLUMNS = round(360 / GRID_CELL_DEGREES)
+DEFAULT_RADIUS_KM = 50  # as UserPreferences.max_distance_km
+MAX_RADIUS_KM = 500
+
+
+def _row(latitude):
+    return min(int((float(latitude) + 90) / GRID_CELL_DEGREES), GRID_ROWS - 1)
+
+
+def _column(longitude):
+    return int((float(longitude) + 180) / GRID_CELL_DEGREES) % GRID_COLUMNS
+
+
+def grid_cell(latitude, longitude):
+    """Return the grid cell id of a point, or None without coordinates"""
+    if latitude is None or longitude is None:
+        return None
+    return _row(latitude) * GRID_COLUMNS + _column(longitude)
+
+
+def haversine_km(latitude1, longitude1, latitude2, longitude2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(longitude2 - longitude1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Return (min_lat, max_lat, min_lng, max_lng) around a circle; longitudes may wrap"""
+    d_latitude = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_latitude, max_latitude = max(latitude - d_latitude, -90.0), min(latitude + d_latitude, 90.0)
+
+    # Near the poles the circle covers every longitude
+    widest = max(abs(min_latitude), abs(max_latitude))
+    if widest >= 89.9:
+        return min_latitude, max_latitude, -180.0, 180.0
+    d_longitude = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(widest))))
+    if d_longitude >= 180:
+        return min_latitude, max_latitude, -180.0, 180.0
+    return min_latitude, max_latitude, longitude - d_longitude, longitude + d_longitude
+
+
+def _column_ranges(min_longitude, max_longitude):
+    if max_longitude - min_longitude >= 360:
+        return [(0, GRID_COLUMNS - 1)]
+    first, last = _column(min_longitude), _column(max_longitude)
+    if first <= last:
+        return [(first, last)]
+    # The box crosses the antimeridian
+    return [(first, GRID_COLUMNS - 1), (0, last)]
+
+
+def within_box(latitude, longitude, radius_km, field='grid_cell'):
+    """Return a Q matching grid cells that overlap the box around a circle"""
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, radius_km)
+    columns = _column_ranges(min_longitude, max_longitude)
+
+    first_row, last_row = _row(min_latitude), _row(max_latitude)
+    if columns == [(0, GRID_COLUMNS - 1)]:
+        # Whole rows are one contiguous range
+        return Q(**{f'{field}__range': (first_row * GRID_COLUMNS, (last_row + 1) * GRID_COLUMNS - 1)})
+
+    condition = Q()
+    for row in range(first_row, last_row + 1):
+        for first, last in columns:
+            condition |= Q(**{f'{field}__range': (row * GRID_COLUMNS + first, row * GRID_COLUMNS + last)})
+    return condition
+
+
+def distances_within(points, latitude, longitude, radius_km):
+    """Return ``{id: distance_km}`` for the ``(id, latitude, longitude)`` points inside the radius"""
+    distances = {}
+    for point_id, point_latitude, point_longitude in points:
+        distance = haversine_km(latitude, longitude, float(point_latitude), float(point_longitude))
+        if distance <= radius_km:
+            distances[point_id] = distance
+    return distances
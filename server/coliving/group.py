@@ -0,0 +1,185 @@
+"""
+Group compatibility of living spaces.
+
+Each space's ``LivingSpaceCompatibility`` row holds the compatibility of
+every active member with every other one, scored with the matching engine.
+It is kept up to date incrementally by ``coliving.signals``: a member
+joining adds their row and column, leaving removes them, and a change to a
+member's profile or scored user fields re-scores the member's row and
+column in every space they live in. Matrices are built on first read and
+rebuilt once their ``SCORING_VERSION`` is out of date.
+
+Updates encode the affected members' profiles straight from the database
+rather than from ``matching.pool``, which may not have seen the change that
+triggered them yet.
+
+Cohesion metrics are read straight from the matrix. Applicants are scored
+through the score cache like the space listings, so an applicant's average
+is the one shown next to the space.
+"""
+import numpy as np
+from django.db import transaction
+
+from matching.scoring import SCORING_VERSION, ProfileMatrix, profile_rows, score_matrix
+from personality.models import PersonalityProfile
+from .models import LivingSpaceCompatibility, LivingSpaceMember, _compatibility_with
+
+
+def _member_profiles(user_ids):
+    """Encode the current profiles of ``user_ids``; users without one are left out"""
+    return ProfileMatrix(profile_rows(PersonalityProfile.objects.filter(user_id__in=list(user_ids))))
+
+
+def _score_row(profiles, viewer_id, candidate_ids):
+    """Return ``viewer_id``'s compatibility with each of ``candidate_ids``, all in ``profiles``"""
+    if not candidate_ids:
+        return []
+    positions = profiles.positions
+    viewer = profiles.take([positions[viewer_id]])
+    candidates = profiles.take([positions[candidate_id] for candidate_id in candidate_ids])
+    return score_matrix(viewer, candidates).compatibility.tolist()
+
+
+def _active_member_ids(living_space_id):
+    return list(LivingSpaceMember.objects.filter(
+        living_space_id=living_space_id, is_active=True
+    ).order_by('user_id').values_list('user_id', flat=True))
+
+
+def build_group(living_space_id):
+    """Score every pair of active members of a living space and store the matrix"""
+    member_ids = _active_member_ids(living_space_id)
+    profiles = _member_profiles(member_ids)
+    member_ids = [user_id for user_id in member_ids if user_id in profiles.positions]
+    scores = []
+    for index, member_id in enumerate(member_ids):
+        row = _score_row(profiles, member_id, member_ids)
+        row[index] = None
+        scores.append(row)
+
+    group, _ = LivingSpaceCompatibility.objects.update_or_create(living_space_id=living_space_id, defaults={
+        'member_ids': member_ids,
+        'scores': scores,
+        'scoring_version': SCORING_VERSION,
+    })
+    return group
+
+
+def group_compatibility(living_space_id):
+    """Return the up-to-date ``LivingSpaceCompatibility`` of a living space"""
+    group = LivingSpaceCompatibility.objects.filter(living_space_id=living_space_id).first()
+    if group is None or group.scoring_version != SCORING_VERSION:
+        group = build_group(living_space_id)
+    return group
+
+
+def _drop(group, user_id):
+    if user_id in group.member_ids:
+        index = group.member_ids.index(user_id)
+        del group.member_ids[index]
+        del group.scores[index]
+        for row in group.scores:
+            del row[index]
+
+
+def _place(group, user_id):
+    """Add or re-score ``user_id``'s row and column"""
+    _drop(group, user_id)
+    profiles = _member_profiles(group.member_ids + [user_id])
+    for member_id in [member_id for member_id in group.member_ids if member_id not in profiles.positions]:
+        _drop(group, member_id)  # Profile deleted since the member was scored
+    if user_id not in profiles.positions:
+        return  # No personality profile to score
+    others = group.member_ids
+    for row, other_id in zip(group.scores, others):
+        row.append(_score_row(profiles, other_id, [user_id])[0])
+    group.member_ids = others + [user_id]
+    group.scores.append(_score_row(profiles, user_id, others) + [None])
+
+
+def _update(living_space_id, change):
+    with transaction.atomic():
+        group = LivingSpaceCompatibility.objects.select_for_update().filter(living_space_id=living_space_id).first()
+        if group is None:
+            return  # Built on first read
+        if group.scoring_version != SCORING_VERSION:
+            build_group(living_space_id)
+            return
+        change(group)
+        group.save(update_fields=['member_ids', 'scores', 'updated_at'])
+
+
+def add_member(living_space_id, user_id):
+    """Add a member who joined a living space to its matrix"""
+    _update(living_space_id, lambda group: _place(group, user_id))
+
+
+def remove_member(living_space_id, user_id):
+    """Remove a member who left a living space from its matrix"""
+    _update(living_space_id, lambda group: _drop(group, user_id))
+
+
+def rescore_member(user_id):
+    """Re-score a member whose profile or scored fields changed in every living space they are active in"""
+    space_ids = list(LivingSpaceMember.objects.filter(
+        user_id=user_id, is_active=True
+    ).values_list('living_space_id', flat=True))
+    if not space_ids:
+        return
+    for living_space_id in space_ids:
+        _update(living_space_id, lambda group: _place(group, user_id))
+
+
+def group_cohesion(living_space_id):
+    """
+    Return cohesion metrics of a living space's members.
+
+    Pairs are scored as the mean of both members' scores of each other.
+    ``members`` lists each member's average with the others, least
+    compatible first.
+    """
+    group = group_compatibility(living_space_id)
+    member_ids = group.member_ids
+    if len(member_ids) < 2:
+        return {'member_count': len(member_ids), 'average_compatibility': None, 'lowest_pair': None, 'members': []}
+
+    scores = np.array(group.scores, dtype=np.float64)  # None on the diagonal becomes NaN
+    pairs = (scores + scores.T) / 2
+    first, second = np.triu_indices(len(member_ids), k=1)
+    lowest = int(np.argmin(pairs[first, second]))
+    averages = np.nanmean(pairs, axis=1)
+    return {
+        'member_count': len(member_ids),
+        'average_compatibility': round(float(pairs[first, second].mean()), 1),
+        'lowest_pair': {
+            'user_ids': [member_ids[first[lowest]], member_ids[second[lowest]]],
+            'compatibility': round(float(pairs[first[lowest], second[lowest]]), 1),
+        },
+        'members': [
+            {'user_id': member_ids[index], 'average_compatibility': round(float(averages[index]), 1)}
+            for index in np.argsort(averages, kind='stable')
+        ],
+    }
+
+
+def applicant_compatibility(user, living_space_id):
+    """
+    Score ``user`` against every other active member of a living space.
+
+    Returns ``{'average_compatibility': ..., 'member_scores': {member_id:
+    score}}``. Scores come from the score cache, as in
+    ``space_compatibility_scores``, and the average is 0 when ``user`` has
+    no personality profile and 50 when there is nobody to compare with, as
+    in ``room_compatibility_scores``.
+    """
+    if not hasattr(user, 'personality_profile') or not user.personality_profile:
+        return {'average_compatibility': 0, 'member_scores': {}}
+
+    member_ids = [member_id for member_id in _active_member_ids(living_space_id) if member_id != user.id]
+    member_scores = _compatibility_with(user, member_ids)
+    # Keep the members in id order
+    member_scores = {member_id: member_scores[member_id] for member_id in member_ids if member_id in member_scores}
+    return {
+        'average_compatibility': sum(member_scores.values()) / len(member_scores) if member_scores else 50,
+        'member_scores': member_scores,
+    }
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copy of coliving.geo's grid as of this migration, so that later
+# changes to the live grid can't change what it does
+GRID_CELL_DEGREES = 0.1
+GRID_ROWS = round(180 / GRID_CELL_DEGREES)
+GRID_COLUMNS = round(360 / GRID_CELL_DEGREES)
+
+
+def grid_cell(latitude, longitude):
+    row = min(int((float(latitude) + 90) / GRID_CELL_DEGREES), GRID_ROWS - 1)
+    column = int((float(longitude) + 180) / GRID_CELL_DEGREES) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+def assign_grid_cells(apps, schema_editor):
+    LivingSpace = apps.get_model('coliving', 'LivingSpace')
+    spaces = list(LivingSpace.objects.filter(
+        latitude__isnull=False, longitude__isnull=False
+    ).only('id', 'latitude', 'longitude'))
+    for space in spaces:
+        space.grid_cell = grid_cell(space.latitude, space.longitude)
+    LivingSpace.objects.bulk_update(spaces, ['grid_cell'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coliving', '0006_bill_split_type_billsplit_bill_participants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='livingspace',
+            name='grid_cell',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='livingspace',
+            index=models.Index(fields=['grid_cell', 'is_public'], name='coliving_li_grid_ce_063e7b_idx'),
+        ),
+        migrations.RunPython(assign_grid_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:02
+
+from django.db import migrations
+
+# Frozen copy of what pairpad_server.fulltext.FullTextIndex created as of
+# this migration, so that later changes to it can't change what this does
+TABLE = 'coliving_livingspace'
+FIELDS = ['name', 'description', 'address', 'city']
+INDEX = f'{TABLE}_fts'
+TRIGGERS = [f'{INDEX}_{trigger}' for trigger in ('insert', 'delete', 'update')]
+
+
+def _sqlite_statements():
+    columns = ', '.join(FIELDS)
+    new_values = ', '.join(f'new.{field}' for field in FIELDS)
+    old_values = ', '.join(f'old.{field}' for field in FIELDS)
+    remove = f"INSERT INTO {INDEX}({INDEX}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    add = f'INSERT INTO {INDEX}(rowid, {columns}) VALUES (new.id, {new_values});'
+    return [
+        f"CREATE VIRTUAL TABLE {INDEX} USING fts5({columns}, content='{TABLE}', "
+        f"content_rowid='id', tokenize='porter unicode61')",
+        f'CREATE TRIGGER {TRIGGERS[0]} AFTER INSERT ON {TABLE} BEGIN {add} END',
+        f'CREATE TRIGGER {TRIGGERS[1]} AFTER DELETE ON {TABLE} BEGIN {remove} END',
+        f'CREATE TRIGGER {TRIGGERS[2]} AFTER UPDATE OF {columns} ON {TABLE} BEGIN {remove} {add} END',
+        f"INSERT INTO {INDEX}({INDEX}) VALUES ('rebuild')",
+    ]
+
+
+def _postgresql_statements():
+    columns = " || ' ' || ".join(f"coalesce({field}, '')" for field in FIELDS)
+    return [f"CREATE INDEX {INDEX} ON {TABLE} USING GIN ((to_tsvector('english', {columns})))"]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = _sqlite_statements()
+    elif vendor == 'postgresql':
+        statements = _postgresql_statements()
+    else:
+        statements = []
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for trigger in TRIGGERS:
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {INDEX}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coliving', '0007_livingspace_grid_cell'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
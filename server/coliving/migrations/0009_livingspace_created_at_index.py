@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coliving', '0008_livingspace_fulltext'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='livingspace',
+            index=models.Index(fields=['created_at', 'id'], name='coliving_li_created_ca2058_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coliving', '0009_livingspace_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LivingSpaceCompatibility',
+            fields=[
+                ('living_space', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='group_compatibility', serialize=False, to='coliving.livingspace')),
+                ('member_ids', models.JSONField(default=list)),
+                ('scores', models.JSONField(default=list)),
+                ('scoring_version', models.PositiveSmallIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -3,8 +3,15 @@ from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
+from matching.scoring import SCORING_VERSION
+from pairpad_server.fulltext import FullTextIndex
+from .geo import grid_cell
+
 User = get_user_model()
 
+# Full-text index over listing text, created by migration 0008
+LIVING_SPACE_SEARCH = FullTextIndex('coliving_livingspace', ['name', 'description', 'address', 'city'])
+
 class LivingSpace(models.Model):
     SPACE_TYPES = [
         ('apartment', 'Apartment'),
@@ -26,6 +33,8 @@ class LivingSpace(models.Model):
     country = models.CharField(max_length=50, default='United States')
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Grid cell of the coordinates, kept in sync on save (see coliving.geo)
+    grid_cell = models.IntegerField(null=True, blank=True, editable=False)
 
     # Property details
     total_bedrooms = models.IntegerField(default=1)
@@ -53,6 +62,13 @@ class LivingSpace(models.Model):
     def __str__(self):
         return f"{self.name} ({self.space_type})"
 
+    def save(self, *args, **kwargs):
+        self.grid_cell = grid_cell(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ('latitude' in update_fields or 'longitude' in update_fields):
+            kwargs['update_fields'] = {*update_fields, 'grid_cell'}
+        super().save(*args, **kwargs)
+
     def get_available_rooms(self):
         """Return rooms that are available for rent"""
         return self.rooms.filter(is_available=True)
@@ -69,6 +85,8 @@ class LivingSpace(models.Model):
             models.Index(fields=['is_active']),
             models.Index(fields=['city', 'is_public']),
             models.Index(fields=['available_from']),
+            models.Index(fields=['grid_cell', 'is_public']),
+            models.Index(fields=['created_at', 'id']),
         ]
 
 class LivingSpaceMember(models.Model):
@@ -92,6 +110,19 @@ class LivingSpaceMember(models.Model):
     def __str__(self):
         return f"{self.user.username} in {self.living_space.name} ({self.role})"
 
+class LivingSpaceCompatibility(models.Model):
+    """Member-by-member compatibility of a living space, maintained by ``coliving.group``"""
+    living_space = models.OneToOneField(
+        LivingSpace, on_delete=models.CASCADE, primary_key=True, related_name='group_compatibility'
+    )
+    member_ids = models.JSONField(default=list)  # active members with a personality profile
+    scores = models.JSONField(default=list)  # scores[i][j]: member i's compatibility with member j
+    scoring_version = models.PositiveSmallIntegerField(default=SCORING_VERSION)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Group compatibility of {self.living_space.name}"
+
 class Task(models.Model):
     TASK_CATEGORIES = [
         ('cleaning', 'Cleaning'),
@@ -292,36 +323,7 @@ class Room(models.Model):
 
     def calculate_compatibility_score(self, user):
         """Calculate compatibility score between user and current occupants"""
-        if not hasattr(user, 'personality_profile') or not user.personality_profile:
-            return 0
-
-        scores = []
-
-        # Check compatibility with space creator
-        creator = self.living_space.created_by
-        if creator != user and hasattr(creator, 'personality_profile'):
-            from authentication.models import User
-            from matching.views import calculate_compatibility
-            result = calculate_compatibility(user, creator)
-            # Extract the compatibility_score from the result dict
-            score = result['compatibility_score'] if isinstance(result, dict) else result
-            scores.append(score)
-
-        # Check compatibility with current room occupant
-        if self.current_occupant and self.current_occupant != user:
-            if hasattr(self.current_occupant, 'personality_profile'):
-                result = calculate_compatibility(user, self.current_occupant)
-                score = result['compatibility_score'] if isinstance(result, dict) else result
-                scores.append(score)
-
-        # Check compatibility with other space members
-        for member in self.living_space.members.exclude(id=user.id):
-            if hasattr(member, 'personality_profile'):
-                result = calculate_compatibility(user, member)
-                score = result['compatibility_score'] if isinstance(result, dict) else result
-                scores.append(score)
-
-        return sum(scores) / len(scores) if scores else 50  # Default 50% if no comparisons
+        return room_compatibility_scores(user, [self])[self.id]
 
     class Meta:
         indexes = [
@@ -329,6 +331,90 @@ class Room(models.Model):
             models.Index(fields=['available_from']),
         ]
 
+def _compatibility_with(user, people_ids):
+    """Return ``{person_id: compatibility_score}`` for the people who have a personality profile"""
+    from matching.score_cache import cached_scores
+
+    people = User.objects.filter(
+        id__in=people_ids, personality_profile__isnull=False
+    ).select_related('personality_profile')
+    return {
+        # Extract the compatibility_score from the result dict
+        person_id: result['compatibility_score'] if isinstance(result, dict) else result
+        for person_id, result in cached_scores(user, people).items()
+    }
+
+
+def _average_scores(user, groups):
+    """Average ``user``'s compatibility over each group of people, scoring each person once"""
+    people_ids = {person_id for people in groups.values() for person_id in people}
+    person_scores = _compatibility_with(user, people_ids)
+
+    scores = {}
+    for key, people in groups.items():
+        group_scores = [person_scores[person_id] for person_id in people if person_id in person_scores]
+        scores[key] = sum(group_scores) / len(group_scores) if group_scores else 50  # Default 50% if no comparisons
+    return scores
+
+
+def room_compatibility_scores(user, rooms):
+    """
+    Return ``{room_id: score}`` for ``user`` against the people of each room.
+
+    A room is scored as the average compatibility with its space's creator,
+    its current occupant and its space's members. People and pairs are
+    loaded once for all rooms, so scoring every room of several spaces costs
+    the same few queries as scoring one.
+
+    Scores come from the same cache as ``space_compatibility_scores`` and
+    ``coliving.group.applicant_compatibility``. Those two only count active
+    members, while a room also counts the people it is shared with: its
+    creator, its occupant and members who have since left.
+    """
+    rooms = list(rooms)
+    if not hasattr(user, 'personality_profile') or not user.personality_profile:
+        return {room.id: 0 for room in rooms}
+
+    # Get creators and members of every space involved
+    space_ids = {room.living_space_id for room in rooms}
+    creators = dict(LivingSpace.objects.filter(id__in=space_ids).values_list('id', 'created_by_id'))
+    members = {}
+    for space_id, member_id in LivingSpaceMember.objects.filter(
+        living_space_id__in=space_ids
+    ).exclude(user_id=user.id).values_list('living_space_id', 'user_id'):
+        members.setdefault(space_id, []).append(member_id)
+
+    # People each room is compared with, in the order they used to be counted
+    room_people = {}
+    for room in rooms:
+        people = [creators[room.living_space_id], room.current_occupant_id]
+        room_people[room.id] = [
+            person_id for person_id in people if person_id and person_id != user.id
+        ] + members.get(room.living_space_id, [])
+
+    return _average_scores(user, room_people)
+
+
+def space_compatibility_scores(user, spaces):
+    """
+    Return ``{space_id: score}`` for ``user`` against the active members of
+    each space in the ``spaces`` queryset.
+
+    Like ``room_compatibility_scores``, every (user, member) pair is read
+    from the score cache once for all spaces. Returns an empty dict when
+    ``user`` has no personality profile.
+    """
+    if not hasattr(user, 'personality_profile') or not user.personality_profile:
+        return {}
+
+    space_members = {space_id: [] for space_id in spaces.values_list('id', flat=True)}
+    for space_id, member_id in LivingSpaceMember.objects.filter(
+        living_space__in=spaces.values('id'), is_active=True
+    ).exclude(user_id=user.id).values_list('living_space_id', 'user_id'):
+        space_members[space_id].append(member_id)
+
+    return _average_scores(user, space_members)
+
 class LivingSpaceImage(models.Model):
     IMAGE_TYPES = [
         ('exterior', 'Exterior'),
@@ -1,9 +1,10 @@
+from django.db import models
 from rest_framework import serializers
 from .models import (
     LivingSpace, LivingSpaceMember, Room, LivingSpaceImage,
     RoomApplication, LivingSpaceReview, HouseRules, Task, Expense,
     ShoppingList, ShoppingListItem, Bill, BillSplit, Notification, CalendarEvent,
-    LivingSpaceInvitation
+    LivingSpaceInvitation, room_compatibility_scores
 )
 from authentication.serializers import UserSerializer
 
@@ -34,6 +35,22 @@ class LivingSpaceImageSerializer(serializers.ModelSerializer):
             'id', 'image', 'image_type', 'caption', 'is_primary', 'order'
         ]
 
+def score_rooms(context, rooms):
+    """Score the rooms not yet scored in this serializer context, in one batch"""
+    request = context.get('request')
+    if not (request and request.user.is_authenticated):
+        return
+    scores = context.setdefault('room_compatibility_scores', {})
+    unscored = [room for room in rooms if room.id not in scores]
+    if unscored:
+        scores.update(room_compatibility_scores(request.user, unscored))
+
+class RoomListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        rooms = data.all() if isinstance(data, models.Manager) else data
+        score_rooms(self.context, rooms)
+        return super().to_representation(rooms)
+
 class RoomSerializer(serializers.ModelSerializer):
     images = LivingSpaceImageSerializer(many=True, read_only=True)
     compatibility_score = serializers.SerializerMethodField()
@@ -47,13 +64,12 @@ class RoomSerializer(serializers.ModelSerializer):
             'monthly_rent', 'security_deposit', 'available_from',
             'current_occupant', 'images', 'compatibility_score'
         ]
+        list_serializer_class = RoomListSerializer
 
     def get_compatibility_score(self, obj):
         """Calculate compatibility score for the requesting user"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.calculate_compatibility_score(request.user)
-        return None
+        score_rooms(self.context, [obj])
+        return self.context.get('room_compatibility_scores', {}).get(obj.id)
 
 class LivingSpaceMemberSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField()
@@ -65,6 +81,13 @@ class LivingSpaceMemberSerializer(serializers.ModelSerializer):
             'id', 'user', 'user_id', 'role', 'joined_at', 'is_active'
         ]
 
+class LivingSpaceListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        spaces = data.all() if isinstance(data, models.Manager) else data
+        # Score the rooms of every listed space together
+        score_rooms(self.context, [room for space in spaces for room in space.rooms.all()])
+        return super().to_representation(spaces)
+
 class LivingSpaceSerializer(serializers.ModelSerializer):
     images = LivingSpaceImageSerializer(many=True, read_only=True)
     rooms = RoomSerializer(many=True, read_only=True)
@@ -88,9 +111,15 @@ class LivingSpaceSerializer(serializers.ModelSerializer):
             'available_rooms_count', 'member_count', 'role'
         ]
         read_only_fields = ['created_by', 'created_at']
+        list_serializer_class = LivingSpaceListSerializer
+
+    # Listing querysets annotate these values (see coliving.views.annotate_listing);
+    # fall back to querying for spaces loaded without them
 
     def get_average_rating(self, obj):
         """Calculate average rating from reviews"""
+        if hasattr(obj, 'average_rating'):
+            return obj.average_rating
         reviews = obj.reviews.all()
         if reviews:
             return sum(review.overall_rating for review in reviews) / len(reviews)
@@ -98,14 +127,20 @@ class LivingSpaceSerializer(serializers.ModelSerializer):
 
     def get_available_rooms_count(self, obj):
         """Get count of available rooms"""
+        if hasattr(obj, 'available_rooms_count'):
+            return obj.available_rooms_count
         return obj.get_available_rooms().count()
 
     def get_member_count(self, obj):
         """Get count of active members"""
+        if hasattr(obj, 'member_count'):
+            return obj.member_count
         return obj.memberships.filter(is_active=True).count()
 
     def get_role(self, obj):
         """Get the requesting user's role in this living space"""
+        if hasattr(obj, 'role'):
+            return obj.role
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             membership = obj.memberships.filter(user=request.user, is_active=True).first()
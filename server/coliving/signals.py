@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from matching.signals import SCORED_USER_FIELDS, changed_user_fields
+from personality.models import PersonalityProfile
+from .dashboard import invalidate_dashboard
+from .group import add_member, remove_member, rescore_member
+from .models import (
+    Bill, BillSplit, CalendarEvent, Expense, ExpenseSplit, HouseRules,
+    LivingSpace, LivingSpaceMember, ShoppingList, ShoppingListItem, Task
+)
+
+User = get_user_model()
+
+# Models shown on the shared dashboard, with how to find their living space
+DASHBOARD_MODELS = {
+    LivingSpace: lambda instance: instance.id,
+    Task: lambda instance: instance.living_space_id,
+    Expense: lambda instance: instance.living_space_id,
+    ShoppingList: lambda instance: instance.living_space_id,
+    Bill: lambda instance: instance.living_space_id,
+    CalendarEvent: lambda instance: instance.living_space_id,
+    HouseRules: lambda instance: instance.living_space_id,
+    ExpenseSplit: lambda instance: Expense.objects.filter(
+        id=instance.expense_id
+    ).values_list('living_space_id', flat=True).first(),
+    BillSplit: lambda instance: Bill.objects.filter(
+        id=instance.bill_id
+    ).values_list('living_space_id', flat=True).first(),
+    ShoppingListItem: lambda instance: ShoppingList.objects.filter(
+        id=instance.shopping_list_id
+    ).values_list('living_space_id', flat=True).first(),
+}
+
+
+def invalidate_dashboard_on_change(sender, instance, **kwargs):
+    living_space_id = DASHBOARD_MODELS[sender](instance)
+    if living_space_id is not None:
+        invalidate_dashboard(living_space_id)
+
+
+for model in DASHBOARD_MODELS:
+    post_save.connect(invalidate_dashboard_on_change, sender=model, dispatch_uid=f'dashboard_save_{model.__name__}')
+    post_delete.connect(invalidate_dashboard_on_change, sender=model, dispatch_uid=f'dashboard_delete_{model.__name__}')
+
+
+@receiver(m2m_changed, sender=Expense.participants.through)
+@receiver(m2m_changed, sender=Bill.participants.through)
+def invalidate_dashboard_on_participants_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    # Adding, removing and clearing participants skips the split models' own signals
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        living_space_ids = [instance.living_space_id]
+    else:
+        # instance is the user and model is Expense or Bill; pk_set is None when clearing
+        shared = model.objects.filter(participants=instance) if action == 'pre_clear' else model.objects.filter(id__in=pk_set)
+        living_space_ids = set(shared.values_list('living_space_id', flat=True))
+    for living_space_id in living_space_ids:
+        invalidate_dashboard(living_space_id)
+
+
+@receiver(post_save, sender=LivingSpaceMember)
+def update_group_on_membership_change(sender, instance, **kwargs):
+    if instance.is_active:
+        add_member(instance.living_space_id, instance.user_id)
+    else:
+        remove_member(instance.living_space_id, instance.user_id)
+
+
+@receiver(post_delete, sender=LivingSpaceMember)
+def update_group_on_membership_delete(sender, instance, **kwargs):
+    remove_member(instance.living_space_id, instance.user_id)
+
+
+@receiver(post_save, sender=PersonalityProfile)
+@receiver(post_delete, sender=PersonalityProfile)
+def update_groups_on_profile_change(sender, instance, **kwargs):
+    rescore_member(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def update_groups_on_user_change(sender, instance, created, **kwargs):
+    if not created and changed_user_fields(instance) & set(SCORED_USER_FIELDS):
+        rescore_member(instance.id)
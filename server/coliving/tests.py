@@ -1,3 +1,525 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from matching.models import UserPreferences
+from matching.pool import profile_pool
+from matching.scoring import score_candidates
+from matching.views import calculate_compatibility
+from personality.models import PersonalityProfile
+from .admin import LivingSpaceMemberAdmin, TaskAdmin
+from .group import applicant_compatibility, group_compatibility
+from .models import (
+    CalendarEvent, Expense, ExpenseSplit, LivingSpace, LivingSpaceCompatibility, LivingSpaceMember,
+    LivingSpaceReview, Room, Task
+)
+
+User = get_user_model()
+
+
+def create_user_with_profile(username, level):
+    user = User.objects.create_user(username=username, email=f'{username}@example.com')
+    PersonalityProfile.objects.create(
+        user=user, openness=level, conscientiousness=level, extraversion=50,
+        agreeableness=50, neuroticism=100 - level, cleanliness_level=level, social_level=50
+    )
+    return user
+
+
+class SharedDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com')
+        self.space = LivingSpace.objects.create(name='Maple House', created_by=self.alice)
+        for user in (self.alice, self.bob):
+            LivingSpaceMember.objects.create(living_space=self.space, user=user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.url = f'/api/coliving/shared-dashboard/{self.space.id}/'
+
+    def add_expense(self, title):
+        expense = Expense.objects.create(
+            living_space=self.space, title=title, amount=Decimal('20.00'),
+            paid_by=self.alice, expense_date=timezone.now()
+        )
+        for user in (self.alice, self.bob):
+            ExpenseSplit.objects.create(expense=expense, user=user, amount_owed=Decimal('10.00'))
+        return expense
+
+    def test_query_count_does_not_grow_with_expenses(self):
+        for count in (2, 8):
+            while Expense.objects.count() < count:
+                self.add_expense(f'expense {Expense.objects.count()}')
+            cache.clear()
+            with self.assertNumQueries(10):
+                response = self.client.get(self.url)
+            self.assertEqual(len(response.data['expenses']), count)
+            self.assertEqual(len(response.data['expenses'][0]['splits']), 2)
+
+    def test_cached_snapshot_is_served_until_the_space_changes(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['tasks'], [])
+
+        # Snapshots are invalidated once the change commits
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(living_space=self.space, title='Take out trash', created_by=self.bob)
+            response = self.client.get(self.url)
+            self.assertEqual(response.data['tasks'], [])
+        response = self.client.get(self.url)
+        self.assertEqual([task['title'] for task in response.data['tasks']], ['Take out trash'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ExpenseSplit.objects.filter(expense=self.add_expense('Groceries')).update(is_settled=True)
+            ExpenseSplit.objects.get(expense__title='Groceries', user=self.bob).save()
+        response = self.client.get(self.url)
+        self.assertTrue(all(split['is_settled'] for split in response.data['expenses'][0]['splits']))
+
+    def test_admin_task_actions_refresh_the_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(living_space=self.space, title='Take out trash', created_by=self.bob)
+        self.client.get(self.url)
+
+        task_admin = TaskAdmin(Task, admin.site)
+        with self.captureOnCommitCallbacks(execute=True), mock.patch.object(task_admin, 'message_user'):
+            task_admin.mark_completed(None, Task.objects.filter(living_space=self.space))
+        self.assertEqual([task['status'] for task in self.client.get(self.url).data['tasks']], ['completed'])
+
+    def test_participant_changes_refresh_the_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            expense = self.add_expense('Groceries')
+        carol = User.objects.create_user(username='carol', email='carol@example.com')
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            expense.participants.add(carol, through_defaults={'amount_owed': Decimal('5.00')})
+        splits = self.client.get(self.url).data['expenses'][0]['splits']
+        self.assertEqual(len(splits), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            carol.shared_expenses.remove(expense)
+        self.assertEqual(len(self.client.get(self.url).data['expenses'][0]['splits']), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob.shared_expenses.clear()
+        self.assertEqual(len(self.client.get(self.url).data['expenses'][0]['splits']), 1)
+
+    def test_events_that_have_started_drop_off_the_cached_snapshot(self):
+        CalendarEvent.objects.create(
+            living_space=self.space, title='House meeting', created_by=self.alice,
+            start_datetime=timezone.now() + timedelta(hours=1)
+        )
+        self.assertEqual(len(self.client.get(self.url).data['calendar_events']), 1)
+
+        later = timezone.now() + timedelta(hours=2)
+        with mock.patch('coliving.dashboard.timezone.now', return_value=later):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['calendar_events'], [])
+
+    def test_non_members_are_rejected(self):
+        outsider = User.objects.create_user(username='outsider', email='outsider@example.com')
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class LivingSpaceListingTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def add_space(self):
+        index = LivingSpace.objects.count()
+        owner = User.objects.create_user(username=f'owner{index}', email=f'owner{index}@example.com')
+        space = LivingSpace.objects.create(name=f'Space {index}', created_by=owner)
+        LivingSpaceMember.objects.create(living_space=space, user=owner, role='admin')
+        Room.objects.create(living_space=space, name='Room A', current_occupant=owner)
+        Room.objects.create(living_space=space, name='Room B', is_available=False)
+        for rating, reviewer in ((4, self.viewer), (5, owner)):
+            LivingSpaceReview.objects.create(
+                living_space=space, reviewer=reviewer, overall_rating=rating, cleanliness_rating=rating,
+                location_rating=rating, value_rating=rating, roommate_compatibility=rating, review_text='Nice'
+            )
+        return space
+
+    def test_listing_query_count_does_not_grow_with_spaces(self):
+        for count in (2, 10):
+            while LivingSpace.objects.count() < count:
+                self.add_space()
+            # A fresh viewer each time, so its profile lookup is counted too
+            self.client.force_authenticate(User.objects.get(id=self.viewer.id))
+            with self.assertNumQueries(7):
+                response = self.client.get('/api/coliving/living-spaces/')
+            self.assertEqual(len(response.data['results']), count)
+            self.client.force_authenticate(User.objects.get(id=self.viewer.id))
+            with self.assertNumQueries(6):
+                response = self.client.get('/api/coliving/search/', {'page_size': 20})
+            self.assertEqual(len(response.data['results']), count)
+
+    def test_annotations_match_the_serializer_values(self):
+        space = self.add_space()
+        LivingSpaceMember.objects.create(living_space=space, user=self.viewer, role='guest')
+        LivingSpaceMember.objects.create(
+            living_space=space, is_active=False,
+            user=User.objects.create_user(username='former', email='former@example.com')
+        )
+
+        response = self.client.get('/api/coliving/living-spaces/', {'my_spaces_only': 'true'})
+        listed = response.data['results'][0]
+        self.assertEqual(
+            (listed['average_rating'], listed['available_rooms_count'], listed['member_count'], listed['role']),
+            (4.5, 1, 2, 'guest')
+        )
+        self.assertEqual(len(listed['members']), 3)
+
+
+class RoomCompatibilityTests(TestCase):
+    def setUp(self):
+        self.viewer = create_user_with_profile('viewer', 40)
+        self.owners = [create_user_with_profile('owner0', 60), create_user_with_profile('owner1', 90)]
+        self.housemate = create_user_with_profile('housemate', 20)
+        self.tenant = create_user_with_profile('tenant', 75)
+        self.no_profile = User.objects.create_user(username='noprofile', email='noprofile@example.com')
+
+        self.spaces = []
+        for owner in self.owners:
+            space = LivingSpace.objects.create(name=f'{owner.username} house', created_by=owner)
+            for member in (owner, self.housemate, self.no_profile):
+                LivingSpaceMember.objects.create(living_space=space, user=member)
+            for index in range(3):
+                Room.objects.create(
+                    living_space=space, name=f'Room {index}',
+                    current_occupant=self.tenant if index == 0 else None
+                )
+            self.spaces.append(space)
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def expected_score(self, room):
+        people = [room.living_space.created_by, room.current_occupant, room.living_space.created_by, self.housemate]
+        scores = [calculate_compatibility(self.viewer, person)['compatibility_score'] for person in people if person]
+        return sum(scores) / len(scores)
+
+    def test_rooms_of_every_listed_space_are_scored_in_one_batch(self):
+        with mock.patch('matching.score_cache.score_candidates', wraps=score_candidates) as scorer:
+            response = self.client.get('/api/coliving/living-spaces/')
+
+        # Every (viewer, person) pair was scored once, for all rooms together
+        scorer.assert_called_once()
+        self.assertEqual(
+            sorted(person.username for person in scorer.call_args.args[1]),
+            ['housemate', 'owner0', 'owner1', 'tenant']
+        )
+        for space in response.data['results']:
+            for room in space['rooms']:
+                self.assertAlmostEqual(room['compatibility_score'], self.expected_score(Room.objects.get(id=room['id'])))
+
+    def test_room_listing_query_count_does_not_grow_with_rooms(self):
+        self.client.get('/api/coliving/rooms/')  # fill the score cache
+        with self.assertNumQueries(7):
+            first = self.client.get(f'/api/coliving/living-spaces/{self.spaces[0].id}/available_rooms/')
+        Room.objects.create(living_space=self.spaces[0], name='Room 3', current_occupant=self.tenant)
+        with self.assertNumQueries(7):
+            second = self.client.get(f'/api/coliving/living-spaces/{self.spaces[0].id}/available_rooms/')
+        self.assertEqual(len(second.data), len(first.data) + 1)
+        self.assertEqual(second.data[-1]['compatibility_score'], first.data[0]['compatibility_score'])
+
+
+class CompatibilitySearchTests(TestCase):
+    def setUp(self):
+        self.viewer = create_user_with_profile('viewer', 50)
+        self.spaces = []
+        for index, level in enumerate([90, 50, 10, 55, 80, 45]):
+            owner = create_user_with_profile(f'owner{index}', level)
+            space = LivingSpace.objects.create(name=f'Space {index}', created_by=owner)
+            LivingSpaceMember.objects.create(living_space=space, user=owner)
+            self.spaces.append(space)
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        self.scores = {
+            space.id: calculate_compatibility(self.viewer, space.created_by)['compatibility_score']
+            for space in self.spaces
+        }
+
+    def search(self, **params):
+        return self.client.get('/api/coliving/search/', params).data
+
+    def test_spaces_are_filtered_and_ranked_before_pagination(self):
+        threshold = sorted(self.scores.values())[2]
+        expected = sorted(
+            [space_id for space_id, score in self.scores.items() if score >= threshold],
+            key=lambda space_id: (-self.scores[space_id], -space_id)
+        )
+
+        first = self.search(min_compatibility=threshold, sort='compatibility', page_size=3)
+        second = self.search(
+            min_compatibility=threshold, sort='compatibility', page_size=3, cursor=first['next_cursor']
+        )
+        self.assertEqual((first['total_count'], first['has_next'], second['has_next']), (4, True, False))
+        self.assertEqual([space['id'] for space in first['results'] + second['results']], expected)
+        self.assertAlmostEqual(first['results'][0]['compatibility_score'], self.scores[expected[0]])
+
+        filtered = self.search(min_compatibility=threshold)
+        # Newest first, as without the filter
+        self.assertEqual([space['id'] for space in filtered['results']], sorted(expected, reverse=True))
+
+    def test_ranked_search_query_count_does_not_grow_with_spaces(self):
+        self.search(sort='compatibility')  # fill the score cache
+        self.client.force_authenticate(User.objects.get(id=self.viewer.id))
+        with self.assertNumQueries(10):
+            self.search(sort='compatibility')
+
+        for index in range(6, 12):
+            owner = create_user_with_profile(f'owner{index}', index * 8)
+            space = LivingSpace.objects.create(name=f'Space {index}', created_by=owner)
+            LivingSpaceMember.objects.create(living_space=space, user=owner)
+        self.search(sort='compatibility')
+        self.client.force_authenticate(User.objects.get(id=self.viewer.id))
+        with self.assertNumQueries(10):
+            self.assertEqual(self.search(sort='compatibility')['total_count'], 12)
+
+    def test_invalid_threshold_is_rejected(self):
+        response = self.client.get('/api/coliving/search/', {'min_compatibility': 'high'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RadiusSearchTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com')
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def add_space(self, name, latitude, longitude):
+        return LivingSpace.objects.create(
+            name=name, created_by=self.owner, latitude=Decimal(str(latitude)), longitude=Decimal(str(longitude))
+        )
+
+    def search(self, **params):
+        return self.client.get('/api/coliving/search/', params)
+
+    def test_spaces_within_the_radius_are_returned_nearest_first(self):
+        # Around central Nairobi (-1.2864, 36.8172)
+        westlands = self.add_space('Westlands', -1.2676, 36.8108)
+        kilimani = self.add_space('Kilimani', -1.2921, 36.7836)
+        self.add_space('Thika', -1.0333, 37.0693)
+        self.add_space('Mombasa', -4.0435, 39.6682)
+        LivingSpace.objects.create(name='Unmapped', created_by=self.owner)
+
+        response = self.search(latitude=-1.2864, longitude=36.8172, radius_km=10)
+        self.assertEqual([space['name'] for space in response.data['results']], ['Westlands', 'Kilimani'])
+        self.assertEqual(response.data['total_count'], 2)
+        self.assertAlmostEqual(response.data['results'][0]['distance_km'], 2.22, places=1)
+        self.assertLess(response.data['results'][0]['distance_km'], response.data['results'][1]['distance_km'])
+
+        # Moving a space keeps its grid cell in sync
+        westlands.latitude, westlands.longitude = Decimal('-4.05'), Decimal('39.66')
+        westlands.save(update_fields=['latitude', 'longitude'])
+        response = self.search(latitude=-1.2864, longitude=36.8172, radius_km=10)
+        self.assertEqual([space['id'] for space in response.data['results']], [kilimani.id])
+
+    def test_radius_defaults_to_the_viewers_max_distance(self):
+        self.add_space('Thika', -1.0333, 37.0693)  # about 38 km away
+        UserPreferences.objects.create(user=self.viewer, max_distance_km=20)
+        self.assertEqual(self.search(latitude=-1.2864, longitude=36.8172).data['total_count'], 0)
+        UserPreferences.objects.filter(user=self.viewer).update(max_distance_km=50)
+        self.assertEqual(self.search(latitude=-1.2864, longitude=36.8172).data['total_count'], 1)
+
+    def test_search_crosses_the_antimeridian(self):
+        self.add_space('Taveuni', -16.85, 179.98)
+        self.add_space('Rabi', -16.45, -179.97)
+        response = self.search(latitude=-16.7, longitude=-179.99, radius_km=40)
+        self.assertEqual(sorted(space['name'] for space in response.data['results']), ['Rabi', 'Taveuni'])
+
+    def test_invalid_coordinates_are_rejected(self):
+        self.assertEqual(self.search(latitude='north', longitude=36.8).status_code, 400)
+        self.assertEqual(self.search(latitude=-1.28, longitude=36.8, radius_km=5000).status_code, 400)
+
+
+class TextSearchTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', email='owner@example.com')
+        self.sunny = LivingSpace.objects.create(
+            name='Sunny flat', created_by=owner, city='Nairobi', description='Bright rooms with a garden view'
+        )
+        self.garden = LivingSpace.objects.create(
+            name='Garden house', created_by=owner, city='Nairobi', description='Large garden, gardening club'
+        )
+        LivingSpace.objects.create(name='Loft', created_by=owner, city='Mombasa', description='Near the beach')
+        self.client = APIClient()
+        self.client.force_authenticate(owner)
+
+    def search(self, **params):
+        return self.client.get('/api/coliving/search/', params).data
+
+    def test_matches_are_ranked_by_relevance(self):
+        response = self.search(q='garden')
+        self.assertEqual([space['id'] for space in response['results']], [self.garden.id, self.sunny.id])
+        self.assertEqual(response['total_count'], 2)
+
+        self.assertEqual(self.search(q='garden view')['total_count'], 1)
+        self.assertEqual(self.search(q='beach', city='nairobi')['total_count'], 0)
+
+    def test_index_follows_listing_changes(self):
+        self.sunny.description = 'Bright rooms'
+        self.sunny.save()
+        self.assertEqual([space['id'] for space in self.search(q='garden')['results']], [self.garden.id])
+
+
+class SearchPaginationTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', email='owner@example.com')
+        created_at = timezone.now()
+        self.spaces = []
+        for index in range(7):
+            space = LivingSpace.objects.create(name=f'Space {index}', created_by=owner)
+            # Pairs of spaces share a timestamp, so the id has to break ties
+            LivingSpace.objects.filter(id=space.id).update(created_at=created_at - timedelta(hours=index // 2))
+            self.spaces.append(space)
+        LivingSpace.objects.create(name='Private', created_by=owner, is_public=False)
+        self.client = APIClient()
+        self.client.force_authenticate(owner)
+
+    def test_cursor_walks_every_space_newest_first(self):
+        seen, cursor = [], ''
+        while True:
+            response = self.client.get('/api/coliving/search/', {'page_size': 3, 'cursor': cursor}).data
+            self.assertIsNone(response['total_count'])
+            seen += [space['id'] for space in response['results']]
+            if not response['has_next']:
+                break
+            cursor = response['next_cursor']
+        expected = [space.id for space in sorted(
+            LivingSpace.objects.filter(is_public=True), key=lambda space: (space.created_at, space.id), reverse=True
+        )]
+        self.assertEqual(seen, expected)
+
+    def test_total_count_is_optional(self):
+        response = self.client.get('/api/coliving/search/', {'page_size': 2, 'include_count': 'true'}).data
+        self.assertEqual((response['total_count'], len(response['results'])), (7, 2))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/coliving/search/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+
+class GroupCompatibilityTests(TestCase):
+    def setUp(self):
+        profile_pool.clear()
+        self.admin = create_user_with_profile('admin', 50)
+        self.space = LivingSpace.objects.create(name='Big House', created_by=self.admin)
+        LivingSpaceMember.objects.create(living_space=self.space, user=self.admin, role='admin')
+        self.members = [self.admin]
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def add_members(self, *levels):
+        for level in levels:
+            user = create_user_with_profile(f'member{len(self.members)}', level)
+            LivingSpaceMember.objects.create(living_space=self.space, user=user)
+            self.members.append(user)
+
+    def expected_matrix(self):
+        members = sorted(self.members, key=lambda user: user.id)
+        return [user.id for user in members], [
+            [None if a == b else calculate_compatibility(a, b)['compatibility_score'] for b in members]
+            for a in members
+        ]
+
+    def stored_matrix(self):
+        group = LivingSpaceCompatibility.objects.get(living_space=self.space)
+        order = sorted(range(len(group.member_ids)), key=lambda index: group.member_ids[index])
+        return [group.member_ids[i] for i in order], [[group.scores[i][j] for j in order] for i in order]
+
+    def test_matrix_is_updated_incrementally(self):
+        self.add_members(90, 10)
+        group_compatibility(self.space.id)
+        self.assertEqual(self.stored_matrix(), self.expected_matrix())
+
+        # Joining, profile changes and leaving update the stored matrix without a rebuild
+        with mock.patch('coliving.group.build_group', side_effect=AssertionError('rebuilt')):
+            self.add_members(70)
+            self.assertEqual(self.stored_matrix(), self.expected_matrix())
+
+            profile = self.members[1].personality_profile
+            profile.openness = 20
+            profile.save()
+            self.members[1] = User.objects.get(id=self.members[1].id)
+            self.assertEqual(self.stored_matrix(), self.expected_matrix())
+
+            membership = LivingSpaceMember.objects.get(living_space=self.space, user=self.members[2])
+            membership.is_active = False
+            membership.save()
+            del self.members[2]
+            self.assertEqual(self.stored_matrix(), self.expected_matrix())
+
+    def test_city_changes_rescore_without_the_profile_pool(self):
+        self.add_members(90, 10)
+        group_compatibility(self.space.id)
+
+        with mock.patch.object(profile_pool, 'get', side_effect=AssertionError('pool read')):
+            self.add_members(70)
+            self.assertEqual(self.stored_matrix(), self.expected_matrix())
+
+            user = User.objects.get(id=self.members[1].id)
+            user.preferred_city = 'Nairobi'
+            user.save()
+            self.members[1] = User.objects.get(id=user.id)
+            self.assertEqual(self.stored_matrix(), self.expected_matrix())
+
+    def test_members_removed_in_the_admin_leave_the_matrix(self):
+        self.add_members(90, 10)
+        group_compatibility(self.space.id)
+
+        member_admin = LivingSpaceMemberAdmin(LivingSpaceMember, admin.site)
+        with mock.patch.object(member_admin, 'message_user'):
+            member_admin.remove_members(None, LivingSpaceMember.objects.filter(user=self.members[2]))
+        del self.members[2]
+        self.assertEqual(self.stored_matrix(), self.expected_matrix())
+
+    def test_admins_see_cohesion_and_applicant_scores(self):
+        self.add_members(55, 95)
+        applicant = create_user_with_profile('applicant', 60)
+        member_ids, scores = self.expected_matrix()
+        pairs = {
+            (member_ids[i], member_ids[j]): (scores[i][j] + scores[j][i]) / 2
+            for i in range(3) for j in range(i + 1, 3)
+        }
+
+        response = self.client.get(f'/api/coliving/living-spaces/{self.space.id}/compatibility/', {'applicant': applicant.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['member_count'], 3)
+        self.assertEqual(response.data['average_compatibility'], round(sum(pairs.values()) / 3, 1))
+        self.assertEqual(tuple(response.data['lowest_pair']['user_ids']), min(pairs, key=pairs.get))
+
+        expected = {user.id: calculate_compatibility(applicant, user)['compatibility_score'] for user in self.members}
+        self.assertEqual(response.data['applicant']['member_scores'], expected)
+        self.assertEqual(response.data['applicant']['average_compatibility'], sum(expected.values()) / 3)
+
+        self.client.force_authenticate(self.members[1])
+        response = self.client.get(f'/api/coliving/living-spaces/{self.space.id}/compatibility/')
+        self.assertEqual(response.status_code, 403)
 
-# Create your tests here.
+    def test_applicant_scoring_does_not_grow_with_members(self):
+        applicant = create_user_with_profile('applicant', 60)
+        counts = []
+        for levels in ((30,), (40, 60, 70, 80, 90, 20, 35)):
+            self.add_members(*levels)
+            group_compatibility(self.space.id)
+            profile_pool.get()
+            with CaptureQueriesContext(connection) as queries:
+                result = applicant_compatibility(applicant, self.space.id)
+            self.assertEqual(len(result['member_scores']), len(self.members))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
@@ -4,19 +4,28 @@ from rest_framework.response import Response
 from rest_framework import generics, status, viewsets, filters
 from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Avg
+from django.db.models import Q, Avg, Count, IntegerField, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
+import bisect
 from datetime import datetime
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 User = get_user_model()
 from .models import (
     LivingSpace, LivingSpaceMember, Room, LivingSpaceImage,
     RoomApplication, LivingSpaceReview, HouseRules, Task, Expense,
     ShoppingList, ShoppingListItem, Bill, Notification, CalendarEvent,
-    LivingSpaceInvitation
+    LivingSpaceInvitation, LIVING_SPACE_SEARCH, space_compatibility_scores
 )
-from matching.models import MatchInteraction, Match
+from matching.models import MatchInteraction, UserPreferences
+from matching.services import like_user
+from pairpad_server.fulltext import SEARCH_RESULT_LIMIT
+from pairpad_server.pagination import encode_cursor, decode_cursor
+from . import geo
+from .dashboard import get_dashboard_snapshot
+from .group import applicant_compatibility, group_cohesion
 from .serializers import (
     LivingSpaceSerializer, LivingSpaceCreateSerializer, RoomSerializer,
     RoomCreateSerializer, RoomApplicationSerializer, LivingSpaceReviewSerializer,
@@ -25,6 +34,41 @@ from .serializers import (
     NotificationSerializer, CalendarEventSerializer
 )
 
+def annotate_listing(queryset, user):
+    """
+    Add what LivingSpaceSerializer shows for each space to a queryset.
+
+    Ratings, room and member counts and the viewer's role are computed as
+    correlated subqueries, so they stay correct under the joins that member
+    and room filters add, and nested objects are prefetched up front.
+    """
+    def aggregate(queryset, function):
+        # One aggregate value per space, for use as a subquery
+        return queryset.filter(living_space=OuterRef('pk')).values('living_space').annotate(
+            value=function
+        ).values('value')
+
+    return queryset.annotate(
+        average_rating=Subquery(aggregate(LivingSpaceReview.objects.all(), Avg('overall_rating'))),
+        available_rooms_count=Coalesce(
+            Subquery(aggregate(Room.objects.filter(is_available=True), Count('id'))),
+            Value(0), output_field=IntegerField()
+        ),
+        member_count=Coalesce(
+            Subquery(aggregate(LivingSpaceMember.objects.filter(is_active=True), Count('id'))),
+            Value(0), output_field=IntegerField()
+        ),
+        role=Subquery(LivingSpaceMember.objects.filter(
+            living_space=OuterRef('pk'), user=user, is_active=True
+        ).values('role')[:1]),
+    ).select_related(
+        'created_by__personality_profile', 'house_rules'
+    ).prefetch_related(
+        'images',
+        Prefetch('rooms', queryset=Room.objects.select_related('current_occupant').prefetch_related('images')),
+        Prefetch('memberships', queryset=LivingSpaceMember.objects.select_related('user')),
+    )
+
 class LivingSpaceViewSet(viewsets.ModelViewSet):
     """ViewSet for managing living spaces"""
     permission_classes = [IsAuthenticated]
@@ -59,7 +103,10 @@ class LivingSpaceViewSet(viewsets.ModelViewSet):
         if max_budget:
             user_spaces = user_spaces.filter(total_rent__lte=max_budget)
 
-        return user_spaces.prefetch_related('images', 'rooms', 'house_rules', 'memberships')
+        # Only actions that render LivingSpaceSerializer need the listing data
+        if self.action in ('list', 'retrieve'):
+            return annotate_listing(user_spaces, user)
+        return user_spaces
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -123,11 +170,45 @@ class LivingSpaceViewSet(viewsets.ModelViewSet):
 
         return Response({'message': 'Successfully applied to join living space'})
 
+    @action(detail=True, methods=['get'])
+    def compatibility(self, request, pk=None):
+        """
+        Get how well the members of this living space get along (admins only).
+
+        Pass ``?applicant=<user_id>`` to also score a prospective member
+        against every current one.
+        """
+        living_space = self.get_object()
+
+        is_admin = living_space.created_by_id == request.user.id or LivingSpaceMember.objects.filter(
+            living_space=living_space,
+            user=request.user,
+            role='admin',
+            is_active=True
+        ).exists()
+        if not is_admin:
+            return Response(
+                {'error': 'Only the creator or admin members can view group compatibility'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        data = group_cohesion(living_space.id)
+
+        applicant_id = request.query_params.get('applicant')
+        if applicant_id:
+            try:
+                applicant = User.objects.get(id=int(applicant_id))
+            except (ValueError, User.DoesNotExist):
+                return Response({'error': 'Applicant not found'}, status=status.HTTP_404_NOT_FOUND)
+            data['applicant'] = {'user_id': applicant.id, **applicant_compatibility(applicant, living_space.id)}
+
+        return Response(data)
+
     @action(detail=True, methods=['get'])
     def available_rooms(self, request, pk=None):
         """Get available rooms in this living space"""
         living_space = self.get_object()
-        available_rooms = living_space.get_available_rooms()
+        available_rooms = living_space.get_available_rooms().prefetch_related('images')
         serializer = RoomSerializer(available_rooms, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -156,39 +237,14 @@ class LivingSpaceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Create match interaction
-        MatchInteraction.objects.create(
-            user=request.user,
-            target_user=host,
-            interaction_type='like'
-        )
-
-        # Check if it's mutual (host has also liked this user)
-        mutual_interaction = MatchInteraction.objects.filter(
-            user=host,
-            target_user=request.user,
-            interaction_type='like'
-        ).exists()
-
-        if mutual_interaction:
-            from matching.views import calculate_compatibility
-            from matching.models import Match
-
-            # Create match
-            compatibility = calculate_compatibility(request.user, host)
-            match, created = Match.objects.get_or_create(
-                user1=min(request.user, host, key=lambda x: x.id),
-                user2=max(request.user, host, key=lambda x: x.id),
-                defaults={
-                    'compatibility_score': compatibility,
-                    'status': 'mutual'
-                }
-            )
+        # Record the like, creating the match if the host already liked this user
+        match, compatibility_data = like_user(request.user, host)
 
+        if match:
             return Response({
                 'message': 'Match created with host!',
                 'match_id': match.id,
-                'compatibility_score': compatibility
+                'compatibility_score': match.compatibility_score
             })
 
         return Response({'message': 'Match request sent to host successfully'})
@@ -438,7 +494,7 @@ def get_dashboard(request):
     ).count()
 
     return Response({
-        'user_spaces': LivingSpaceSerializer(user_spaces, many=True).data,
+        'user_spaces': LivingSpaceSerializer(annotate_listing(user_spaces, user), many=True).data,
         'recent_tasks': TaskSerializer(recent_tasks, many=True).data,
         'recent_expenses': ExpenseSerializer(recent_expenses, many=True).data,
         'pending_applications': pending_applications,
@@ -451,10 +507,36 @@ def get_dashboard(request):
         }
     })
 
+SEARCH_PAGE_SIZE = 10
+MAX_SEARCH_PAGE_SIZE = 100
+
+
+def space_cursor(space):
+    return encode_cursor(space.created_at.isoformat(), space.id)
+
+
+def decode_space_cursor(cursor):
+    """Decode a search cursor into ``(created_at, id)``, or None if empty"""
+    values = decode_cursor(cursor, 2)
+    if values is None:
+        return None
+    created_at = parse_datetime(str(values[0]))
+    if created_at is None:
+        raise ValueError('Invalid cursor')
+    return created_at, int(values[1])
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def search_spaces(request):
-    """Search living spaces with filters"""
+    """
+    Search living spaces with filters.
+
+    Results are paginated with keyset cursors: pass ``next_cursor`` back as
+    ``?cursor=`` for the next page. Plain listings are newest first and never
+    count or skip rows; ``?include_count=true`` adds the exact total.
+    Text, radius and compatibility searches rank their candidates in memory
+    and always report ``total_count``.
+    """
     queryset = LivingSpace.objects.filter(is_public=True, is_active=True)
 
     # Location filters
@@ -484,30 +566,133 @@ def search_spaces(request):
     if available_rooms_only == 'true':
         queryset = queryset.filter(rooms__is_available=True).distinct()
 
-    # Compatibility score filter (requires personality profile)
-    min_compatibility = request.GET.get('min_compatibility')
-    if min_compatibility and hasattr(request.user, 'personality_profile'):
-        # This would need additional logic to calculate compatibility
-        pass
-
     # Pagination
-    page_size = int(request.GET.get('page_size', 10))
-    page = int(request.GET.get('page', 1))
-    start = (page - 1) * page_size
-    end = start + page_size
+    try:
+        page_size = min(int(request.GET.get('page_size', SEARCH_PAGE_SIZE)), MAX_SEARCH_PAGE_SIZE)
+    except ValueError:
+        return Response({'error': 'page_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if page_size < 1:
+        return Response({'error': 'page_size must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+    cursor = request.GET.get('cursor')
+
+    # Full-text query over name, description, address and city
+    query = request.GET.get('q')
+    relevance = None
+    if query:
+        # Searched among the filtered spaces; past SEARCH_RESULT_LIMIT matches only the best are kept
+        relevance = dict(LIVING_SPACE_SEARCH.search(query, within=queryset))
+        queryset = queryset.filter(id__in=list(relevance))
+
+    # Radius search around a point (requires both coordinates)
+    latitude = request.GET.get('latitude')
+    longitude = request.GET.get('longitude')
+    distances = None
+    if latitude and longitude:
+        try:
+            latitude, longitude = float(latitude), float(longitude)
+            radius_km = request.GET.get('radius_km')
+            if radius_km:
+                radius_km = float(radius_km)
+            else:
+                # Default to how far the user said they are willing to live
+                preferences = UserPreferences.objects.filter(user=request.user).first()
+                radius_km = preferences.max_distance_km if preferences else geo.DEFAULT_RADIUS_KM
+        except ValueError:
+            return Response({'error': 'latitude, longitude and radius_km must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and 0 < radius_km <= geo.MAX_RADIUS_KM):
+            return Response({'error': 'Coordinates or radius out of range'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Indexed grid cell ranges narrow the search, exact distances settle it
+        queryset = queryset.filter(geo.within_box(latitude, longitude, radius_km))
+        distances = geo.distances_within(
+            queryset.values_list('id', 'latitude', 'longitude'), latitude, longitude, radius_km
+        )
 
-    total_count = queryset.count()
-    results = queryset[start:end]
+    # Candidates ranked in memory, each with a sort key that is unique per space:
+    # radius results nearest first, text matches best match first
+    candidate_ids = rank_key = None
+    if distances is not None:
+        candidate_ids = list(distances)
+        rank_key = lambda space_id: (distances[space_id], space_id)
+    elif relevance is not None:
+        candidate_ids = list(queryset.values_list('id', flat=True))
+        rank_key = lambda space_id: (-relevance[space_id], space_id)
+
+    # Compatibility filter and sort (requires personality profile)
+    min_compatibility = request.GET.get('min_compatibility')
+    sort_by_compatibility = request.GET.get('sort') == 'compatibility'
+    compatibility = None
+    if (min_compatibility or sort_by_compatibility) and hasattr(request.user, 'personality_profile'):
+        try:
+            min_compatibility = float(min_compatibility) if min_compatibility else None
+        except ValueError:
+            return Response({'error': 'min_compatibility must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Score every matching space in one batch, then filter and rank ids before paginating
+        compatibility = space_compatibility_scores(request.user, queryset)
+        if candidate_ids is None:
+            # Newest first, like the plain listing
+            created = dict(queryset.values_list('id', 'created_at'))
+            candidate_ids = list(compatibility)
+            rank_key = lambda space_id: (-created[space_id].timestamp(), -space_id)
+        if min_compatibility is not None:
+            candidate_ids = [space_id for space_id in candidate_ids if compatibility[space_id] >= min_compatibility]
+        if sort_by_compatibility:
+            base_key = rank_key
+            rank_key = lambda space_id: (-compatibility[space_id], *base_key(space_id))
+
+    if candidate_ids is not None:
+        ranked_ids = sorted(candidate_ids, key=rank_key)
+        total_count = len(ranked_ids)
+        if cursor and ranked_ids:
+            keys = [rank_key(space_id) for space_id in ranked_ids]
+            try:
+                after = decode_cursor(cursor, len(keys[0]))
+                if not all(isinstance(value, (int, float)) for value in after):
+                    raise ValueError('Invalid cursor')
+            except ValueError:
+                return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+            ranked_ids = ranked_ids[bisect.bisect_right(keys, tuple(after)):]
+
+        page_ids = ranked_ids[:page_size]
+        has_next = len(ranked_ids) > page_size
+        next_cursor = encode_cursor(*rank_key(page_ids[-1])) if has_next else None
+        results = sorted(
+            annotate_listing(LivingSpace.objects.filter(id__in=page_ids), request.user),
+            key=lambda space: page_ids.index(space.id)
+        )
+    else:
+        # Newest first, continuing after the cursor's (created_at, id)
+        total_count = queryset.count() if request.GET.get('include_count') == 'true' else None
+        try:
+            after = decode_space_cursor(cursor)
+        except ValueError:
+            return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        if after:
+            created_at, space_id = after
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=space_id))
+
+        results = list(annotate_listing(queryset, request.user).order_by('-created_at', '-id')[:page_size + 1])
+        has_next = len(results) > page_size
+        results = results[:page_size]
+        next_cursor = space_cursor(results[-1]) if has_next else None
 
     serializer = LivingSpaceSerializer(results, many=True, context={'request': request})
+    results_data = serializer.data
+    for space_data in results_data:
+        if distances is not None:
+            space_data['distance_km'] = round(distances[space_data['id']], 2)
+        if compatibility is not None:
+            space_data['compatibility_score'] = compatibility[space_data['id']]
 
     return Response({
-        'results': serializer.data,
+        'results': results_data,
         'total_count': total_count,
-        'page': page,
+        # total_count only covers the best SEARCH_RESULT_LIMIT text matches
+        'total_count_capped': relevance is not None and len(relevance) >= SEARCH_RESULT_LIMIT,
         'page_size': page_size,
-        'has_next': end < total_count,
-        'has_previous': page > 1
+        'has_next': has_next,
+        'next_cursor': next_cursor,
     })
 
 # Existing views for backward compatibility
@@ -648,32 +833,10 @@ def get_shared_dashboard(request, living_space_id):
     try:
         living_space = LivingSpace.objects.get(id=living_space_id, members=request.user)
 
-        # Get tasks
-        tasks = Task.objects.filter(living_space=living_space).order_by('due_date')[:10]
-        tasks_data = TaskSerializer(tasks, many=True).data
-
-        # Get expenses
-        expenses = Expense.objects.filter(living_space=living_space).order_by('-expense_date')[:10]
-        expenses_data = ExpenseSerializer(expenses, many=True).data
-
-        # Get shopping lists
-        shopping_lists = ShoppingList.objects.filter(living_space=living_space)
-        shopping_data = ShoppingListSerializer(shopping_lists, many=True).data
-
-        # Get bills
-        bills = Bill.objects.filter(living_space=living_space, status__in=['pending', 'overdue']).order_by('due_date')
-        bills_data = BillSerializer(bills, many=True).data
+        # Get the shared part of the dashboard from its cached snapshot
+        snapshot = get_dashboard_snapshot(living_space)
 
-        # Get calendar events
-        from datetime import datetime, timedelta
-        now = timezone.now()
-        upcoming_events = CalendarEvent.objects.filter(
-            living_space=living_space,
-            start_datetime__gte=now
-        ).order_by('start_datetime')[:10]
-        events_data = CalendarEventSerializer(upcoming_events, many=True).data
-
-        # Get notifications
+        # Notifications are per user, so they are always read live
         notifications = Notification.objects.filter(
             user=request.user,
             living_space=living_space,
@@ -681,38 +844,7 @@ def get_shared_dashboard(request, living_space_id):
         ).order_by('-created_at')[:5]
         notifications_data = NotificationSerializer(notifications, many=True).data
 
-        # Get house rules
-        try:
-            house_rules = living_space.house_rules
-            house_rules_data = {
-                'id': house_rules.id,
-                'quiet_hours_start': house_rules.quiet_hours_start,
-                'quiet_hours_end': house_rules.quiet_hours_end,
-                'guests_allowed': house_rules.overnight_guests_allowed,
-                'max_guests': house_rules.max_consecutive_guest_nights,
-                'smoking_allowed': house_rules.smoking_allowed,
-                'pets_allowed': house_rules.pets_allowed,
-                'custom_rules': house_rules.custom_rules,
-                'created_at': house_rules.created_at,
-                'updated_at': house_rules.updated_at,
-            }
-        except HouseRules.DoesNotExist:
-            house_rules_data = None
-
-        return Response({
-            'living_space': {
-                'id': living_space.id,
-                'name': living_space.name,
-                'description': living_space.description,
-            },
-            'tasks': tasks_data,
-            'expenses': expenses_data,
-            'shopping_lists': shopping_data,
-            'bills': bills_data,
-            'calendar_events': events_data,
-            'notifications': notifications_data,
-            'house_rules': house_rules_data,
-        })
+        return Response(dict(snapshot, notifications=notifications_data))
     except LivingSpace.DoesNotExist:
         return Response({'error': 'Living space not found or access denied'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -69,12 +69,13 @@ class CompatibilityScoreAdmin(admin.ModelAdmin):
         }),
         ('Compatibility Breakdown', {
             'fields': (
-                'personality_score', 'lifestyle_score', 'communication_score', 'location_score'
+                'personality_score', 'lifestyle_score', 'basic_lifestyle_score',
+                'communication_score', 'location_score'
             ),
             'classes': ['wide']
         }),
         ('Overall Score', {
-            'fields': ('overall_score',)
+            'fields': ('overall_score', 'similarity_score')
         }),
         ('Metadata', {
             'fields': ('calculated_at',),
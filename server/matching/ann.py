@@ -0,0 +1,130 @@
+"""
+Approximate nearest-neighbour shortlist over personality vectors.
+
+The Big Five traits, cleanliness/social levels and boolean house rules make
+up a dense numeric vector per profile, and their contribution to
+``calculate_compatibility`` is distance based. ``TraitIndex`` is an
+inverted-file (IVF) index over those vectors: profiles are clustered with
+k-means, and a query only looks at the clusters nearest the viewer until it
+has enough candidates. The shortlist is then re-ranked with the full
+compatibility formula.
+
+Centroids are trained when the profile pool is rebuilt; profiles added or
+changed in between are assigned to their nearest existing centroid. Small
+pools are always scanned in full, so results there stay exact.
+"""
+import numpy as np
+
+from .scoring import FLAG_FIELDS, FLAG_SCORES, LEVEL_FIELDS, TRAIT_FIELDS, profile_row, rank_candidates
+
+ANN_MIN_POOL_SIZE = 20000  # candidate pools at most this large are scanned in full
+ANN_SHORTLIST_SIZE = 2000  # nearest candidates re-ranked with the full formula
+MAX_CLUSTERS = 1024
+TRAINING_ROWS_PER_CLUSTER = 64
+KMEANS_ITERATIONS = 10
+ASSIGN_CHUNK_SIZE = 8192
+
+# Weight of each dimension in the compatibility score (personality is 20%
+# split over five traits, levels and flags share basic lifestyle's 15%)
+DIMENSION_WEIGHTS = np.array(
+    [0.20 / len(TRAIT_FIELDS)] * len(TRAIT_FIELDS) + [0.15 / 5] * (len(LEVEL_FIELDS) + len(FLAG_FIELDS))
+)
+
+# Flags are placed so that a mismatch costs its score penalty under the
+# same ``min(diff * 1.5, 100)`` rule as traits and levels
+FLAG_SPANS = np.array([(FLAG_SCORES[field][0] - FLAG_SCORES[field][1]) / 1.5 for field in FLAG_FIELDS])
+
+
+def _raw_vectors(matrix):
+    return np.hstack([matrix.traits, matrix.levels, matrix.flags * FLAG_SPANS])
+
+
+def trait_vectors(matrix):
+    """Return the weighted personality vectors of every row of ``matrix``"""
+    return _raw_vectors(matrix) * np.sqrt(DIMENSION_WEIGHTS)
+
+
+def _nearest_centroids(vectors, centroids):
+    labels = np.empty(len(vectors), dtype=np.int32)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_SIZE):
+        chunk = vectors[start:start + ASSIGN_CHUNK_SIZE]
+        # Squared distances up to the per-row constant ||v||^2
+        distances = centroid_norms - 2 * chunk @ centroids.T
+        labels[start:start + ASSIGN_CHUNK_SIZE] = distances.argmin(axis=1)
+    return labels
+
+
+class TraitIndex:
+    def __init__(self, centroids):
+        self.centroids = centroids
+
+    @classmethod
+    def build(cls, matrix, seed=0):
+        """Train centroids on ``matrix`` and assign every row to a cluster"""
+        vectors = trait_vectors(matrix)
+        if not len(vectors):
+            return cls(np.empty((0, vectors.shape[1])))
+
+        rng = np.random.default_rng(seed)
+        clusters = int(min(MAX_CLUSTERS, max(1, np.sqrt(len(vectors)))))
+        sample_size = min(len(vectors), clusters * TRAINING_ROWS_PER_CLUSTER)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), clusters, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            labels = _nearest_centroids(sample, centroids)
+            counts = np.bincount(labels, minlength=clusters)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        index = cls(centroids)
+        matrix.cluster = _nearest_centroids(vectors, centroids)
+        return index
+
+    def assign(self, matrix):
+        """Assign rows of ``matrix`` added or changed since the last assignment"""
+        unassigned = np.flatnonzero(matrix.cluster < 0)
+        if len(unassigned) and len(self.centroids):
+            matrix.cluster[unassigned] = _nearest_centroids(trait_vectors(matrix.take(unassigned)), self.centroids)
+
+    def nearest(self, matrix, viewer, count):
+        """
+        Return indices of roughly the ``count`` rows of ``matrix`` nearest ``viewer``.
+
+        Clusters are probed nearest first until they hold at least ``count``
+        rows, then those rows are ordered by the exact weighted distance.
+        """
+        vector = trait_vectors(viewer)[0]
+        order = np.argsort(((self.centroids - vector) ** 2).sum(axis=1))
+        sizes = np.bincount(matrix.cluster, minlength=len(self.centroids))[order]
+        probed = order[:np.searchsorted(np.cumsum(sizes), count) + 1]
+
+        candidates = np.flatnonzero(np.isin(matrix.cluster, probed))
+        # Score points lost on these dimensions, as in calculate_compatibility
+        diff = np.abs(_raw_vectors(matrix.take(candidates)) - _raw_vectors(viewer)[0])
+        distances = (np.minimum(diff * 1.5, 100) * DIMENSION_WEIGHTS).sum(axis=1)
+        if len(candidates) > count:
+            candidates = candidates[np.argpartition(distances, count)[:count]]
+        return candidates
+
+
+def rank_suggestions(user, matrix, limit, after=None):
+    """
+    Return the best ``limit`` candidates of ``matrix`` like ``rank_candidates``.
+
+    Large matrices with a ``TraitIndex`` are narrowed to the nearest
+    ``ANN_SHORTLIST_SIZE`` candidates first. If the shortlist runs out
+    before filling the page, the whole matrix is scanned instead.
+    """
+    viewer_row = profile_row(user)
+    if matrix.index is None or len(matrix) <= ANN_MIN_POOL_SIZE or viewer_row is None:
+        return rank_candidates(user, matrix, limit, after)
+
+    shortlist = matrix.index.nearest(matrix, matrix.encode_like([viewer_row]), ANN_SHORTLIST_SIZE)
+    ranked = rank_candidates(user, matrix.take(shortlist), limit, after)
+    if len(ranked) < limit:
+        return rank_candidates(user, matrix, limit, after)
+    return ranked
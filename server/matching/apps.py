@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MatchingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'matching'
+
+    def ready(self):
+        # Register score cache invalidation handlers
+        from . import signals
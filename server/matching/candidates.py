@@ -0,0 +1,78 @@
+"""
+Hard-constraint candidate filtering.
+
+Before anything is scored, the encoded profile pool is narrowed to the
+candidates a user could actually live with: their ``UserPreferences`` (age,
+gender, smoking, pets) plus overlapping budgets, compatible move-in dates and
+the same preferred city. Each constraint is a vectorized comparison over the
+pool's attribute arrays, so filtering stays cheap however large the pool is.
+
+A constraint only excludes candidates known to violate it; candidates who
+left the relevant field blank are kept.
+"""
+from datetime import date
+
+import numpy as np
+
+from .models import UserPreferences
+
+MOVE_IN_WINDOW_DAYS = 60  # largest gap between two users' move-in dates
+
+
+def _years_before(day, years):
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:  # 29 February in a non-leap year
+        return day.replace(year=day.year - years, day=28)
+
+
+def _preference_mask(preferences, pool):
+    today = date.today()
+    mask = np.ones(len(pool), dtype=bool)
+
+    # Age, from birth dates: oldest allowed birthday is exclusive
+    born = pool.birth_date
+    latest_birth = _years_before(today, preferences.min_age).toordinal()
+    earliest_birth = _years_before(today, preferences.max_age + 1).toordinal()
+    mask &= (born == 0) | ((born > earliest_birth) & (born <= latest_birth))
+
+    if preferences.preferred_gender != 'any':
+        gender_code = pool.gender_encoder.codes.get(preferences.preferred_gender, -1)
+        mask &= (pool.gender == 0) | (pool.gender == gender_code)
+
+    if preferences.smoking_preference == 'smoker':
+        mask &= pool.smoker
+    elif preferences.smoking_preference == 'non_smoker':
+        mask &= ~pool.smoker
+
+    if preferences.pets_preference == 'has_pets':
+        mask &= pool.has_pets
+    elif preferences.pets_preference == 'no_pets':
+        mask &= ~pool.has_pets
+
+    return mask
+
+
+def candidate_mask(user, pool):
+    """Return a boolean mask of the rows of ``pool`` that ``user`` may be matched with"""
+    mask = pool.user_ids != user.id
+
+    preferences = UserPreferences.objects.filter(user=user).first()
+    if preferences is not None:
+        mask &= _preference_mask(preferences, pool)
+
+    # Budget ranges must overlap (NaN comparisons are False, so unknowns pass)
+    if user.budget_min is not None:
+        mask &= ~(pool.budget_max < user.budget_min)
+    if user.budget_max is not None:
+        mask &= ~(pool.budget_min > user.budget_max)
+
+    if user.move_in_date:
+        gap = np.abs(pool.move_in_date - user.move_in_date.toordinal())
+        mask &= (pool.move_in_date == 0) | (gap <= MOVE_IN_WINDOW_DAYS)
+
+    if user.preferred_city:
+        city_code = pool.city_encoder.codes.get(user.preferred_city.lower(), -1)
+        mask &= (pool.city == 0) | (pool.city == city_code)
+
+    return mask
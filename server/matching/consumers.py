@@ -0,0 +1,15 @@
+from channels.consumer import SyncConsumer
+from django.contrib.auth import get_user_model
+
+from .deck import refill_deck
+
+User = get_user_model()
+
+
+class SuggestionDeckConsumer(SyncConsumer):
+    """Background worker refilling suggestion decks, see ``matching.deck``"""
+
+    def deck_refill(self, message):
+        user = User.objects.filter(id=message['user_id']).first()
+        if user is not None:
+            refill_deck(user)
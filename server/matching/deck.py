@@ -0,0 +1,137 @@
+"""
+Precomputed suggestion decks.
+
+Ranking suggestions means scoring the viewer against the whole candidate
+pool, so it is done ahead of time: each user's ``SuggestionDeck`` holds their
+next ``DECK_SIZE`` ranked candidates, and ``get_match_suggestions`` only
+reads that row and drops the users seen since it was built.
+
+Decks are refilled by a channels worker (``python manage.py runworker
+suggestion-decks``) once fewer than ``DECK_REFILL_THRESHOLD`` unseen
+candidates are left, after ``matching.signals`` marked them stale because
+the user's profile, preferences or pooled fields changed, and once they are
+``DECK_MAX_AGE`` old so that new users and candidates' profile changes are
+picked up. Until then the current deck keeps being served; only a user's
+first deck, and decks ranked by an older ``SCORING_VERSION``, are built
+during a request.
+"""
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .ann import rank_suggestions
+from .candidates import candidate_mask
+from .models import SuggestionDeck
+from .pool import profile_pool
+from .score_cache import store_scores
+from .scoring import SCORING_VERSION
+from .seen import seen_mask, seen_user_ids
+
+User = get_user_model()
+
+DECK_SIZE = 100
+DECK_REFILL_THRESHOLD = 20  # unseen candidates left when a refill is requested
+DECK_CHANNEL = 'suggestion-decks'
+DECK_MAX_AGE = 600  # seconds
+DECK_REFILL_TIMEOUT = 300  # seconds before a lost refill request may be sent again
+
+
+def _refill_key(user_id):
+    return f'matching:deck-refill:{user_id}'
+
+
+def entry_score(compatibility_data):
+    """Score a deck entry is ranked by, as used in suggestion cursors"""
+    return compatibility_data['compatibility_score'] if isinstance(compatibility_data, dict) else compatibility_data
+
+
+def rank_unseen(user, limit, after=None):
+    """
+    Rank the candidates ``user`` may be matched with and hasn't interacted with yet.
+
+    Returns ``[(user_id, compatibility_data)]``, best first; see
+    ``rank_indices`` for ``after``.
+    """
+    pool = profile_pool.get()
+    seen = seen_mask(pool.user_ids, seen_user_ids(user.id))
+    eligible = candidate_mask(user, pool) & ~seen
+    return rank_suggestions(user, pool.take(eligible), limit, after)
+
+
+def refill_deck(user):
+    """Rank ``user``'s next ``DECK_SIZE`` candidates into their deck and return it"""
+    ranked = rank_unseen(user, DECK_SIZE + 1)
+
+    # The pool may still hold users deleted since its last refresh
+    existing = set(User.objects.filter(id__in=[user_id for user_id, _ in ranked]).values_list('id', flat=True))
+    ranked = [(user_id, compatibility_data) for user_id, compatibility_data in ranked if user_id in existing]
+
+    # Cache the scores being shown so follow-up lookups don't recompute them
+    store_scores(user.id, dict(ranked))
+
+    deck, _ = SuggestionDeck.objects.update_or_create(user=user, defaults={
+        'entries': [[user_id, compatibility_data] for user_id, compatibility_data in ranked[:DECK_SIZE]],
+        'complete': len(ranked) <= DECK_SIZE,
+        'stale': False,
+        'scoring_version': SCORING_VERSION,
+    })
+    cache.delete(_refill_key(user.id))
+    return deck
+
+
+def request_deck_refill(user_id):
+    """Ask the deck worker to refill ``user_id``'s deck once the current transaction commits"""
+    if cache.add(_refill_key(user_id), True, DECK_REFILL_TIMEOUT):
+        transaction.on_commit(lambda: _send_refill(user_id), robust=True)
+
+
+def _send_refill(user_id):
+    try:
+        async_to_sync(get_channel_layer().send)(DECK_CHANNEL, {'type': 'deck.refill', 'user_id': user_id})
+    except Exception:
+        cache.delete(_refill_key(user_id))
+        raise
+
+
+def mark_decks_stale(user_ids):
+    """Have the decks of ``user_ids`` rebuilt on their next read"""
+    SuggestionDeck.objects.filter(user_id__in=list(user_ids), stale=False).update(stale=True)
+
+
+def deck_suggestions(user, limit, after=None):
+    """
+    Return ``user``'s next ``limit`` suggestions as ``[(user_id, compatibility_data)]``.
+
+    Suggestions come from the user's deck. Pages reaching past the end of a
+    deck that does not hold every candidate are ranked on the spot.
+    """
+    deck = SuggestionDeck.objects.filter(user=user).first()
+    if deck is None or deck.scoring_version != SCORING_VERSION:
+        deck = refill_deck(user)
+
+    ids = [user_id for user_id, _ in deck.entries]
+    seen = seen_mask(ids, seen_user_ids(user.id))
+    unseen = [entry for entry, is_seen in zip(deck.entries, seen) if not is_seen]
+
+    expired = deck.built_at < timezone.now() - timedelta(seconds=DECK_MAX_AGE)
+    if deck.stale or expired or (len(unseen) < DECK_REFILL_THRESHOLD and not deck.complete):
+        request_deck_refill(user.id)
+
+    if after is not None:
+        after_score, after_id = after
+        unseen = [
+            (user_id, compatibility_data) for user_id, compatibility_data in unseen
+            if (entry_score(compatibility_data), -user_id) < (after_score, -after_id)
+        ]
+    if len(unseen) >= limit or deck.complete:
+        return [tuple(entry) for entry in unseen[:limit]]
+
+    if unseen:
+        user_id, compatibility_data = unseen[-1]
+        after = (entry_score(compatibility_data), user_id)
+    return [tuple(entry) for entry in unseen] + rank_unseen(user, limit - len(unseen), after)
@@ -0,0 +1,143 @@
+"""
+Recompute the stored compatibility score of every eligible pair.
+
+Scores are directional, so each user with a profile is scored against every
+candidate passing their hard constraints (``matching.candidates``). Viewers
+are split into chunks scored by a pool of worker processes, each holding the
+encoded profile matrix. Workers send back plain score arrays, which are
+written to ``CompatibilityScore`` in batches, overwriting rows already
+there. Pairs of users deleted while the command runs are left out of each
+batch.
+
+Workers are forked so that they inherit the configured Django setup and the
+matrix without pickling it; the command needs a platform that can fork.
+"""
+import multiprocessing
+import os
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from matching.candidates import candidate_mask
+from matching.deck import mark_decks_stale
+from matching.models import CompatibilityScore
+from matching.score_cache import SCORE_FIELDS
+from matching.scoring import SCORING_VERSION, ProfileMatrix, profile_rows, score_matrix
+from personality.models import PersonalityProfile
+
+User = get_user_model()
+
+# CompatibilityScore columns of each score array returned by _score_chunk
+SCORE_COLUMNS = {
+    'overall_score': 'compatibility',
+    'similarity_score': 'similarity',
+    'personality_score': 'personality',
+    'lifestyle_score': 'lifestyle',
+    'basic_lifestyle_score': 'basic_lifestyle',
+    'communication_score': 'communication',
+    'location_score': 'location',
+}
+
+# Profile matrix of the worker process, set by _init_worker
+_matrix = None
+
+
+def _init_worker(matrix):
+    global _matrix
+    _matrix = matrix
+
+
+def _score_chunk(viewer_ids):
+    """
+    Score the viewers' eligible pairs.
+
+    Returns ``{'user1': ..., 'user2': ..., <score>: ...}`` of equal-length
+    arrays, one entry per pair, with scores truncated to integers as in
+    ``CompatibilityBatch.result``.
+    """
+    viewers = User.objects.in_bulk(viewer_ids)
+    columns = {name: [] for name in ('user1', 'user2', *SCORE_COLUMNS.values())}
+    for viewer_id in viewer_ids:
+        if viewer_id not in viewers or viewer_id not in _matrix.positions:
+            continue  # Deleted or created since the matrix was built
+        eligible = candidate_mask(viewers[viewer_id], _matrix)
+        viewer_row = _matrix.take([_matrix.positions[viewer_id]])
+        batch = score_matrix(viewer_row, _matrix.take(eligible))
+        columns['user1'].append(np.full(len(batch), viewer_id, dtype=np.int64))
+        columns['user2'].append(np.asarray(batch.user_ids, dtype=np.int64))
+        columns['compatibility'].append(batch.compatibility)
+        columns['similarity'].append(batch.similarity)
+        for key, values in batch.breakdown.items():
+            columns[key].append(values)
+    return {
+        name: np.concatenate(arrays).astype(np.int64) if arrays else np.empty(0, dtype=np.int64)
+        for name, arrays in columns.items()
+    }
+
+
+class Command(BaseCommand):
+    help = 'Recompute and store compatibility scores for all eligible pairs of users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--city', help='Only score viewers whose preferred city is this one')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes to score with (default: one per CPU)')
+        parser.add_argument('--chunk-size', type=int, default=50, help='Viewers per worker task')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Scores written per query')
+
+    def handle(self, *args, **options):
+        if min(options['processes'], options['chunk_size'], options['batch_size']) < 1:
+            raise CommandError('--processes, --chunk-size and --batch-size must be positive')
+
+        matrix = ProfileMatrix(profile_rows(PersonalityProfile.objects.all()))
+        viewers = PersonalityProfile.objects.order_by('user_id')
+        if options['city']:
+            viewers = viewers.filter(user__preferred_city__iexact=options['city'])
+        # Profiles created since the matrix was built are left for the next run
+        viewer_ids = [user_id for user_id in viewers.values_list('user_id', flat=True) if user_id in matrix.positions]
+        chunk_size = options['chunk_size']
+        chunks = [viewer_ids[start:start + chunk_size] for start in range(0, len(viewer_ids), chunk_size)]
+
+        if options['processes'] == 1 or len(chunks) <= 1:
+            _init_worker(matrix)
+            stored = self._store(map(_score_chunk, chunks), options['batch_size'])
+        else:
+            # Forked workers must open connections of their own rather than share these
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(options['processes'], _init_worker, (matrix,)) as pool:
+                stored = self._store(pool.imap_unordered(_score_chunk, chunks), options['batch_size'])
+
+        # Decks are ranked by the scores just replaced
+        mark_decks_stale(viewer_ids)
+        self.stdout.write(self.style.SUCCESS(f'Stored {stored} scores for {len(viewer_ids)} users'))
+
+    def _store(self, chunk_results, batch_size):
+        stored = 0
+        for scored in chunk_results:
+            for start in range(0, len(scored['user1']), batch_size):
+                stored += self._write({name: values[start:start + batch_size] for name, values in scored.items()})
+        return stored
+
+    def _write(self, scored):
+        """
+        Write one batch of ``_score_chunk`` results, leaving out users
+        deleted since they were scored, and return how many rows were written.
+        """
+        user_ids = np.union1d(scored['user1'], scored['user2']).tolist()
+        existing = np.fromiter(User.objects.filter(id__in=user_ids).values_list('id', flat=True), dtype=np.int64)
+        keep = np.isin(scored['user1'], existing) & np.isin(scored['user2'], existing)
+        columns = {name: values[keep].tolist() for name, values in scored.items()}
+        rows = [
+            CompatibilityScore(user1_id=user1_id, user2_id=user2_id, scoring_version=SCORING_VERSION, **{
+                field: columns[name][index] for field, name in SCORE_COLUMNS.items()
+            })
+            for index, (user1_id, user2_id) in enumerate(zip(columns['user1'], columns['user2']))
+        ]
+        if rows:
+            CompatibilityScore.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['user1', 'user2'], update_fields=SCORE_FIELDS,
+            )
+        return len(rows)
@@ -0,0 +1,40 @@
+"""
+Re-score stored scores computed with an older ``SCORING_VERSION``.
+
+Reads already re-score stale rows lazily (see ``matching.score_cache``);
+this sweeps up the rows nobody reads, a batch at a time, so it can run in
+the background after a scoring change is deployed.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from matching.score_cache import upgrade_match_scores, upgrade_scores
+from matching.scoring import SCORING_VERSION
+
+
+class Command(BaseCommand):
+    help = f'Re-score stored compatibility scores and matches older than scoring version {SCORING_VERSION}'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows re-scored per batch')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to wait between batches')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        upgraded = {}
+        for name, upgrade in (('scores', upgrade_scores), ('matches', upgrade_match_scores)):
+            upgraded[name] = 0
+            while True:
+                count = upgrade(batch_size)
+                upgraded[name] += count
+                if count < batch_size:
+                    break
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Upgraded {upgraded['scores']} scores and {upgraded['matches']} matches to version {SCORING_VERSION}"
+        ))
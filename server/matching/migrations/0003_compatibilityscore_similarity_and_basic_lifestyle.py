@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matching', '0002_match_is_primary_for_user1_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compatibilityscore',
+            name='basic_lifestyle_score',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='compatibilityscore',
+            name='similarity_score',
+            field=models.FloatField(default=0.0),
+        ),
+    ]
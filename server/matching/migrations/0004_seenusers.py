@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:46
+
+import django.db.models.deletion
+import numpy as np
+from django.conf import settings
+from django.db import migrations, models
+
+
+def encode_seen(user_ids):
+    # Frozen copy of matching.seen.encode_seen as of this migration: sorted,
+    # de-duplicated little-endian uint32s
+    return np.unique(np.asarray(list(user_ids), dtype=np.dtype('<u4'))).tobytes()
+
+
+def build_seen_sets(apps, schema_editor):
+    MatchInteraction = apps.get_model('matching', 'MatchInteraction')
+    SeenUsers = apps.get_model('matching', 'SeenUsers')
+    seen = {}
+    for user_id, target_user_id in MatchInteraction.objects.values_list('user_id', 'target_user_id').iterator():
+        seen.setdefault(user_id, []).append(target_user_id)
+    SeenUsers.objects.bulk_create([
+        SeenUsers(user_id=user_id, user_ids=encode_seen(target_ids))
+        for user_id, target_ids in seen.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_user_fulltext'),
+        ('matching', '0003_compatibilityscore_similarity_and_basic_lifestyle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeenUsers',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='seen_users', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('user_ids', models.BinaryField(default=b'')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(build_seen_sets, migrations.RunPython.noop),
+    ]
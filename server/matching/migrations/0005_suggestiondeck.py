@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_user_fulltext'),
+        ('matching', '0004_seenusers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuggestionDeck',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='suggestion_deck', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('entries', models.JSONField(default=list)),
+                ('complete', models.BooleanField(default=False)),
+                ('stale', models.BooleanField(default=False)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coliving', '0009_livingspace_created_at_index'),
+        ('matching', '0005_suggestiondeck'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compatibilityscore',
+            name='scoring_version',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='scoring_version',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='suggestiondeck',
+            name='scoring_version',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='compatibilityscore',
+            index=models.Index(fields=['scoring_version'], name='matching_co_scoring_7e9c62_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['scoring_version'], name='matching_ma_scoring_123153_idx'),
+        ),
+    ]
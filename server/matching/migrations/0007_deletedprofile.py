@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-17 05:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matching', '0006_scoring_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from .scoring import SCORING_VERSION
+
 User = get_user_model()
 
 class Match(models.Model):
@@ -18,6 +20,7 @@ class Match(models.Model):
         validators=[MinValueValidator(0.0), MaxValueValidator(100.0)]
     )
     status = models.CharField(max_length=20, choices=MATCH_STATUS_CHOICES, default='pending')
+    scoring_version = models.PositiveSmallIntegerField(default=SCORING_VERSION)  # SCORING_VERSION the score was computed with
 
     # Primary match flags for each user
     is_primary_for_user1 = models.BooleanField(default=False, help_text="Is this user1's primary match?")
@@ -35,6 +38,7 @@ class Match(models.Model):
             models.Index(fields=['user1', 'status']),
             models.Index(fields=['user2', 'status']),
             models.Index(fields=['compatibility_score']),
+            models.Index(fields=['scoring_version']),
         ]
 
     def __str__(self):
@@ -114,19 +118,59 @@ class MatchInteraction(models.Model):
     def __str__(self):
         return f"{self.user.username} {self.interaction_type} {self.target_user.username}"
 
+class SeenUsers(models.Model):
+    """Ids of every user ``user`` has interacted with, encoded by ``matching.seen``"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='seen_users')
+    user_ids = models.BinaryField(default=b'')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Users seen by {self.user.username}"
+
+class SuggestionDeck(models.Model):
+    """A user's next ranked suggestions, maintained by ``matching.deck``"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='suggestion_deck')
+    entries = models.JSONField(default=list)  # [[user_id, compatibility_data], ...], best first
+    complete = models.BooleanField(default=False)  # every remaining candidate is in entries
+    stale = models.BooleanField(default=False)
+    scoring_version = models.PositiveSmallIntegerField(default=SCORING_VERSION)
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Suggestion deck for {self.user.username}"
+
+class DeletedProfile(models.Model):
+    """A deleted personality profile, so that ``matching.pool`` drops it in every process"""
+    user_id = models.IntegerField()  # Not a foreign key: the user is often deleted too
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Profile of user {self.user_id} deleted at {self.deleted_at}"
+
 class CompatibilityScore(models.Model):
+    """
+    Cached result of calculate_compatibility(user1, user2).
+
+    Scores are directional (user1 is the viewer) because some lifestyle
+    rules are asymmetric. Rows are removed whenever either user's profile or
+    preferred city changes, and re-scored once their ``scoring_version`` is
+    out of date.
+    """
     user1 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='compatibility_scores_as_user1')
     user2 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='compatibility_scores_as_user2')
 
     # Detailed compatibility breakdown
     personality_score = models.FloatField(default=0.0)
     lifestyle_score = models.FloatField(default=0.0)
+    basic_lifestyle_score = models.FloatField(default=0.0)
     communication_score = models.FloatField(default=0.0)
     location_score = models.FloatField(default=100.0)  # Default full score if no location data
 
     overall_score = models.FloatField(
         validators=[MinValueValidator(0.0), MaxValueValidator(100.0)]
     )
+    similarity_score = models.FloatField(default=0.0)
+    scoring_version = models.PositiveSmallIntegerField(default=SCORING_VERSION)  # SCORING_VERSION the row was computed with
 
     calculated_at = models.DateTimeField(auto_now=True)
 
@@ -136,11 +180,43 @@ class CompatibilityScore(models.Model):
             models.Index(fields=['overall_score']),
             models.Index(fields=['user1', 'overall_score']),
             models.Index(fields=['user2', 'overall_score']),
+            models.Index(fields=['scoring_version']),
         ]
 
     def __str__(self):
         return f"Compatibility: {self.user1.username} & {self.user2.username} ({self.overall_score}%)"
 
+    @classmethod
+    def from_result(cls, user1_id, user2_id, result):
+        """Build an unsaved row from a calculate_compatibility result"""
+        breakdown = result['breakdown']
+        return cls(
+            user1_id=user1_id,
+            user2_id=user2_id,
+            personality_score=breakdown['personality'],
+            lifestyle_score=breakdown['lifestyle'],
+            basic_lifestyle_score=breakdown['basic_lifestyle'],
+            communication_score=breakdown['communication'],
+            location_score=breakdown['location'],
+            overall_score=result['compatibility_score'],
+            similarity_score=result['similarity_score'],
+            scoring_version=SCORING_VERSION,
+        )
+
+    def as_result(self):
+        """Return this score in calculate_compatibility format"""
+        return {
+            'compatibility_score': round(self.overall_score),
+            'similarity_score': round(self.similarity_score),
+            'breakdown': {
+                'lifestyle': round(self.lifestyle_score),
+                'basic_lifestyle': round(self.basic_lifestyle_score),
+                'personality': round(self.personality_score),
+                'communication': round(self.communication_score),
+                'location': round(self.location_score),
+            }
+        }
+
 class UserPreferences(models.Model):
     GENDER_CHOICES = [
         ('any', 'Any'),
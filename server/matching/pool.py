@@ -0,0 +1,107 @@
+"""
+In-memory pool of encoded personality profiles.
+
+Encoding every profile costs far more than scoring it, so each process keeps
+the whole pool encoded as a ``ProfileMatrix`` and only re-reads rows that
+changed since its last refresh. Writes in the same process mark the pool
+dirty through ``matching.signals``; changes made by other processes are
+picked up within ``POOL_REFRESH_INTERVAL`` seconds, and a periodic full
+rebuild retrains the pool's ``TraitIndex``.
+
+Deleted profiles leave no changed row behind, so ``matching.signals`` logs
+each deletion as a ``DeletedProfile`` row. Refreshes drop the profiles
+logged since the last one, and rebuilds purge log rows old enough that no
+process can still need them.
+"""
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Q
+from django.utils import timezone
+
+from personality.models import PersonalityProfile
+from .ann import TraitIndex
+from .models import DeletedProfile
+from .scoring import ProfileMatrix, profile_rows
+
+POOL_REFRESH_INTERVAL = 5  # seconds between checks for changed profiles
+POOL_REBUILD_INTERVAL = 600  # seconds between full rebuilds
+
+
+class ProfilePool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Forget the encoded pool so the next ``get`` rebuilds it"""
+        self._matrix = None
+        self._built_at = 0.0
+        self._checked_at = 0.0
+        self._loaded_until = None
+        self._dirty = False
+
+    def mark_dirty(self):
+        """Make the next ``get`` look for changed profiles immediately"""
+        self._dirty = True
+
+    def discard(self, user_id):
+        """Drop a deleted profile from the pool"""
+        with self._lock:
+            if self._matrix is not None and user_id in self._matrix.positions:
+                self._matrix = self._matrix.without([user_id])
+
+    def get(self):
+        """Return a ``ProfileMatrix`` of every profile, refreshing it if due"""
+        now = time.monotonic()
+        if self._matrix is None or now - self._built_at > POOL_REBUILD_INTERVAL:
+            with self._lock:
+                if self._matrix is None or now - self._built_at > POOL_REBUILD_INTERVAL:
+                    self._rebuild()
+        elif self._dirty or now - self._checked_at > POOL_REFRESH_INTERVAL:
+            with self._lock:
+                if self._dirty or now - self._checked_at > POOL_REFRESH_INTERVAL:
+                    self._refresh()
+        return self._matrix
+
+    def _rebuild(self):
+        loaded_until = timezone.now()
+        # Any pool loaded before this has been rebuilt since, rather than refreshed
+        DeletedProfile.objects.filter(
+            deleted_at__lt=loaded_until - timedelta(seconds=2 * POOL_REBUILD_INTERVAL)
+        ).delete()
+        matrix = ProfileMatrix(profile_rows(PersonalityProfile.objects.all()))
+        matrix.index = TraitIndex.build(matrix)
+        self._matrix = matrix
+        self._loaded_until = loaded_until
+        self._built_at = self._checked_at = time.monotonic()
+        self._dirty = False
+
+    def _refresh(self):
+        loaded_until = timezone.now()
+        self._dirty = False
+        # Profile answers and the user's preferred city both feed into scores
+        changed = PersonalityProfile.objects.filter(
+            Q(updated_at__gte=self._loaded_until) | Q(user__updated_at__gte=self._loaded_until)
+        )
+        rows = list(profile_rows(changed))
+        matrix = self._matrix
+        deleted = np.fromiter(DeletedProfile.objects.filter(
+            deleted_at__gte=self._loaded_until
+        ).values_list('user_id', flat=True), dtype=np.int64)
+        deleted = np.isin(matrix.user_ids, deleted)
+        if deleted.any():
+            matrix = matrix.take(~deleted)
+        # Profiles deleted and then created again come back here
+        if rows:
+            matrix = matrix.with_rows(rows)
+        if deleted.any() or rows:
+            matrix.index.assign(matrix)
+            self._matrix = matrix
+        self._loaded_until = loaded_until
+        self._checked_at = time.monotonic()
+
+
+profile_pool = ProfilePool()
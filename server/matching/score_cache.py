@@ -0,0 +1,137 @@
+"""
+Persisted compatibility scores.
+
+Scores are read from ``CompatibilityScore`` when present and computed with
+the batch engine otherwise, then written back so later requests can reuse
+them. ``invalidate_scores`` drops every cached pair involving a user; it is
+called from ``matching.signals`` whenever an input to the score changes.
+
+Stored scores are stamped with the ``SCORING_VERSION`` they were computed
+with. Rows of older versions count as missing, so reading them re-scores
+them, and ``Match`` scores are refreshed when listed; the
+``upgrade_scores`` command sweeps up the rest in batches.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+from .models import CompatibilityScore, Match
+from .scoring import SCORING_VERSION, score_candidates
+
+User = get_user_model()
+
+# Columns rewritten when a stored score is computed again
+SCORE_FIELDS = [
+    'personality_score', 'lifestyle_score', 'basic_lifestyle_score', 'communication_score',
+    'location_score', 'overall_score', 'similarity_score', 'scoring_version', 'calculated_at',
+]
+
+
+def cached_scores(user, candidates):
+    """
+    Return ``{candidate_id: result}`` for ``user`` against each candidate.
+
+    Results have the same shape as ``calculate_compatibility``. Candidates
+    should have ``personality_profile`` loaded (``select_related``) to keep
+    cache misses to a single query.
+    """
+    candidates = list(candidates)
+    if not candidates:
+        return {}
+
+    results = {
+        score.user2_id: score.as_result()
+        for score in CompatibilityScore.objects.filter(
+            user1=user,
+            user2_id__in=[candidate.id for candidate in candidates],
+            scoring_version=SCORING_VERSION
+        )
+    }
+
+    missing = [candidate for candidate in candidates if candidate.id not in results]
+    if missing:
+        computed = score_candidates(user, missing)
+        store_scores(user.id, computed)
+        results.update(computed)
+
+    return results
+
+
+def cached_compatibility(user1, user2):
+    """Cached equivalent of calculate_compatibility(user1, user2)"""
+    return cached_scores(user1, [user2])[user2.id]
+
+
+def store_scores(user_id, results):
+    """Persist ``{candidate_id: result}`` scores computed for ``user_id``"""
+    # Pairs without profiles score 0 and are not worth caching
+    rows = [
+        CompatibilityScore.from_result(user_id, candidate_id, result)
+        for candidate_id, result in results.items()
+        if isinstance(result, dict)
+    ]
+    CompatibilityScore.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['user1', 'user2'], update_fields=SCORE_FIELDS,
+    )
+
+
+def invalidate_scores(user_id):
+    """Drop every cached score involving ``user_id``"""
+    CompatibilityScore.objects.filter(Q(user1_id=user_id) | Q(user2_id=user_id)).delete()
+
+
+def _match_score(match):
+    result = score_candidates(match.user1, [match.user2])[match.user2_id]
+    return result['compatibility_score'] if isinstance(result, dict) else result
+
+
+def refresh_match_scores(matches):
+    """
+    Re-score ``matches`` computed with an older ``SCORING_VERSION``, in place.
+
+    Both users should have ``personality_profile`` loaded; scores are taken
+    from ``user1``'s side and saved in one query.
+    """
+    stale = [match for match in matches if match.scoring_version != SCORING_VERSION]
+    for match in stale:
+        match.compatibility_score = _match_score(match)
+        match.scoring_version = SCORING_VERSION
+    if stale:
+        Match.objects.bulk_update(stale, ['compatibility_score', 'scoring_version'])
+    return matches
+
+
+def upgrade_scores(batch_size):
+    """Re-score up to ``batch_size`` stored scores of older versions; return how many were handled"""
+    stale = list(
+        CompatibilityScore.objects.exclude(scoring_version=SCORING_VERSION)
+        .order_by('user1_id', 'user2_id').values_list('id', 'user1_id', 'user2_id')[:batch_size]
+    )
+    if not stale:
+        return 0
+
+    users = User.objects.select_related('personality_profile').in_bulk(
+        {user_id for _, user1_id, user2_id in stale for user_id in (user1_id, user2_id)}
+    )
+    candidates = {}
+    for _, user1_id, user2_id in stale:
+        if user1_id in users and user2_id in users:
+            candidates.setdefault(user1_id, []).append(users[user2_id])
+    for user1_id, others in candidates.items():
+        store_scores(user1_id, score_candidates(users[user1_id], others))
+
+    # Pairs that no longer score (a profile was removed) are not worth keeping
+    CompatibilityScore.objects.filter(
+        id__in=[score_id for score_id, _, _ in stale]
+    ).exclude(scoring_version=SCORING_VERSION).delete()
+    return len(stale)
+
+
+def upgrade_match_scores(batch_size):
+    """Re-score up to ``batch_size`` matches of older versions; return how many were handled"""
+    stale = list(
+        Match.objects.exclude(scoring_version=SCORING_VERSION)
+        .select_related('user1__personality_profile', 'user2__personality_profile')
+        .order_by('id')[:batch_size]
+    )
+    refresh_match_scores(stale)
+    return len(stale)
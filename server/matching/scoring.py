@@ -0,0 +1,602 @@
+"""
+Batch compatibility scoring.
+
+``matching.views.calculate_compatibility`` scores one pair of users at a time.
+The helpers here encode personality profiles into NumPy arrays so that one
+user can be scored against many candidates in a single vectorized pass. The
+results are identical to the per-pair implementation.
+"""
+import copy
+import json
+
+import numpy as np
+
+from personality.lifestyle import LIFESTYLE_CHOICES, LIFESTYLE_OTHER
+from personality.models import PersonalityProfile
+
+TRAIT_FIELDS = ['openness', 'conscientiousness', 'extraversion', 'agreeableness', 'neuroticism']
+LEVEL_FIELDS = ['cleanliness_level', 'social_level']
+FLAG_FIELDS = ['quiet_hours', 'pets_allowed', 'smoking_allowed']
+# Version of the scoring rules and weights. Bump it whenever scores change:
+# stored scores of older versions are then re-scored when read, and by the
+# ``upgrade_scores`` command. It is also the default of every
+# ``scoring_version`` column, so run makemigrations after bumping it.
+SCORING_VERSION = 1
+
+PROFILE_FIELDS = TRAIT_FIELDS + LEVEL_FIELDS + FLAG_FIELDS + ['communication_style', 'lifestyle_codes']
+
+# User fields carried in each row; only preferred_city affects the score, the
+# rest feed the hard-constraint filters in ``matching.candidates``
+USER_FIELDS = [
+    'preferred_city', 'date_of_birth', 'gender', 'smoking_preference', 'pets_preference',
+    'budget_min', 'budget_max', 'move_in_date',
+]
+
+# Score awarded for (match, mismatch) on each boolean preference
+FLAG_SCORES = {
+    'quiet_hours': (100, 50),
+    'pets_allowed': (100, 30),
+    'smoking_allowed': (100, 20),
+}
+
+
+# Lifestyle question rules.
+# Each rule scores two answers to the same question (0-100).
+
+COOKING_COMPATIBILITY = {
+    ('daily', 'few_times_week'): 90,
+    ('daily', 'daily'): 100,
+    ('few_times_week', 'few_times_week'): 100,
+    ('rarely', 'never'): 80,
+}
+
+VISITOR_LEVELS = {'frequently': 100, 'occasionally': 75, 'rarely': 50, 'never': 25}
+
+NOISE_LEVELS = {'very_quiet': 100, 'moderate': 50, 'dont_mind': 0}
+
+ACTIVITY_LEVELS = {'love_it': 100, 'occasionally': 60, 'rarely': 30, 'prefer_not': 0}
+
+PET_COMPATIBILITY = {
+    ('have_pets', 'love_pets'): 95,
+    ('have_pets', 'okay_with_pets'): 85,
+    ('have_pets', 'no_pets'): 30,
+    ('have_pets', 'allergic'): 20,
+    ('love_pets', 'okay_with_pets'): 90,
+    ('okay_with_pets', 'no_pets'): 50,
+    ('allergic', 'have_pets'): 25,
+    ('no_pets', 'have_pets'): 30,
+}
+
+
+def _same_answer(match_score, partial_score):
+    def rule(val1, val2):
+        return match_score if val1 == val2 else partial_score
+    return rule
+
+
+def _pair_table(table, default):
+    def rule(val1, val2):
+        return table.get((val1, val2), table.get((val2, val1), default))
+    return rule
+
+
+def _level_distance(levels):
+    def rule(val1, val2):
+        return max(0, 100 - abs(levels.get(val1, 50) - levels.get(val2, 50)))
+    return rule
+
+
+def _smoking_drinking(val1, val2):
+    if val1 == val2:
+        return 100
+    if 'neither' in [val1, val2]:
+        # Neither person wants smoking/drinking - partial mismatch
+        return 40
+    return 60
+
+
+def _bill_payment(val1, val2):
+    if val1 == val2:
+        return 100
+    if 'very_strict' in [val1, val2]:
+        # Strict person might have issues with flexible person
+        return 50
+    return 75
+
+
+def _gender_preference(val1, val2):
+    if val1 == 'any_gender' and val2 == 'any_gender':
+        return 100
+    if 'any_gender' in [val1, val2]:
+        return 75
+    return 100 if val1 == val2 else 50
+
+
+def _allergies(val1, val2):
+    if val1 == 'none' and val2 == 'none':
+        return 100
+    if 'none' in [val1, val2]:
+        return 80
+    return 60
+
+
+LIFESTYLE_RULES = [
+    ('early_bird', _same_answer(100, 60)),
+    ('cooking_frequency', _pair_table(COOKING_COMPATIBILITY, 50)),
+    ('hosting_visitors', _level_distance(VISITOR_LEVELS)),
+    ('smoking_drinking', _smoking_drinking),
+    ('noise_preference', _level_distance(NOISE_LEVELS)),
+    ('chore_frequency', _same_answer(100, 70)),
+    ('sharing_items', _same_answer(100, 65)),
+    ('bill_splitting', _same_answer(100, 70)),
+    ('cost_sharing', _same_answer(100, 65)),
+    ('bill_payment', _bill_payment),
+    ('roommate_relationship', _same_answer(100, 60)),
+    ('group_activities', _level_distance(ACTIVITY_LEVELS)),
+    ('gender_preference', _gender_preference),
+    ('pets', _pair_table(PET_COMPATIBILITY, 70)),
+    ('allergies', _allergies),
+    ('ideal_personality', _same_answer(100, 65)),
+]
+
+
+def _lifestyle_tables():
+    """
+    Precompute every rule's score for each pair of known answers.
+
+    Returns an array indexed by ``[question, code1, code2]`` where codes are
+    those of ``personality.lifestyle``; rows and columns for code 0 (not
+    answered) are zero.
+    """
+    size = max(len(choices) for choices in LIFESTYLE_CHOICES.values()) + 1
+    tables = np.zeros((len(LIFESTYLE_RULES), size, size), dtype=np.float64)
+    for question, (key, rule) in enumerate(LIFESTYLE_RULES):
+        choices = LIFESTYLE_CHOICES[key]
+        for code1, answer1 in enumerate(choices, start=1):
+            for code2, answer2 in enumerate(choices, start=1):
+                tables[question, code1, code2] = rule(answer1, answer2)
+    return tables
+
+
+LIFESTYLE_TABLES = _lifestyle_tables()
+_LIFESTYLE_TABLE_LISTS = LIFESTYLE_TABLES.tolist()
+
+
+def lifestyle_answer(value):
+    """
+    Return a lifestyle answer in a form the rules and encoders can hash.
+
+    Answers are free-form JSON, so lists and objects are replaced by their
+    canonical JSON text; they still only equal identical answers.
+    """
+    try:
+        hash(value)
+    except TypeError:
+        return json.dumps(value, sort_keys=True)
+    return value
+
+
+def pair_lifestyle_similarity(codes1, codes2):
+    """
+    ``calculate_lifestyle_similarity`` for two stored ``lifestyle_codes``.
+
+    Returns None when either side has no codes or answers outside the
+    known choices, in which case the raw answers must be compared instead.
+    """
+    codes1, codes2 = bytes(codes1), bytes(codes2)
+    if len(codes1) != len(LIFESTYLE_RULES) or len(codes2) != len(LIFESTYLE_RULES):
+        return None
+    if LIFESTYLE_OTHER in codes1 or LIFESTYLE_OTHER in codes2:
+        return None
+
+    scores = [
+        _LIFESTYLE_TABLE_LISTS[question][code1][code2]
+        for question, (code1, code2) in enumerate(zip(codes1, codes2))
+        if code1 and code2
+    ]
+    return round(sum(scores) / len(scores)) if scores else 50
+
+
+class CategoryEncoder:
+    """Assigns small integer codes to categorical values, 0 meaning missing."""
+
+    def __init__(self, values=()):
+        self.codes = {}
+        self.values = [None]
+        for value in values:
+            self.encode(value)
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+def _ordinals(rows, field):
+    return np.fromiter(
+        (row[field].toordinal() if row[field] else 0 for row in rows),
+        dtype=np.int64, count=len(rows),
+    )
+
+
+def _amounts(rows, field):
+    return np.fromiter(
+        (np.nan if row[field] is None else row[field] for row in rows),
+        dtype=np.float64, count=len(rows),
+    )
+
+
+class ProfileMatrix:
+    """
+    Column-oriented encoding of a set of profile rows.
+
+    Rows are dicts holding ``user_id`` and every field in ``USER_FIELDS`` and
+    ``PROFILE_FIELDS``, as produced by ``profile_row`` and ``profile_rows``.
+    Matrices scored against each other must share their encoders.
+
+    Besides the scoring inputs, each row's user attributes are kept for
+    filtering: dates as ordinals and budgets as floats, with 0 and NaN
+    meaning unknown. ``cluster`` is the row's ``TraitIndex`` cluster, -1
+    until assigned.
+    """
+
+    ARRAYS = (
+        'user_ids', 'traits', 'levels', 'flags', 'communication', 'city', 'lifestyle', 'has_lifestyle',
+        'gender', 'birth_date', 'smoker', 'has_pets', 'budget_min', 'budget_max', 'move_in_date',
+        'cluster',
+    )
+
+    # Nearest-neighbour index over the rows, see ``matching.ann``
+    index = None
+
+    def __init__(self, rows, lifestyle_encoders=None, city_encoder=None, communication_encoder=None, gender_encoder=None):
+        rows = list(rows)
+        # Seeded with the known answers so codes match the stored lifestyle_codes
+        self.lifestyle_encoders = lifestyle_encoders or [CategoryEncoder(LIFESTYLE_CHOICES[key]) for key, _rule in LIFESTYLE_RULES]
+        self.city_encoder = city_encoder or CategoryEncoder()
+        self.communication_encoder = communication_encoder or CategoryEncoder()
+        self.gender_encoder = gender_encoder or CategoryEncoder()
+
+        count = len(rows)
+        self.user_ids = np.fromiter((row['user_id'] for row in rows), dtype=np.int64, count=count)
+        self.traits = np.array([[row[f] for f in TRAIT_FIELDS] for row in rows], dtype=np.float64).reshape(count, len(TRAIT_FIELDS))
+        self.levels = np.array([[row[f] for f in LEVEL_FIELDS] for row in rows], dtype=np.float64).reshape(count, len(LEVEL_FIELDS))
+        self.flags = np.array([[bool(row[f]) for f in FLAG_FIELDS] for row in rows], dtype=bool).reshape(count, len(FLAG_FIELDS))
+        self.communication = np.fromiter(
+            (self.communication_encoder.encode(row['communication_style']) for row in rows),
+            dtype=np.int32, count=count,
+        )
+        self.city = np.fromiter(
+            (self.city_encoder.encode(row['preferred_city'].lower()) if row['preferred_city'] else 0 for row in rows),
+            dtype=np.int32, count=count,
+        )
+
+        self.lifestyle = np.zeros((count, len(LIFESTYLE_RULES)), dtype=np.int32)
+        self.has_lifestyle = np.fromiter((bool(row['lifestyle_codes']) for row in rows), dtype=bool, count=count)
+        if self.has_lifestyle.any():
+            encoded = b''.join(bytes(row['lifestyle_codes']) for row in rows if row['lifestyle_codes'])
+            self.lifestyle[self.has_lifestyle] = np.frombuffer(encoded, dtype=np.uint8).reshape(-1, len(LIFESTYLE_RULES))
+        # Answers outside the known choices get codes of their own
+        for index, question in np.argwhere(self.lifestyle == LIFESTYLE_OTHER):
+            key = LIFESTYLE_RULES[question][0]
+            self.lifestyle[index, question] = self.lifestyle_encoders[question].encode(
+                lifestyle_answer(rows[index]['lifestyle_data'][key])
+            )
+
+        self.gender = np.fromiter(
+            (self.gender_encoder.encode(row['gender']) if row['gender'] else 0 for row in rows),
+            dtype=np.int32, count=count,
+        )
+        self.birth_date = _ordinals(rows, 'date_of_birth')
+        self.move_in_date = _ordinals(rows, 'move_in_date')
+        self.smoker = np.fromiter((row['smoking_preference'] == 'smoker' for row in rows), dtype=bool, count=count)
+        self.has_pets = np.fromiter((row['pets_preference'] == 'has_pets' for row in rows), dtype=bool, count=count)
+        self.budget_min = _amounts(rows, 'budget_min')
+        self.budget_max = _amounts(rows, 'budget_max')
+        self.cluster = np.full(count, -1, dtype=np.int32)
+
+        self._positions = None
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def positions(self):
+        """Map each user id to its row index"""
+        if self._positions is None:
+            self._positions = {int(user_id): index for index, user_id in enumerate(self.user_ids)}
+        return self._positions
+
+    def encode_like(self, rows):
+        """Encode ``rows`` with this matrix's encoders so the two can be scored together"""
+        return ProfileMatrix(
+            rows, self.lifestyle_encoders, self.city_encoder, self.communication_encoder, self.gender_encoder,
+        )
+
+    def _derive(self, arrays):
+        matrix = copy.copy(self)
+        for name, values in arrays.items():
+            setattr(matrix, name, values)
+        matrix._positions = None
+        return matrix
+
+    def with_rows(self, rows):
+        """Return a copy with ``rows`` replacing the same users' rows or appended"""
+        delta = self.encode_like(rows)
+        positions = np.fromiter(
+            (self.positions.get(int(user_id), -1) for user_id in delta.user_ids),
+            dtype=np.int64, count=len(delta),
+        )
+        replaced = positions >= 0
+
+        arrays = {}
+        for name in self.ARRAYS:
+            values = getattr(self, name).copy()
+            changes = getattr(delta, name)
+            values[positions[replaced]] = changes[replaced]
+            arrays[name] = np.concatenate([values, changes[~replaced]])
+        return self._derive(arrays)
+
+    def without(self, user_ids):
+        """Return a copy without the rows of ``user_ids``"""
+        return self.take(~np.isin(self.user_ids, list(user_ids)))
+
+    def take(self, rows):
+        """Return a copy holding only ``rows`` (a boolean mask or index array)"""
+        return self._derive({name: getattr(self, name)[rows] for name in self.ARRAYS})
+
+
+class CompatibilityBatch:
+    """Scores of one user against every row of a ``ProfileMatrix``."""
+
+    def __init__(self, user_ids, compatibility, similarity, breakdown):
+        self.user_ids = user_ids
+        self.compatibility = compatibility
+        self.similarity = similarity
+        self.breakdown = breakdown
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def result(self, index):
+        """Return the score at ``index`` in ``calculate_compatibility`` format"""
+        return {
+            'compatibility_score': int(self.compatibility[index]),
+            'similarity_score': int(self.similarity[index]),
+            'breakdown': {key: int(values[index]) for key, values in self.breakdown.items()},
+        }
+
+    def as_dict(self):
+        """Map each candidate user id to its score"""
+        return {int(user_id): self.result(index) for index, user_id in enumerate(self.user_ids)}
+
+
+def profile_row(user):
+    """Build the scoring row for ``user``, or return None if they have no profile"""
+    try:
+        profile = user.personality_profile
+    except PersonalityProfile.DoesNotExist:
+        return None
+
+    row = {field: getattr(profile, field) for field in PROFILE_FIELDS}
+    row['lifestyle_data'] = profile.lifestyle_data
+    row.update((field, getattr(user, field)) for field in USER_FIELDS)
+    row['user_id'] = user.id
+    return row
+
+
+def profile_rows(profiles):
+    """
+    Fetch scoring rows for a ``PersonalityProfile`` queryset.
+
+    Only profiles with answers outside the known choices need their raw
+    ``lifestyle_data``, which is fetched for them in a second query.
+    """
+    rows = list(profiles.values('user_id', *(f'user__{field}' for field in USER_FIELDS), *PROFILE_FIELDS))
+    for row in rows:
+        for field in USER_FIELDS:
+            row[field] = row.pop(f'user__{field}')
+
+    other = [row['user_id'] for row in rows if LIFESTYLE_OTHER in bytes(row['lifestyle_codes'])]
+    lifestyle_data = dict(
+        PersonalityProfile.objects.filter(user_id__in=other).values_list('user_id', 'lifestyle_data')
+    ) if other else {}
+    for row in rows:
+        row['lifestyle_data'] = lifestyle_data.get(row['user_id'])
+    return rows
+
+
+def _viewer_lifestyle_scores(viewer, encoders):
+    """
+    Score the viewer's answers against every encoded answer.
+
+    Returns an array indexed by ``[question, candidate_code]``. Known answers
+    come from ``LIFESTYLE_TABLES``; only answers outside the known choices
+    are scored with the rule itself.
+    """
+    width = max(len(encoder.values) for encoder in encoders)
+    scores = np.zeros((len(LIFESTYLE_RULES), width), dtype=np.float64)
+    for question, (key, rule) in enumerate(LIFESTYLE_RULES):
+        viewer_code = viewer.lifestyle[0, question]
+        if not viewer_code:
+            continue
+        encoder = encoders[question]
+        known = len(LIFESTYLE_CHOICES[key]) + 1
+        if viewer_code < known:
+            scores[question, :known] = LIFESTYLE_TABLES[question, viewer_code, :known]
+        else:
+            viewer_value = encoder.values[viewer_code]
+            scores[question, 1:known] = [rule(viewer_value, value) for value in encoder.values[1:known]]
+        if len(encoder.values) > known:
+            viewer_value = encoder.values[viewer_code]
+            scores[question, known:len(encoder.values)] = [rule(viewer_value, value) for value in encoder.values[known:]]
+    return scores
+
+
+def _lifestyle_similarity(viewer, candidates):
+    """Vectorized ``calculate_lifestyle_similarity`` for one viewer row"""
+    count = len(candidates)
+    similarity = np.full(count, 50.0)
+    if not viewer.has_lifestyle[0]:
+        return similarity
+
+    # Gather each candidate's per-question score and sum them
+    scores = _viewer_lifestyle_scores(viewer, candidates.lifestyle_encoders)
+    totals = scores[np.arange(len(LIFESTYLE_RULES)), candidates.lifestyle].sum(axis=1)
+    comparisons = ((candidates.lifestyle != 0) & (viewer.lifestyle[0] != 0)).sum(axis=1)
+
+    scored = candidates.has_lifestyle & (comparisons > 0)
+    similarity[scored] = np.rint(totals[scored] / comparisons[scored])
+    return similarity
+
+
+def score_matrix(viewer, candidates):
+    """
+    Score a single-row ``viewer`` matrix against every row of ``candidates``.
+
+    Mirrors ``calculate_compatibility`` step for step, including the order of
+    floating point operations, so rounded scores match exactly.
+    """
+    count = len(candidates)
+
+    # 1. Lifestyle similarity
+    lifestyle_similarity = _lifestyle_similarity(viewer, candidates)
+
+    # 2. Basic lifestyle preferences
+    basic_lifestyle_score = np.zeros(count, dtype=np.float64)
+    for column in range(len(LEVEL_FIELDS)):
+        diff = np.abs(viewer.levels[0, column] - candidates.levels[:, column])
+        basic_lifestyle_score += np.maximum(0, 100 - diff * 1.5)
+    for column, field in enumerate(FLAG_FIELDS):
+        match_score, mismatch_score = FLAG_SCORES[field]
+        basic_lifestyle_score += np.where(candidates.flags[:, column] == viewer.flags[0, column], match_score, mismatch_score)
+    basic_lifestyle_score = basic_lifestyle_score / 5
+
+    # 3. Personality traits
+    personality_score = np.zeros(count, dtype=np.float64)
+    for column in range(len(TRAIT_FIELDS)):
+        diff = np.abs(viewer.traits[0, column] - candidates.traits[:, column])
+        personality_score += np.maximum(0, 100 - (diff * 1.5))
+    personality_score = personality_score / len(TRAIT_FIELDS)
+
+    # 4. Communication style
+    communication_score = np.where(candidates.communication == viewer.communication[0], 90.0, 60.0)
+
+    # 5. Location
+    if viewer.city[0]:
+        location_score = np.where(
+            candidates.city == 0, 100.0,
+            np.where(candidates.city == viewer.city[0], 100.0, 60.0),
+        )
+    else:
+        location_score = np.full(count, 100.0)
+
+    compatibility_score = (
+        lifestyle_similarity * 0.50 +
+        basic_lifestyle_score * 0.15 +
+        personality_score * 0.20 +
+        communication_score * 0.10 +
+        location_score * 0.05
+    )
+    similarity_score = (
+        lifestyle_similarity * 0.60 +
+        personality_score * 0.30 +
+        basic_lifestyle_score * 0.10
+    )
+
+    return CompatibilityBatch(
+        candidates.user_ids,
+        np.rint(compatibility_score).astype(np.int64),
+        np.rint(similarity_score).astype(np.int64),
+        {
+            'lifestyle': np.rint(lifestyle_similarity).astype(np.int64),
+            'basic_lifestyle': np.rint(basic_lifestyle_score).astype(np.int64),
+            'personality': np.rint(personality_score).astype(np.int64),
+            'communication': np.rint(communication_score).astype(np.int64),
+            'location': np.rint(location_score).astype(np.int64),
+        },
+    )
+
+
+def score_rows(user, rows):
+    """
+    Score ``user`` against candidate profile rows.
+
+    Returns a ``CompatibilityBatch``, or None when ``user`` has no profile.
+    """
+    viewer_row = profile_row(user)
+    if viewer_row is None:
+        return None
+
+    viewer = ProfileMatrix([viewer_row])
+    return score_matrix(viewer, viewer.encode_like(rows))
+
+
+def score_candidates(user, candidates):
+    """
+    Score ``user`` against each user in ``candidates``.
+
+    Returns a dict mapping candidate id to the same value
+    ``calculate_compatibility(user, candidate)`` would return, including 0
+    for pairs where either side has no personality profile.
+    """
+    candidates = list(candidates)
+    results = {candidate.id: 0 for candidate in candidates}
+
+    rows = [row for row in map(profile_row, candidates) if row is not None]
+    batch = score_rows(user, rows) if rows else None
+    if batch is not None:
+        results.update(batch.as_dict())
+    return results
+
+
+def rank_indices(scores, user_ids, limit, after=None, eligible=None):
+    """
+    Return indices of the ``limit`` best candidates, best first.
+
+    Candidates are ordered by score (highest first) and then by user id.
+    ``after`` is the ``(score, user_id)`` of the last candidate already
+    returned; only candidates ranked below it are considered. ``eligible``
+    is an optional boolean mask of candidates to consider at all. Uses a
+    partial sort, so cost is linear in the pool size rather than N log N.
+    """
+    mask = np.ones(len(user_ids), dtype=bool) if eligible is None else eligible.copy()
+    if after is not None:
+        after_score, after_id = after
+        mask &= (scores < after_score) | ((scores == after_score) & (user_ids > after_id))
+    candidates = np.flatnonzero(mask)
+
+    if limit <= 0 or not len(candidates):
+        return candidates[:0]
+
+    # One integer key orders by score descending, then by user id ascending
+    stride = int(user_ids.max()) + 1
+    keys = (scores.max() - scores[candidates]) * stride + user_ids[candidates]
+    if len(candidates) > limit:
+        best = np.argpartition(keys, limit - 1)[:limit]
+        candidates, keys = candidates[best], keys[best]
+    return candidates[np.argsort(keys, kind='stable')]
+
+
+def rank_candidates(user, matrix, limit, after=None, eligible=None):
+    """
+    Score ``user`` against every row of ``matrix`` and return the best ``limit``.
+
+    Returns a list of ``(user_id, result)`` pairs, best first, where each
+    result matches ``calculate_compatibility``. See ``rank_indices`` for
+    ``after`` and ``eligible``.
+    """
+    viewer_row = profile_row(user)
+
+    if viewer_row is None:
+        # Without a profile every candidate scores 0, so rank by user id alone
+        scores = np.zeros(len(matrix), dtype=np.int64)
+        order = rank_indices(scores, matrix.user_ids, limit, after, eligible)
+        return [(int(matrix.user_ids[index]), 0) for index in order]
+
+    batch = score_matrix(matrix.encode_like([viewer_row]), matrix)
+    order = rank_indices(batch.compatibility, batch.user_ids, limit, after, eligible)
+    return [(int(batch.user_ids[index]), batch.result(index)) for index in order]
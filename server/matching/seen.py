@@ -0,0 +1,71 @@
+"""
+Per-user sets of already-seen users.
+
+Suggestions must skip everyone a user has liked, passed on or blocked. Rather
+than reading all of their ``MatchInteraction`` rows on every request, each
+user's ``SeenUsers.user_ids`` holds the target ids as a sorted array of
+little-endian uint32s: one small row to read, and membership for the whole
+profile pool is a single vectorized binary search.
+
+``matching.services`` adds to the set in the same transaction as it records
+interactions; interactions saved or deleted one at a time (unmatching, the
+admin) are kept in sync through ``matching.signals``.
+"""
+import numpy as np
+from django.db import transaction
+
+from .models import SeenUsers
+
+SEEN_ID_DTYPE = np.dtype('<u4')
+
+
+def encode_seen(user_ids):
+    """Encode user ids as the sorted, de-duplicated bytes stored in ``SeenUsers``"""
+    return np.unique(np.asarray(list(user_ids), dtype=SEEN_ID_DTYPE)).tobytes()
+
+
+def decode_seen(data):
+    """Decode ``SeenUsers.user_ids`` into a sorted array of ids"""
+    return np.frombuffer(bytes(data or b''), dtype=SEEN_ID_DTYPE)
+
+
+def seen_user_ids(user_id):
+    """Return the sorted ids of every user ``user_id`` has interacted with"""
+    data = SeenUsers.objects.filter(user_id=user_id).values_list('user_ids', flat=True).first()
+    return decode_seen(data)
+
+
+def seen_mask(user_ids, seen):
+    """Return a boolean mask of the ``user_ids`` that are in the sorted ``seen`` array"""
+    user_ids = np.asarray(user_ids)
+    if not len(seen) or not len(user_ids):
+        return np.zeros(len(user_ids), dtype=bool)
+    positions = np.minimum(np.searchsorted(seen, user_ids), len(seen) - 1)
+    return seen[positions] == user_ids
+
+
+def _update_seen(user_id, merge):
+    """Apply ``merge`` to ``user_id``'s seen set and return how many ids it added or removed"""
+    with transaction.atomic():
+        seen, _ = SeenUsers.objects.select_for_update().get_or_create(user_id=user_id)
+        current = decode_seen(seen.user_ids)
+        user_ids = merge(current)
+        if len(user_ids) != len(current):
+            seen.user_ids = user_ids.astype(SEEN_ID_DTYPE).tobytes()
+            seen.save(update_fields=['user_ids', 'updated_at'])
+        return abs(len(user_ids) - len(current))
+
+
+def add_seen(user_id, target_ids):
+    """Add ``target_ids`` to ``user_id``'s seen set and return how many were not in it yet"""
+    target_ids = np.asarray(list(target_ids), dtype=SEEN_ID_DTYPE)
+    if not len(target_ids):
+        return 0
+    return _update_seen(user_id, lambda seen: np.union1d(seen, target_ids))
+
+
+def remove_seen(user_id, target_ids):
+    """Remove ``target_ids`` from ``user_id``'s seen set"""
+    target_ids = np.asarray(list(target_ids), dtype=SEEN_ID_DTYPE)
+    if len(target_ids):
+        _update_seen(user_id, lambda seen: np.setdiff1d(seen, target_ids, assume_unique=True))
@@ -0,0 +1,112 @@
+"""
+Match resolution.
+
+Every like or pass (single swipes, swipe batches, answering a match
+request, asking a space's host) goes through ``record_interactions``. It
+records the interactions, adds their targets to the user's seen set
+(``matching.seen``) and turns mutual likes into ``Match`` rows in one
+transaction, with a fixed number of queries however large the batch is.
+
+Two users liking each other at the same moment must still end up matched.
+Likes are inserted first, then the users' rows are locked in id order
+before the reverse likes are read. Whichever transaction takes the lock
+second therefore sees the other's like. On SQLite the insert alone already
+serializes the two transactions.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Match, MatchInteraction
+from .score_cache import cached_scores
+from .scoring import SCORING_VERSION
+from .seen import add_seen
+
+User = get_user_model()
+
+
+# Interactions that count as liking someone
+LIKE_TYPES = ('like', 'super_like')
+
+
+def record_interactions(user, decisions):
+    """
+    Record ``user``'s ``(target_user_id, interaction_type)`` decisions and match mutual likes.
+
+    An earlier interaction with the same user is kept, as is the first of
+    several decisions about one user in a batch. Unknown users and ``user``
+    themselves are skipped. Returns ``(recorded, matches)``: the number of
+    interactions actually inserted, and ``{target_user_id: (match,
+    compatibility_data)}`` for every liked user who has liked ``user`` too,
+    with ``compatibility_data`` shaped like ``calculate_compatibility``.
+    """
+    decided = {}
+    for target_user_id, interaction_type in decisions:
+        decided.setdefault(target_user_id, interaction_type)
+
+    # Checked before the transaction so that its first statement is the insert
+    target_ids = set(User.objects.filter(id__in=list(decided)).exclude(id=user.id).values_list('id', flat=True))
+    liked_ids = sorted(target_id for target_id in target_ids if decided[target_id] in LIKE_TYPES)
+
+    with transaction.atomic():
+        # Insert-or-ignore keeps earlier interactions
+        MatchInteraction.objects.bulk_create([
+            MatchInteraction(user=user, target_user_id=target_id, interaction_type=decided[target_id])
+            for target_id in target_ids
+        ], ignore_conflicts=True)
+        # The seen set mirrors the user's interactions and is updated under a
+        # row lock, so the targets new to it are exactly the rows inserted
+        recorded = add_seen(user.id, target_ids)
+        if not liked_ids:
+            return recorded, {}
+
+        # Serialize concurrent likes involving the same users
+        list(User.objects.select_for_update().filter(
+            id__in=[user.id, *liked_ids]
+        ).order_by('id').values_list('id', flat=True))
+
+        mutual = list(User.objects.filter(
+            id__in=liked_ids,
+            match_interactions__target_user=user,
+            match_interactions__interaction_type__in=LIKE_TYPES
+        ).select_related('personality_profile'))
+        if not mutual:
+            return recorded, {}
+
+        results = cached_scores(user, mutual)
+        Match.objects.bulk_create([
+            Match(
+                user1_id=min(user.id, other.id),
+                user2_id=max(user.id, other.id),
+                compatibility_score=_score(results[other.id]),
+                scoring_version=SCORING_VERSION,
+                status='mutual'
+            )
+            for other in mutual
+        ], ignore_conflicts=True)
+
+        resolved = {}
+        for match in Match.objects.filter(Q(user1=user, user2__in=mutual) | Q(user2=user, user1__in=mutual)):
+            other_id = match.user2_id if match.user1_id == user.id else match.user1_id
+            resolved[other_id] = (match, results[other_id])
+        return recorded, resolved
+
+
+def _score(compatibility_data):
+    return compatibility_data['compatibility_score'] if isinstance(compatibility_data, dict) else compatibility_data
+
+
+def pass_user(user, target_user):
+    """Record that ``user`` passed on ``target_user``"""
+    record_interactions(user, [(target_user.id, 'pass')])
+
+
+def like_user(user, target_user):
+    """
+    Record that ``user`` likes ``target_user`` and match them if it is mutual.
+
+    Returns ``(match, compatibility_data)``, both None unless ``target_user``
+    has liked ``user`` too.
+    """
+    _recorded, matches = record_interactions(user, [(target_user.id, 'like')])
+    return matches.get(target_user.id, (None, None))
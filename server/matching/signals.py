@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from personality.models import PersonalityProfile
+from .deck import mark_decks_stale
+from .models import DeletedProfile, MatchInteraction, UserPreferences
+from .pool import profile_pool
+from .score_cache import invalidate_scores
+from .scoring import USER_FIELDS
+from .seen import add_seen, remove_seen
+
+User = get_user_model()
+
+# User fields that feed into calculate_compatibility
+SCORED_USER_FIELDS = ('preferred_city',)
+
+
+def _changed_user_fields(user, update_fields):
+    """Return the ``USER_FIELDS`` that saving ``user`` is about to change"""
+    if user._state.adding:
+        return frozenset()
+    # Deferred fields are not written, so they can't change
+    fields = [field for field in USER_FIELDS if field not in user.get_deferred_fields()]
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+    stored = User.objects.filter(pk=user.pk).values(*fields).first() if fields else None
+    if stored is None:
+        return frozenset()
+    return frozenset(field for field in fields if stored[field] != getattr(user, field))
+
+
+def changed_user_fields(user):
+    """Return the ``USER_FIELDS`` changed by the save ``user`` is going through, for post_save receivers"""
+    return getattr(user, '_changed_user_fields', frozenset())
+
+
+@receiver(pre_save, sender=User)
+def remember_changed_user_fields(sender, instance, raw, update_fields, **kwargs):
+    instance._changed_user_fields = frozenset() if raw else _changed_user_fields(instance, update_fields)
+
+
+@receiver(post_save, sender=User)
+def invalidate_scores_on_user_change(sender, instance, created, **kwargs):
+    changed = changed_user_fields(instance)
+    if not created and changed:
+        if changed & set(SCORED_USER_FIELDS):
+            invalidate_scores(instance.id)
+        profile_pool.mark_dirty()
+        mark_decks_stale([instance.id])
+
+
+@receiver(post_save, sender=PersonalityProfile)
+def invalidate_scores_on_profile_change(sender, instance, **kwargs):
+    invalidate_scores(instance.user_id)
+    profile_pool.mark_dirty()
+    mark_decks_stale([instance.user_id])
+
+
+@receiver(post_delete, sender=PersonalityProfile)
+def invalidate_scores_on_profile_delete(sender, instance, **kwargs):
+    invalidate_scores(instance.user_id)
+    profile_pool.discard(instance.user_id)
+    # Other processes' pools find deleted profiles in this log
+    DeletedProfile.objects.create(user_id=instance.user_id)
+    mark_decks_stale([instance.user_id])
+
+
+@receiver(post_save, sender=UserPreferences)
+def rebuild_deck_on_preferences_change(sender, instance, **kwargs):
+    mark_decks_stale([instance.user_id])
+
+
+@receiver(post_save, sender=MatchInteraction)
+def add_interaction_to_seen_set(sender, instance, created, **kwargs):
+    # matching.services bulk-creates interactions and updates the set itself
+    if created:
+        add_seen(instance.user_id, [instance.target_user_id])
+
+
+@receiver(post_delete, sender=MatchInteraction)
+def remove_interaction_from_seen_set(sender, instance, **kwargs):
+    remove_seen(instance.user_id, [instance.target_user_id])
+    # The deck was built without the target
+    mark_decks_stale([instance.user_id])
@@ -1,3 +1,698 @@
-from django.test import TestCase
+import random
+from datetime import date
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from coliving.models import LivingSpace
+from personality.lifestyle import LIFESTYLE_CHOICES
+from personality.models import PersonalityProfile
+from . import ann
+from .candidates import candidate_mask
+from .consumers import SuggestionDeckConsumer
+from .deck import DECK_CHANNEL, entry_score, rank_unseen, refill_deck
+from .models import CompatibilityScore, Match, MatchInteraction, SuggestionDeck, UserPreferences
+from .pool import profile_pool
+from .score_cache import cached_scores
+from .scoring import LIFESTYLE_RULES, SCORING_VERSION, ProfileMatrix, pair_lifestyle_similarity, profile_rows, score_candidates
+from .seen import decode_seen, encode_seen, seen_mask, seen_user_ids
+from .services import like_user, pass_user, record_interactions
+from .views import calculate_compatibility, calculate_lifestyle_similarity
+
+User = get_user_model()
+
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+LIFESTYLE_ANSWERS = {
+    'early_bird': ['early_bird', 'balanced', 'night_owl'],
+    'cooking_frequency': ['daily', 'few_times_week', 'rarely', 'never'],
+    'hosting_visitors': ['frequently', 'occasionally', 'rarely', 'never', 'unknown'],
+    'smoking_drinking': ['both', 'drink_only', 'smoke_only', 'neither'],
+    'noise_preference': ['very_quiet', 'moderate', 'dont_mind'],
+    'chore_frequency': ['daily', 'weekly', 'as_needed', 'rarely'],
+    'sharing_items': ['happy_to_share', 'some_items', 'prefer_separate'],
+    'bill_splitting': ['equally', 'by_usage', 'flexible'],
+    'cost_sharing': ['yes_all', 'some_items', 'no_separate'],
+    'bill_payment': ['very_strict', 'usually_on_time', 'flexible'],
+    'roommate_relationship': ['close_friends', 'friendly', 'cotenants'],
+    'group_activities': ['love_it', 'occasionally', 'rarely', 'prefer_not'],
+    'gender_preference': ['any_gender', 'same_gender', 'specific'],
+    'pets': ['have_pets', 'love_pets', 'okay_with_pets', 'no_pets', 'allergic'],
+    'allergies': ['none', 'dust', 'pets', 'food', 'multiple'],
+    'ideal_personality': ['quiet_respectful', 'social_outgoing', 'independent', 'collaborative'],
+}
+
+
+def create_user_with_profile(index, rng, with_profile=True):
+    user = User.objects.create_user(
+        username=f'user{index}',
+        email=f'user{index}@example.com',
+        preferred_city=rng.choice(['', 'Nairobi', 'nairobi', 'Mombasa']),
+    )
+    if with_profile:
+        lifestyle_data = {
+            key: rng.choice(answers)
+            for key, answers in LIFESTYLE_ANSWERS.items()
+            if rng.random() < 0.8
+        } if rng.random() < 0.9 else {}
+        PersonalityProfile.objects.create(
+            user=user,
+            openness=rng.randint(0, 100),
+            conscientiousness=rng.randint(0, 100),
+            extraversion=rng.randint(0, 100),
+            agreeableness=rng.randint(0, 100),
+            neuroticism=rng.randint(0, 100),
+            cleanliness_level=rng.randint(0, 100),
+            social_level=rng.randint(0, 100),
+            quiet_hours=rng.random() < 0.5,
+            pets_allowed=rng.random() < 0.5,
+            smoking_allowed=rng.random() < 0.5,
+            communication_style=rng.choice(['direct', 'diplomatic', 'casual', 'formal']),
+            lifestyle_data=lifestyle_data,
+        )
+    return user
+
+
+class BatchScoringTests(TestCase):
+    def setUp(self):
+        rng = random.Random(42)
+        self.users = [create_user_with_profile(i, rng, with_profile=i % 7 != 3) for i in range(40)]
+
+    def test_lifestyle_rules_cover_every_question(self):
+        self.assertEqual([key for key, _rule in LIFESTYLE_RULES], list(LIFESTYLE_ANSWERS))
+        self.assertEqual([key for key, _rule in LIFESTYLE_RULES], list(LIFESTYLE_CHOICES))
+
+    def test_stored_lifestyle_codes_score_like_raw_answers(self):
+        profiles = list(PersonalityProfile.objects.all())
+        for profile1 in profiles[:8]:
+            for profile2 in profiles:
+                similarity = pair_lifestyle_similarity(profile1.lifestyle_codes, profile2.lifestyle_codes)
+                if similarity is not None:
+                    self.assertEqual(
+                        similarity,
+                        calculate_lifestyle_similarity(profile1.lifestyle_data, profile2.lifestyle_data)
+                    )
+
+    def test_list_and_object_answers_are_scored(self):
+        profiles = PersonalityProfile.objects.filter(user__in=self.users[:3])
+        for index, profile in enumerate(profiles):
+            profile.lifestyle_data = {
+                **profile.lifestyle_data,
+                'pets': ['have_pets', 'allergic'][:index + 1],
+                'hosting_visitors': {'weekdays': 'rarely'},
+            }
+            profile.save()
+
+        for viewer in self.users[:3]:
+            viewer = User.objects.get(id=viewer.id)
+            candidates = list(User.objects.exclude(id=viewer.id).select_related('personality_profile'))
+            scores = score_candidates(viewer, candidates)
+            for candidate in candidates:
+                self.assertEqual(scores[candidate.id], calculate_compatibility(viewer, candidate))
+
+    def test_batch_scores_match_pairwise_scores(self):
+        for viewer in self.users[:8]:
+            viewer = User.objects.get(id=viewer.id)
+            candidates = list(User.objects.exclude(id=viewer.id).select_related('personality_profile'))
+
+            scores = score_candidates(viewer, candidates)
+
+            for candidate in candidates:
+                self.assertEqual(scores[candidate.id], calculate_compatibility(viewer, candidate))
+
+
+class CompatibilityScoreCacheTests(TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.viewer, self.other, self.third = [create_user_with_profile(i, rng) for i in range(3)]
+
+    def test_scores_are_written_on_first_compute_and_reused(self):
+        expected = calculate_compatibility(self.viewer, self.other)
+
+        self.assertEqual(cached_scores(self.viewer, [self.other]), {self.other.id: expected})
+        self.assertTrue(CompatibilityScore.objects.filter(user1=self.viewer, user2=self.other).exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(cached_scores(self.viewer, [self.other]), {self.other.id: expected})
+
+    def test_profile_change_invalidates_only_that_users_pairs(self):
+        cached_scores(self.viewer, [self.other, self.third])
+        cached_scores(self.other, [self.third])
+
+        profile = self.viewer.personality_profile
+        profile.openness = 100 - profile.openness
+        profile.save()
+
+        self.assertEqual(
+            list(CompatibilityScore.objects.values_list('user1_id', 'user2_id')),
+            [(self.other.id, self.third.id)]
+        )
+
+    def test_preferred_city_change_invalidates_scores(self):
+        cached_scores(self.viewer, [self.other])
+
+        self.other.last_name = 'Unrelated'
+        self.other.save()
+        self.assertEqual(CompatibilityScore.objects.count(), 1)
+
+        self.other.preferred_city = 'Kisumu'
+        self.other.save()
+        self.assertEqual(CompatibilityScore.objects.count(), 0)
+
+    def test_deferred_user_loads_are_tracked_without_extra_queries(self):
+        cached_scores(self.viewer, [self.other])
+
+        with self.assertNumQueries(1):
+            user = User.objects.only('id', 'preferred_city').get(id=self.other.id)
+        user.save(update_fields=['preferred_city'])
+        self.assertEqual(CompatibilityScore.objects.count(), 1)
+
+        user.preferred_city = 'Kisumu'
+        user.save(update_fields=['preferred_city'])
+        self.assertEqual(CompatibilityScore.objects.count(), 0)
+
+
+class RankedSuggestionTests(TestCase):
+    def setUp(self):
+        profile_pool.clear()
+        rng = random.Random(3)
+        self.users = [create_user_with_profile(i, rng) for i in range(30)]
+        self.viewer = self.users[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def expected_ranking(self):
+        viewer = User.objects.get(id=self.viewer.id)
+        city = viewer.preferred_city.lower()
+        return sorted(
+            ((calculate_compatibility(viewer, user)['compatibility_score'], user.id)
+             for user in User.objects.exclude(id=viewer.id)
+             if not city or user.preferred_city.lower() in ('', city)),
+            key=lambda item: (-item[0], item[1])
+        )
+
+    def test_pages_return_the_true_best_matches_in_order(self):
+        expected = self.expected_ranking()
+
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 7}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get('/api/matching/suggestions/', params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend((item['compatibility_score'], item['id']) for item in response.data)
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+
+        self.assertEqual(seen, expected)
+
+    def test_profile_changes_are_picked_up_by_the_pool(self):
+        self.client.get('/api/matching/suggestions/')
+
+        viewer_profile = self.viewer.personality_profile
+        for profile in PersonalityProfile.objects.exclude(user=self.viewer)[:5]:
+            profile.openness = viewer_profile.openness
+            profile.conscientiousness = viewer_profile.conscientiousness
+            profile.lifestyle_data = viewer_profile.lifestyle_data
+            profile.save()
+
+        # Other users' changes reach the viewer's deck when the worker next refills it
+        refill_deck(self.viewer)
+        response = self.client.get('/api/matching/suggestions/', {'limit': 50})
+        self.assertEqual(
+            [(item['compatibility_score'], item['id']) for item in response.data],
+            self.expected_ranking()
+        )
+
+    def test_nearest_neighbour_shortlist_is_reranked_exactly(self):
+        pool = profile_pool.get()
+        self.assertTrue((pool.cluster >= 0).all())
+        viewer = pool.take([pool.positions[self.viewer.id]])
+        candidates = pool.take(candidate_mask(self.viewer, pool))
+        shortlist = candidates.user_ids[pool.index.nearest(candidates, viewer, 10)]
+        expected = [item for item in self.expected_ranking() if item[1] in set(shortlist.tolist())]
+
+        with mock.patch.object(ann, 'ANN_MIN_POOL_SIZE', 0), mock.patch.object(ann, 'ANN_SHORTLIST_SIZE', 10):
+            ranked = rank_unseen(self.viewer, 5)
+            self.assertEqual([(entry_score(data), user_id) for user_id, data in ranked], expected[:5])
+
+            # Pages the shortlist can't fill fall back to scanning the whole pool
+            ranked = rank_unseen(self.viewer, 50)
+            self.assertEqual([(entry_score(data), user_id) for user_id, data in ranked], self.expected_ranking())
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/matching/suggestions/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CandidateFilterTests(TestCase):
+    def setUp(self):
+        profile_pool.clear()
+        rng = random.Random(4)
+        self.viewer = create_user_with_profile(0, rng)
+        self.viewer.preferred_city = 'Nairobi'
+        self.viewer.budget_min, self.viewer.budget_max = 300, 600
+        self.viewer.move_in_date = date(2025, 6, 1)
+        self.viewer.save()
+        self.candidates = [create_user_with_profile(i, rng) for i in range(1, 4)]
+        for candidate in self.candidates:
+            candidate.preferred_city = ''
+            candidate.gender = 'female'
+            candidate.date_of_birth = date(2000, 1, 1)
+            candidate.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def suggested_ids(self):
+        response = self.client.get('/api/matching/suggestions/', {'limit': 50})
+        return {item['id'] for item in response.data}
+
+    def test_unconstrained_candidates_are_all_suggested(self):
+        self.assertEqual(self.suggested_ids(), {candidate.id for candidate in self.candidates})
+
+    def test_hard_constraints_exclude_candidates_before_scoring(self):
+        first, second, third = self.candidates
+        UserPreferences.objects.create(user=self.viewer, preferred_gender='female', smoking_preference='non_smoker')
+
+        first.gender = 'male'
+        first.save()
+        second.budget_min = 700
+        second.save()
+        third.preferred_city = 'nairobi'
+        third.move_in_date = date(2025, 7, 15)
+        third.smoking_preference = 'non_smoker'
+        third.save()
+        self.assertEqual(self.suggested_ids(), {third.id})
+
+        third.preferred_city = 'Mombasa'
+        third.save()
+        refill_deck(self.viewer)
+        self.assertEqual(self.suggested_ids(), set())
+
+
+class ListingQueryCountTests(TestCase):
+    def setUp(self):
+        profile_pool.clear()
+        self.rng = random.Random(5)
+        self.viewer = create_user_with_profile(0, self.rng)
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        self.created = 1
+
+    def add_others(self, count):
+        for _ in range(count):
+            other = create_user_with_profile(self.created, self.rng, with_profile=self.created % 4 != 0)
+            Match.objects.create(user1=other, user2=self.viewer, compatibility_score=50, status='mutual')
+            MatchInteraction.objects.create(user=other, target_user=self.viewer, interaction_type='like')
+            self.created += 1
+
+    def count_queries(self, url, params=None):
+        # Bring the profile pool up to date first; refreshing costs queries of its own
+        profile_pool.get()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), len(response.data)
+
+    def test_query_count_does_not_grow_with_listing_size(self):
+        for url in ('/api/matching/matches/', '/api/matching/requests/', '/api/matching/suggestions/'):
+            with self.subTest(url=url):
+                CompatibilityScore.objects.all().delete()
+                SuggestionDeck.objects.all().delete()
+                self.add_others(3)
+                few_queries, few_items = self.count_queries(url, {'limit': 50})
+
+                CompatibilityScore.objects.all().delete()
+                SuggestionDeck.objects.all().delete()
+                self.add_others(12)
+                many_queries, many_items = self.count_queries(url, {'limit': 50})
+
+                self.assertGreater(many_items, few_items)
+                self.assertEqual(many_queries, few_queries)
+
+
+class MatchResolutionTests(TestCase):
+    def setUp(self):
+        rng = random.Random(9)
+        self.alice, self.bob = create_user_with_profile(0, rng), create_user_with_profile(1, rng)
+        self.client = APIClient()
+
+    def post(self, user, url, data):
+        self.client.force_authenticate(user)
+        return self.client.post(url, data, format='json')
+
+    def test_mutual_likes_create_exactly_one_match(self):
+        self.assertEqual(like_user(self.alice, self.bob), (None, None))
+        match, compatibility_data = like_user(self.bob, self.alice)
+        self.assertEqual((match.user1, match.user2, match.status), (self.alice, self.bob, 'mutual'))
+        self.assertEqual(match.compatibility_score, compatibility_data['compatibility_score'])
+
+        # Liking again is idempotent
+        self.assertEqual(like_user(self.alice, self.bob)[0], match)
+        self.assertEqual(Match.objects.count(), 1)
+        self.assertEqual(MatchInteraction.objects.count(), 2)
+
+    def test_a_like_sees_a_like_committed_before_it(self):
+        # The reverse like is read after this like is written, within the same transaction
+        with CaptureQueriesContext(connection) as queries:
+            like_user(self.alice, self.bob)
+        statements = [query['sql'].split()[0] for query in queries]
+        self.assertIn('SELECT', statements[statements.index('INSERT'):])
+
+    def test_earlier_interaction_is_kept(self):
+        pass_user(self.alice, self.bob)
+        like_user(self.alice, self.bob)
+        self.assertEqual(MatchInteraction.objects.get(user=self.alice).interaction_type, 'pass')
+
+    def test_every_entry_point_creates_the_match(self):
+        response = self.post(self.alice, '/api/matching/accept/', {'user_id': self.bob.id})
+        self.assertNotIn('match_id', response.data)
+        response = self.post(self.bob, '/api/matching/respond/', {'user_id': self.alice.id, 'response': 'accept'})
+        self.assertEqual(response.data['match_id'], Match.objects.get().id)
+
+        carol = create_user_with_profile(2, random.Random(3))
+        space = LivingSpace.objects.create(name='Carol house', created_by=carol)
+        like_user(carol, self.alice)
+        response = self.post(self.alice, f'/api/coliving/living-spaces/{space.id}/request_match/', {})
+        match = Match.objects.get(user1=self.alice, user2=carol)
+        self.assertEqual(response.data['match_id'], match.id)
+        self.assertIsInstance(match.compatibility_score, float)
+
+
+class InteractionBatchTests(TestCase):
+    def setUp(self):
+        self.rng = random.Random(11)
+        self.user = create_user_with_profile(0, self.rng)
+        self.others = [create_user_with_profile(i, self.rng) for i in range(1, 9)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def swipe(self, decisions):
+        return self.client.post('/api/matching/interactions/', {'decisions': decisions}, format='json')
+
+    def test_batch_records_interactions_and_matches_mutual_likes(self):
+        first, second, third, fourth = self.others[:4]
+        like_user(first, self.user)
+        record_interactions(second, [(self.user.id, 'super_like')])
+        like_user(fourth, self.user)
+
+        response = self.swipe([
+            {'user_id': first.id, 'action': 'like'},
+            {'user_id': second.id, 'action': 'super_like'},
+            {'user_id': third.id, 'action': 'like'},
+            {'user_id': fourth.id, 'action': 'block'},
+            {'user_id': first.id, 'action': 'pass'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['recorded'], 4)
+        self.assertEqual({item['user_id'] for item in response.data['matches']}, {first.id, second.id})
+        self.assertEqual(Match.objects.filter(status='mutual').count(), 2)
+        self.assertEqual(
+            dict(MatchInteraction.objects.filter(user=self.user).values_list('target_user_id', 'interaction_type')),
+            {first.id: 'like', second.id: 'super_like', third.id: 'like', fourth.id: 'block'}
+        )
+
+        # Users already decided on are not recorded again
+        response = self.swipe([{'user_id': first.id, 'action': 'pass'}, {'user_id': self.others[4].id, 'action': 'pass'}])
+        self.assertEqual(response.data['recorded'], 1)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        # The first interaction creates the user's seen set
+        pass_user(self.user, self.others[0])
+        counts = []
+        for batch in (self.others[1:3], self.others[3:]):
+            for other in batch:
+                like_user(other, self.user)
+            decisions = [(other.id, 'like') for other in batch]
+            with CaptureQueriesContext(connection) as queries:
+                recorded, matches = record_interactions(self.user, decisions)
+            self.assertEqual((recorded, len(matches)), (len(batch), len(batch)))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_invalid_batches_are_rejected(self):
+        for decisions in (
+            [],
+            {'user_id': self.others[0].id, 'action': 'like'},
+            [{'user_id': self.others[0].id, 'action': 'love'}],
+            [{'user_id': 'abc', 'action': 'like'}],
+            [{'action': 'like'}],
+            [{'user_id': self.others[0].id, 'action': 'like'}] * 101,
+        ):
+            with self.subTest(decisions=decisions):
+                self.assertEqual(self.swipe(decisions).status_code, 400)
+        self.assertFalse(MatchInteraction.objects.filter(user=self.user).exists())
+
+
+class SeenSetTests(TestCase):
+    def setUp(self):
+        profile_pool.clear()
+        rng = random.Random(13)
+        self.user = create_user_with_profile(0, rng)
+        self.user.preferred_city = ''
+        self.user.save()
+        self.others = [create_user_with_profile(i, rng) for i in range(1, 7)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def suggested_ids(self):
+        response = self.client.get('/api/matching/suggestions/', {'limit': 50})
+        return {item['id'] for item in response.data}
+
+    def test_encoding_round_trips_and_masks_pool_ids(self):
+        seen = decode_seen(encode_seen([70000, 5, 12, 5]))
+        self.assertEqual(seen.tolist(), [5, 12, 70000])
+        self.assertEqual(seen_mask(np.array([1, 5, 13, 70000, 80000]), seen).tolist(), [False, True, False, True, False])
+        self.assertEqual(seen_mask(np.array([1, 2]), decode_seen(b'')).tolist(), [False, False])
+
+    def test_every_interaction_is_excluded_from_suggestions(self):
+        first, second, third = self.others[:3]
+        record_interactions(self.user, [(first.id, 'pass'), (second.id, 'block')])
+        MatchInteraction.objects.create(user=self.user, target_user=third, interaction_type='like')
+        self.assertEqual(seen_user_ids(self.user.id).tolist(), sorted(u.id for u in (first, second, third)))
+        self.assertEqual(self.suggested_ids(), {other.id for other in self.others[3:]})
+
+        # Unmatching forgets the interaction again
+        match = like_user(third, self.user)[0]
+        self.client.delete(f'/api/matching/{match.id}/unmatch/')
+        self.assertTrue(SuggestionDeck.objects.get(user=self.user).stale)
+        refill_deck(self.user)
+        self.assertIn(third.id, self.suggested_ids())
+
+    def test_suggestions_read_the_seen_set_in_one_query(self):
+        self.suggested_ids()
+        counts = []
+        for batch in (self.others[:1], self.others[1:5]):
+            record_interactions(self.user, [(other.id, 'pass') for other in batch])
+            with CaptureQueriesContext(connection) as queries:
+                self.suggested_ids()
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class SuggestionDeckTests(TestCase):
+    def setUp(self):
+        profile_pool.clear()
+        cache.clear()
+        rng = random.Random(17)
+        self.user = create_user_with_profile(0, rng)
+        self.user.preferred_city = ''
+        self.user.save()
+        self.others = [create_user_with_profile(i, rng) for i in range(1, 13)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def suggestions(self, **params):
+        response = self.client.get('/api/matching/suggestions/', {'limit': 50, **params})
+        return [(item['compatibility_score'], item['id']) for item in response.data]
+
+    def test_suggestions_are_served_from_the_deck_without_scoring(self):
+        expected = self.suggestions()
+        with mock.patch('matching.deck.rank_suggestions', side_effect=AssertionError('scored on request')):
+            self.assertEqual(self.suggestions(), expected)
+            pass_user(self.user, User.objects.get(id=expected[0][1]))
+            self.assertEqual(self.suggestions(), expected[1:])
+
+    def test_pages_past_an_incomplete_deck_are_ranked_on_request(self):
+        expected = self.suggestions()
+        SuggestionDeck.objects.all().delete()
+        with mock.patch('matching.deck.DECK_SIZE', 4):
+            self.assertEqual(self.suggestions(limit=3), expected[:3])
+            self.assertFalse(SuggestionDeck.objects.get(user=self.user).complete)
+            self.assertEqual(self.suggestions(), expected)
+
+    def test_users_deleted_by_another_process_are_left_out(self):
+        profile_pool.get()
+        deleted = self.others[0]
+        # Another process deleted the user, so this pool was never told
+        with mock.patch.object(profile_pool, 'discard'):
+            deleted.delete()
+
+        response = self.client.get('/api/matching/suggestions/', {'limit': 50})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(deleted.id, [user_id for user_id, _ in SuggestionDeck.objects.get(user=self.user).entries])
+
+        profile_pool.mark_dirty()
+        self.assertNotIn(deleted.id, profile_pool.get().positions)
+
+    def test_cursor_skips_past_deleted_users(self):
+        expected = self.suggestions()
+        User.objects.filter(id=expected[0][1]).delete()
+
+        response = self.client.get('/api/matching/suggestions/', {'limit': 1})
+        self.assertEqual(response.data, [])
+        response = self.client.get('/api/matching/suggestions/', {'limit': 1, 'cursor': response['X-Next-Cursor']})
+        self.assertEqual([(item['compatibility_score'], item['id']) for item in response.data], expected[1:2])
+
+    def test_stale_decks_are_refilled_by_the_worker(self):
+        excluded = self.others[0]
+        excluded.gender = 'male'
+        excluded.save()
+        self.assertIn(excluded.id, [user_id for _, user_id in self.suggestions()])
+        UserPreferences.objects.create(user=self.user, preferred_gender='female')
+        self.assertTrue(SuggestionDeck.objects.get(user=self.user).stale)
+
+        # The stale deck is still served until the worker has refilled it
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIn(excluded.id, [user_id for _, user_id in self.suggestions()])
+        layer = get_channel_layer()
+        message = async_to_sync(layer.receive)(DECK_CHANNEL)
+        self.assertEqual(message, {'type': 'deck.refill', 'user_id': self.user.id})
+
+        SuggestionDeckConsumer().deck_refill(message)
+        self.assertFalse(SuggestionDeck.objects.get(user=self.user).stale)
+        self.assertNotIn(excluded.id, [user_id for _, user_id in self.suggestions()])
+
+
+class PrecomputeCommandTests(TestCase):
+    def setUp(self):
+        rng = random.Random(19)
+        self.users = [create_user_with_profile(i, rng) for i in range(8)]
+
+    def precompute(self, **options):
+        call_command('precompute_compatibility', processes=1, chunk_size=3, batch_size=5, stdout=StringIO(), **options)
+
+    def expected_scores(self, viewers):
+        pool = ProfileMatrix(profile_rows(PersonalityProfile.objects.all()))
+        return {
+            (viewer.id, other.id): calculate_compatibility(viewer, other)['compatibility_score']
+            for viewer in viewers
+            for other in User.objects.filter(id__in=pool.take(candidate_mask(viewer, pool)).user_ids.tolist())
+        }
+
+    def test_every_eligible_pair_is_stored_and_overwritten(self):
+        first, second = self.users[:2]
+        CompatibilityScore.objects.create(user1=first, user2=second, overall_score=1)
+
+        self.precompute()
+        stored = {
+            (score.user1_id, score.user2_id): score.overall_score
+            for score in CompatibilityScore.objects.all()
+        }
+        self.assertEqual(stored, self.expected_scores(self.users))
+
+    def test_users_deleted_while_scoring_are_not_written(self):
+        from matching.management.commands import precompute_compatibility
+        deleted = self.users[-1]
+        score_chunk = precompute_compatibility._score_chunk
+
+        def score_chunk_and_delete(viewer_ids):
+            scored = score_chunk(viewer_ids)
+            User.objects.filter(id=deleted.id).delete()
+            return scored
+
+        with mock.patch.object(precompute_compatibility, '_score_chunk', score_chunk_and_delete):
+            self.precompute()
+        self.assertFalse(CompatibilityScore.objects.filter(user1_id=deleted.id).exists())
+        self.assertFalse(CompatibilityScore.objects.filter(user2_id=deleted.id).exists())
+        self.assertEqual(
+            set(CompatibilityScore.objects.values_list('user1_id', 'user2_id')),
+            set(self.expected_scores(self.users[:-1]))
+        )
+
+    def test_profiles_created_after_the_matrix_are_skipped(self):
+        from matching.management.commands import precompute_compatibility
+        created_late = self.users[-1]
+        rows = profile_rows(PersonalityProfile.objects.exclude(user=created_late))
+
+        with mock.patch.object(precompute_compatibility, 'profile_rows', return_value=rows):
+            self.precompute()
+        self.assertFalse(CompatibilityScore.objects.filter(user1_id=created_late.id).exists())
+        stored = CompatibilityScore.objects.get(user1=self.users[0], user2=self.users[1]).as_result()
+        self.assertEqual(stored, calculate_compatibility(self.users[0], self.users[1]))
+
+    def test_viewers_can_be_sharded_by_city(self):
+        viewers = [user for user in self.users if user.preferred_city.lower() == 'nairobi']
+        self.assertTrue(0 < len(viewers) < len(self.users))
+        self.precompute(city='Nairobi')
+        self.assertEqual(
+            set(CompatibilityScore.objects.values_list('user1_id', 'user2_id')),
+            set(self.expected_scores(viewers))
+        )
+
+
+class ScoringVersionTests(TestCase):
+    def setUp(self):
+        profile_pool.clear()
+        rng = random.Random(23)
+        self.users = [create_user_with_profile(i, rng) for i in range(4)]
+        self.alice, self.bob = self.users[:2]
+
+    def expected(self, user1, user2):
+        return calculate_compatibility(user1, user2)['compatibility_score']
+
+    def test_outdated_cached_scores_are_rescored_on_read(self):
+        CompatibilityScore.objects.create(user1=self.alice, user2=self.bob, overall_score=1, scoring_version=0)
+        bob = User.objects.select_related('personality_profile').get(id=self.bob.id)
+        self.assertEqual(cached_scores(self.alice, [bob])[bob.id]['compatibility_score'], self.expected(self.alice, bob))
+
+        score = CompatibilityScore.objects.get()
+        self.assertEqual((score.overall_score, score.scoring_version), (self.expected(self.alice, bob), SCORING_VERSION))
+
+    def test_outdated_match_scores_are_rescored_when_listed(self):
+        match = Match.objects.create(user1=self.alice, user2=self.bob, compatibility_score=1, status='mutual', scoring_version=0)
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        response = client.get('/api/matching/matches/')
+        self.assertEqual(response.data[0]['compatibilityScore'], self.expected(self.alice, self.bob))
+        match.refresh_from_db()
+        self.assertEqual(match.scoring_version, SCORING_VERSION)
+
+    def test_outdated_decks_are_rebuilt_on_read(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        client.get('/api/matching/suggestions/')
+        SuggestionDeck.objects.update(entries=[], complete=True, scoring_version=0)
+        response = client.get('/api/matching/suggestions/')
+        self.assertTrue(response.data)
+        self.assertEqual(SuggestionDeck.objects.get().scoring_version, SCORING_VERSION)
+
+    def test_sweeper_upgrades_every_outdated_row(self):
+        carol, dave = self.users[2:]
+        for user1, user2 in ((self.alice, self.bob), (self.alice, carol), (carol, dave), (dave, self.bob)):
+            CompatibilityScore.objects.create(user1=user1, user2=user2, overall_score=1, scoring_version=0)
+        Match.objects.create(user1=self.alice, user2=carol, compatibility_score=1, status='mutual', scoring_version=0)
+        dave.personality_profile.delete()
+
+        call_command('upgrade_scores', batch_size=2, stdout=StringIO())
+        self.assertEqual(
+            {(score.user1_id, score.user2_id): score.overall_score for score in CompatibilityScore.objects.all()},
+            {(self.alice.id, self.bob.id): self.expected(self.alice, self.bob),
+             (self.alice.id, carol.id): self.expected(self.alice, carol)}
+        )
+        self.assertFalse(CompatibilityScore.objects.exclude(scoring_version=SCORING_VERSION).exists())
+        self.assertEqual(Match.objects.get().compatibility_score, self.expected(self.alice, carol))
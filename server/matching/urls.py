@@ -5,6 +5,7 @@ urlpatterns = [
     path('suggestions/', views.get_match_suggestions, name='match_suggestions'),
     path('accept/', views.accept_match, name='accept_match'),
     path('reject/', views.reject_match, name='reject_match'),
+    path('interactions/', views.record_interaction_batch, name='record_interaction_batch'),
     path('matches/', views.get_user_matches, name='get_user_matches'),
     path('requests/', views.get_match_requests, name='get_match_requests'),
     path('respond/', views.respond_to_match_request, name='respond_to_match_request'),
@@ -7,30 +7,54 @@ from django.db.models import Q
 from .models import Match, MatchInteraction, CompatibilityScore
 from personality.models import PersonalityProfile
 from authentication.serializers import UserSerializer
-import math
+from pairpad_server.pagination import encode_cursor, decode_cursor
+from .deck import deck_suggestions, entry_score
+from .scoring import LIFESTYLE_RULES, lifestyle_answer, pair_lifestyle_similarity
+from .score_cache import cached_scores, cached_compatibility, refresh_match_scores
+from .services import LIKE_TYPES, like_user, pass_user, record_interactions
 
 User = get_user_model()
 
+SUGGESTION_PAGE_SIZE = 10
+MAX_SUGGESTION_PAGE_SIZE = 50
+MAX_INTERACTION_BATCH_SIZE = 100
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_match_suggestions(request):
-    """Get compatible user suggestions"""
+    """
+    Get the most compatible user suggestions, best first.
+
+    Suggestions are read from the user's precomputed deck (see
+    ``matching.deck``): candidates meeting their hard constraints (see
+    ``matching.candidates``), ranked by compatibility (or, for very large
+    pools, among their nearest neighbours, see ``matching.ann``). When
+    more remain, the ``X-Next-Cursor`` response header holds a cursor to pass
+    back as ``?cursor=`` to load the next page.
+    """
     current_user = request.user
 
-    # Get users who haven't been interacted with
-    interacted_users = MatchInteraction.objects.filter(user=current_user).values_list('target_user_id', flat=True)
-    excluded_users = list(interacted_users) + [current_user.id]
-
-    # Get users with personality profiles
-    suggested_users = User.objects.filter(
-        personality_profile__isnull=False
-    ).exclude(id__in=excluded_users)[:10]
-
-    # Calculate compatibility scores
+    try:
+        limit = min(int(request.GET.get('limit', SUGGESTION_PAGE_SIZE)), MAX_SUGGESTION_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        after = decode_cursor(request.GET.get('cursor'), 2)
+        if after is not None:
+            after = tuple(int(value) for value in after)
+    except (TypeError, ValueError):
+        return Response({'error': 'Invalid limit or cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Serve the page from the user's precomputed suggestion deck
+    ranked = deck_suggestions(current_user, limit + 1, after)
+    has_more = len(ranked) > limit
+    ranked = ranked[:limit]
+
+    users = User.objects.select_related('personality_profile').in_bulk([user_id for user_id, _ in ranked])
     suggestions_with_scores = []
-    for user in suggested_users:
-        compatibility_data = calculate_compatibility(current_user, user)
-        user_data = UserSerializer(user).data
+    for user_id, compatibility_data in ranked:
+        if user_id not in users:
+            continue  # Deleted since the profile pool was last rebuilt
+        user_data = UserSerializer(users[user_id]).data
 
         # Handle both old (int) and new (dict) return formats
         if isinstance(compatibility_data, dict):
@@ -43,10 +67,12 @@ def get_match_suggestions(request):
 
         suggestions_with_scores.append(user_data)
 
-    # Sort by compatibility score
-    suggestions_with_scores.sort(key=lambda x: x['compatibility_score'], reverse=True)
-
-    return Response(suggestions_with_scores)
+    response = Response(suggestions_with_scores)
+    if has_more:
+        # From the last ranked entry, which may belong to a user deleted since
+        last_id, last_data = ranked[-1]
+        response['X-Next-Cursor'] = encode_cursor(entry_score(last_data), last_id)
+    return response
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -59,34 +85,12 @@ def accept_match(request):
     except User.DoesNotExist:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    # Create interaction
-    interaction, created = MatchInteraction.objects.get_or_create(
-        user=request.user,
-        target_user=target_user,
-        defaults={'interaction_type': 'like'}
-    )
-
-    # Check if it's mutual
-    mutual_interaction = MatchInteraction.objects.filter(
-        user=target_user,
-        target_user=request.user,
-        interaction_type='like'
-    ).exists()
+    # Record the like, creating the match if it is mutual
+    match, compatibility_data = like_user(request.user, target_user)
 
-    if mutual_interaction:
-        # Create match
-        compatibility_data = calculate_compatibility(request.user, target_user)
+    if match:
         compat_score = compatibility_data['compatibility_score'] if isinstance(compatibility_data, dict) else compatibility_data
 
-        match, created = Match.objects.get_or_create(
-            user1=min(request.user, target_user, key=lambda x: x.id),
-            user2=max(request.user, target_user, key=lambda x: x.id),
-            defaults={
-                'compatibility_score': compat_score,
-                'status': 'mutual'
-            }
-        )
-
         response_data = {
             'message': 'Match created!',
             'match_id': match.id,
@@ -112,14 +116,52 @@ def reject_match(request):
     except User.DoesNotExist:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    MatchInteraction.objects.get_or_create(
-        user=request.user,
-        target_user=target_user,
-        defaults={'interaction_type': 'pass'}
-    )
+    pass_user(request.user, target_user)
 
     return Response({'message': 'User passed'})
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def record_interaction_batch(request):
+    """
+    Record a batch of swipes: {"decisions": [{"user_id": ..., "action": "like"}, ...]}
+
+    Actions are like, pass, super_like or block. Mutual likes are matched and
+    the created (or existing) matches returned. ``recorded`` counts the
+    interactions stored by this batch, leaving out users already decided on.
+    """
+    decisions = request.data.get('decisions')
+    if not isinstance(decisions, list) or not 0 < len(decisions) <= MAX_INTERACTION_BATCH_SIZE:
+        return Response(
+            {'error': f'decisions must be a list of 1 to {MAX_INTERACTION_BATCH_SIZE} items'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    actions = dict(MatchInteraction.INTERACTION_TYPES)
+    parsed = []
+    for decision in decisions:
+        try:
+            target_user_id, action = int(decision['user_id']), decision['action']
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': 'Each decision needs a user_id and an action'}, status=status.HTTP_400_BAD_REQUEST)
+        if action not in actions:
+            return Response({'error': f'Invalid action: {action}'}, status=status.HTTP_400_BAD_REQUEST)
+        parsed.append((target_user_id, action))
+
+    recorded, matches = record_interactions(request.user, parsed)
+
+    return Response({
+        'recorded': recorded,
+        'matches': [
+            {
+                'user_id': user_id,
+                'match_id': match.id,
+                'compatibility_score': match.compatibility_score,
+            }
+            for user_id, (match, _compatibility_data) in matches.items()
+        ]
+    })
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_matches(request):
@@ -128,20 +170,22 @@ def get_user_matches(request):
     matches = Match.objects.filter(
         Q(user1=user) | Q(user2=user),
         status='mutual'
+    ).select_related(
+        'user1__personality_profile', 'user2__personality_profile'
     ).order_by('-created_at')
 
     match_data = []
-    for match in matches:
-        other_user = match.user2 if match.user1 == user else match.user1
+    for match in refresh_match_scores(list(matches)):
+        other_user = match.user2 if match.user1_id == user.id else match.user1
         other_user_data = UserSerializer(other_user).data
 
         # Determine if this is the primary match for the current user
-        is_primary = match.is_primary_for_user1 if match.user1 == user else match.is_primary_for_user2
+        is_primary = match.is_primary_for_user1 if match.user1_id == user.id else match.is_primary_for_user2
 
         match_data.append({
             'id': str(match.id),
-            'user1Id': str(match.user1.id),
-            'user2Id': str(match.user2.id),
+            'user1Id': str(match.user1_id),
+            'user2Id': str(match.user2_id),
             'compatibilityScore': match.compatibility_score,
             'status': match.status,
             'createdAt': match.created_at.isoformat(),
@@ -161,7 +205,7 @@ def get_match_requests(request):
     # Find users who have liked the current user but current user hasn't responded
     incoming_likes = MatchInteraction.objects.filter(
         target_user=user,
-        interaction_type='like'
+        interaction_type__in=LIKE_TYPES
     )
 
     # Filter out users that current user has already responded to
@@ -169,14 +213,15 @@ def get_match_requests(request):
         user=user
     ).values_list('target_user_id', flat=True)
 
-    pending_requests = incoming_likes.exclude(
+    pending_requests = list(incoming_likes.exclude(
         user_id__in=responded_users
-    )
+    ).select_related('user__personality_profile'))
 
+    scores = cached_scores(user, [interaction.user for interaction in pending_requests])
     request_data = []
     for interaction in pending_requests:
         requesting_user = interaction.user
-        compatibility_data = calculate_compatibility(user, requesting_user)
+        compatibility_data = scores[requesting_user.id]
         user_data = UserSerializer(requesting_user).data
 
         # Handle both old (int) and new (dict) return formats
@@ -216,33 +261,20 @@ def respond_to_match_request(request):
     incoming_like = MatchInteraction.objects.filter(
         user=requester_user,
         target_user=request.user,
-        interaction_type='like'
+        interaction_type__in=LIKE_TYPES
     ).first()
 
     if not incoming_like:
         return Response({'error': 'No match request found'}, status=status.HTTP_404_NOT_FOUND)
 
     if response_type == 'accept':
-        # Create interaction for accepting
-        interaction, created = MatchInteraction.objects.get_or_create(
-            user=request.user,
-            target_user=requester_user,
-            defaults={'interaction_type': 'like'}
-        )
-
-        # Create match since both users liked each other
-        compatibility_data = calculate_compatibility(request.user, requester_user)
+        # Record the like and create the match since both users liked each other
+        match, compatibility_data = like_user(request.user, requester_user)
+        if not match:
+            # The request was withdrawn in the meantime
+            return Response({'error': 'No match request found'}, status=status.HTTP_404_NOT_FOUND)
         compat_score = compatibility_data['compatibility_score'] if isinstance(compatibility_data, dict) else compatibility_data
 
-        match, created = Match.objects.get_or_create(
-            user1=min(request.user, requester_user, key=lambda x: x.id),
-            user2=max(request.user, requester_user, key=lambda x: x.id),
-            defaults={
-                'compatibility_score': compat_score,
-                'status': 'mutual'
-            }
-        )
-
         response_data = {
             'message': 'Match request accepted!',
             'match_id': match.id,
@@ -256,12 +288,7 @@ def respond_to_match_request(request):
         return Response(response_data)
 
     else:  # decline
-        # Create interaction for declining
-        MatchInteraction.objects.get_or_create(
-            user=request.user,
-            target_user=requester_user,
-            defaults={'interaction_type': 'pass'}
-        )
+        pass_user(request.user, requester_user)
 
         return Response({'message': 'Match request declined'})
 
@@ -270,8 +297,8 @@ def respond_to_match_request(request):
 def get_compatibility(request, user_id):
     """Get compatibility score with specific user"""
     try:
-        target_user = User.objects.get(id=user_id)
-        compatibility_data = calculate_compatibility(request.user, target_user)
+        target_user = User.objects.select_related('personality_profile').get(id=user_id)
+        compatibility_data = cached_compatibility(request.user, target_user)
 
         # Handle both old (int) and new (dict) return formats
         if isinstance(compatibility_data, dict):
@@ -312,6 +339,8 @@ def get_shared_dashboard_info(request, match_id):
             status='mutual'
         )
 
+        refresh_match_scores([match])
+
         # Get or create living space
         living_space = match.get_or_create_living_space()
 
@@ -337,135 +366,11 @@ def calculate_lifestyle_similarity(lifestyle1, lifestyle2):
     similarity_score = 0
     total_comparisons = 0
 
-    # Helper function to compare values
-    def compare_value(val1, val2, match_weight=100, partial_weight=50, mismatch_weight=0):
-        if val1 == val2:
-            return match_weight
-        # For some comparisons, partial matches are possible
-        return partial_weight if partial_weight else mismatch_weight
-
-    # Daily routine compatibility
-    if 'early_bird' in lifestyle1 and 'early_bird' in lifestyle2:
-        similarity_score += compare_value(lifestyle1['early_bird'], lifestyle2['early_bird'], 100, 60, 30)
-        total_comparisons += 1
-
-    # Cooking frequency (compatible if both cook or both don't)
-    if 'cooking_frequency' in lifestyle1 and 'cooking_frequency' in lifestyle2:
-        cook_compatibility = {
-            ('daily', 'few_times_week'): 90,
-            ('daily', 'daily'): 100,
-            ('few_times_week', 'few_times_week'): 100,
-            ('rarely', 'never'): 80,
-        }
-        key = (lifestyle1['cooking_frequency'], lifestyle2['cooking_frequency'])
-        similarity_score += cook_compatibility.get(key, cook_compatibility.get((key[1], key[0]), 50))
-        total_comparisons += 1
-
-    # Hosting visitors frequency
-    if 'hosting_visitors' in lifestyle1 and 'hosting_visitors' in lifestyle2:
-        visitor_map = {'frequently': 100, 'occasionally': 75, 'rarely': 50, 'never': 25}
-        diff = abs(visitor_map.get(lifestyle1['hosting_visitors'], 50) - visitor_map.get(lifestyle2['hosting_visitors'], 50))
-        similarity_score += max(0, 100 - diff)
-        total_comparisons += 1
-
-    # Smoking/drinking - critical compatibility factor
-    if 'smoking_drinking' in lifestyle1 and 'smoking_drinking' in lifestyle2:
-        if lifestyle1['smoking_drinking'] == lifestyle2['smoking_drinking']:
-            similarity_score += 100
-        elif 'neither' in [lifestyle1['smoking_drinking'], lifestyle2['smoking_drinking']]:
-            # Neither person wants smoking/drinking - partial mismatch
-            similarity_score += 40
-        else:
-            similarity_score += 60  # Partial compatibility
-        total_comparisons += 1
-
-    # Noise preference - important for living comfort
-    if 'noise_preference' in lifestyle1 and 'noise_preference' in lifestyle2:
-        noise_map = {'very_quiet': 100, 'moderate': 50, 'dont_mind': 0}
-        diff = abs(noise_map.get(lifestyle1['noise_preference'], 50) - noise_map.get(lifestyle2['noise_preference'], 50))
-        similarity_score += max(0, 100 - diff)
-        total_comparisons += 1
-
-    # Chore frequency
-    if 'chore_frequency' in lifestyle1 and 'chore_frequency' in lifestyle2:
-        similarity_score += compare_value(lifestyle1['chore_frequency'], lifestyle2['chore_frequency'], 100, 70, 40)
-        total_comparisons += 1
-
-    # Sharing items preference
-    if 'sharing_items' in lifestyle1 and 'sharing_items' in lifestyle2:
-        similarity_score += compare_value(lifestyle1['sharing_items'], lifestyle2['sharing_items'], 100, 65, 30)
-        total_comparisons += 1
-
-    # Financial compatibility
-    if 'bill_splitting' in lifestyle1 and 'bill_splitting' in lifestyle2:
-        similarity_score += compare_value(lifestyle1['bill_splitting'], lifestyle2['bill_splitting'], 100, 70, 50)
-        total_comparisons += 1
-
-    if 'cost_sharing' in lifestyle1 and 'cost_sharing' in lifestyle2:
-        similarity_score += compare_value(lifestyle1['cost_sharing'], lifestyle2['cost_sharing'], 100, 65, 40)
-        total_comparisons += 1
-
-    if 'bill_payment' in lifestyle1 and 'bill_payment' in lifestyle2:
-        # Bill payment strictness - very important
-        if lifestyle1['bill_payment'] == lifestyle2['bill_payment']:
-            similarity_score += 100
-        elif 'very_strict' in [lifestyle1['bill_payment'], lifestyle2['bill_payment']]:
-            similarity_score += 50  # Strict person might have issues with flexible person
-        else:
-            similarity_score += 75
-        total_comparisons += 1
-
-    # Social compatibility
-    if 'roommate_relationship' in lifestyle1 and 'roommate_relationship' in lifestyle2:
-        similarity_score += compare_value(lifestyle1['roommate_relationship'], lifestyle2['roommate_relationship'], 100, 60, 30)
-        total_comparisons += 1
-
-    if 'group_activities' in lifestyle1 and 'group_activities' in lifestyle2:
-        activity_map = {'love_it': 100, 'occasionally': 60, 'rarely': 30, 'prefer_not': 0}
-        diff = abs(activity_map.get(lifestyle1['group_activities'], 50) - activity_map.get(lifestyle2['group_activities'], 50))
-        similarity_score += max(0, 100 - diff)
-        total_comparisons += 1
-
-    # Gender preference - can be dealbreaker
-    if 'gender_preference' in lifestyle1 and 'gender_preference' in lifestyle2:
-        if lifestyle1['gender_preference'] == 'any_gender' and lifestyle2['gender_preference'] == 'any_gender':
-            similarity_score += 100
-        elif 'any_gender' in [lifestyle1['gender_preference'], lifestyle2['gender_preference']]:
-            similarity_score += 75
-        else:
-            similarity_score += compare_value(lifestyle1['gender_preference'], lifestyle2['gender_preference'], 100, 50, 20)
-        total_comparisons += 1
-
-    # Pet compatibility
-    if 'pets' in lifestyle1 and 'pets' in lifestyle2:
-        pet_scores = {
-            ('have_pets', 'love_pets'): 95,
-            ('have_pets', 'okay_with_pets'): 85,
-            ('have_pets', 'no_pets'): 30,
-            ('have_pets', 'allergic'): 20,
-            ('love_pets', 'okay_with_pets'): 90,
-            ('okay_with_pets', 'no_pets'): 50,
-            ('allergic', 'have_pets'): 25,
-            ('no_pets', 'have_pets'): 30,
-        }
-        key = (lifestyle1['pets'], lifestyle2['pets'])
-        similarity_score += pet_scores.get(key, pet_scores.get((key[1], key[0]), 70))
-        total_comparisons += 1
-
-    # Allergies compatibility
-    if 'allergies' in lifestyle1 and 'allergies' in lifestyle2:
-        if lifestyle1['allergies'] == 'none' and lifestyle2['allergies'] == 'none':
-            similarity_score += 100
-        elif 'none' in [lifestyle1['allergies'], lifestyle2['allergies']]:
-            similarity_score += 80
-        else:
-            similarity_score += 60
-        total_comparisons += 1
-
-    # Ideal personality match
-    if 'ideal_personality' in lifestyle1 and 'ideal_personality' in lifestyle2:
-        similarity_score += compare_value(lifestyle1['ideal_personality'], lifestyle2['ideal_personality'], 100, 65, 40)
-        total_comparisons += 1
+    # Per-question rules live in matching.scoring so the batch engine shares them
+    for key, rule in LIFESTYLE_RULES:
+        if key in lifestyle1 and key in lifestyle2:
+            similarity_score += rule(lifestyle_answer(lifestyle1[key]), lifestyle_answer(lifestyle2[key]))
+            total_comparisons += 1
 
     return round(similarity_score / total_comparisons) if total_comparisons > 0 else 50
 
@@ -482,9 +387,11 @@ def calculate_compatibility(user1, user2):
         return 0
 
     # 1. Lifestyle Similarity Score (50% weight) - Based on detailed lifestyle data
-    lifestyle1 = profile1.lifestyle_data or {}
-    lifestyle2 = profile2.lifestyle_data or {}
-    lifestyle_similarity = calculate_lifestyle_similarity(lifestyle1, lifestyle2)
+    lifestyle_similarity = pair_lifestyle_similarity(profile1.lifestyle_codes, profile2.lifestyle_codes)
+    if lifestyle_similarity is None:
+        lifestyle1 = profile1.lifestyle_data or {}
+        lifestyle2 = profile2.lifestyle_data or {}
+        lifestyle_similarity = calculate_lifestyle_similarity(lifestyle1, lifestyle2)
 
     # 2. Basic Lifestyle Preferences (15% weight)
     basic_lifestyle_score = 0
@@ -10,7 +10,10 @@ class ConversationAdmin(admin.ModelAdmin):
     ]
     list_filter = ['is_active', 'created_at', 'updated_at']
     search_fields = ['participants__username', 'match__user1__username', 'match__user2__username']
-    readonly_fields = ['created_at', 'updated_at', 'last_message_preview']
+    readonly_fields = [
+        'created_at', 'updated_at', 'last_message_preview',
+        'last_message', 'last_message_snippet', 'last_message_at'
+    ]
     ordering = ['-updated_at']
     filter_horizontal = ['participants']
 
@@ -34,7 +37,7 @@ class ConversationAdmin(admin.ModelAdmin):
     last_message_preview.short_description = 'Last Message'
 
     def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related('participants')
+        return super().get_queryset(request).select_related('last_message__sender').prefetch_related('participants')
 
     actions = ['deactivate_conversations', 'activate_conversations']
 
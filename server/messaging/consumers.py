@@ -0,0 +1,54 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .events import conversation_group, message_event
+from .models import Conversation
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Live chat for one conversation.
+
+    Only authenticated participants may connect. Clients send
+    ``{"content": "..."}``; each message is saved and then delivered to every
+    participant's open socket, including the sender's.
+    """
+
+    group_name = None
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
+
+        if self.user is None or not self.user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        self.conversation = await Conversation.objects.filter(
+            id=self.conversation_id,
+            participants=self.user,
+            is_active=True
+        ).afirst()
+        if self.conversation is None:
+            await self.close(code=4403)
+            return
+
+        self.group_name = conversation_group(self.conversation_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        text = content.get('content') if isinstance(content, dict) else None
+        if not isinstance(text, str) or not text.strip():
+            await self.send_json({'error': 'Message content is required'})
+            return
+
+        message = await database_sync_to_async(self.conversation.add_message)(self.user, text)
+        await self.channel_layer.group_send(self.group_name, message_event(message))
+
+    async def chat_message(self, event):
+        await self.send_json(event['message'])
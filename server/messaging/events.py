@@ -0,0 +1,52 @@
+"""
+Real-time conversation events.
+
+Every open chat socket joins its conversation's channel layer group, so a
+message saved anywhere (the WebSocket consumer or the REST ``send_message``
+view) is pushed to all connected participants instead of being polled for.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def conversation_group(conversation_id):
+    """Channel layer group of the sockets open on a conversation"""
+    return f'conversation_{conversation_id}'
+
+
+def message_payload(message):
+    """Serialize a message the way the messaging endpoints return it"""
+    return {
+        'id': message.id,
+        'conversation_id': message.conversation_id,
+        'sender': message.sender.username,
+        'content': message.content,
+        'timestamp': message.created_at.isoformat(),
+    }
+
+
+def message_event(message):
+    return {'type': 'chat.message', 'message': message_payload(message)}
+
+
+def broadcast_message(message):
+    """
+    Push a saved message to every socket open on its conversation.
+
+    The push happens once the current transaction commits. The message is
+    already saved, so a channel layer that is down is only logged.
+    """
+    group, event = conversation_group(message.conversation_id), message_event(message)
+    transaction.on_commit(lambda: _send(group, event))
+
+
+def _send(group, event):
+    try:
+        async_to_sync(get_channel_layer().group_send)(group, event)
+    except Exception:
+        logger.exception('Could not push message %s to %s', event['message']['id'], group)
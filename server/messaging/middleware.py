@@ -0,0 +1,34 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+
+@database_sync_to_async
+def get_token_user(raw_token):
+    """Return the user of a valid JWT access token, or None"""
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticate WebSocket connections from a ``?token=<access token>`` query.
+
+    Browsers cannot set headers on WebSocket requests, so the access token
+    the client already holds is passed in the query string instead. Without
+    a token, the user set by the session middleware is kept.
+    """
+
+    async def __call__(self, scope, receive, send):
+        tokens = parse_qs(scope.get('query_string', b'').decode()).get('token')
+        if tokens:
+            user = await get_token_user(tokens[0])
+            if user is not None:
+                scope = dict(scope, user=user)
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_last_message_and_members(apps, schema_editor):
+    Conversation = apps.get_model('messaging', 'Conversation')
+    ConversationMember = apps.get_model('messaging', 'ConversationMember')
+    Message = apps.get_model('messaging', 'Message')
+
+    for conversation in Conversation.objects.prefetch_related('participants'):
+        messages = Message.objects.filter(conversation=conversation)
+        last_message = messages.order_by('-created_at', '-id').first()
+        if last_message:
+            conversation.last_message = last_message
+            conversation.last_message_snippet = last_message.content[:100]
+            conversation.last_message_at = last_message.created_at
+            conversation.save(update_fields=['last_message', 'last_message_snippet', 'last_message_at'])
+
+        for user in conversation.participants.all():
+            member, _ = ConversationMember.objects.get_or_create(conversation=conversation, user=user)
+            unread = messages.filter(is_deleted=False).exclude(sender=user)
+            if member.last_seen_message_id:
+                unread = unread.filter(created_at__gt=member.last_seen_message.created_at)
+            member.unread_count = unread.count()
+            member.save(update_fields=['unread_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matching', '0003_compatibilityscore_similarity_and_basic_lifestyle'),
+        ('messaging', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='messaging.message'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_snippet',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='conversationmember',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['last_message_at'], name='messaging_c_last_me_87f299_idx'),
+        ),
+        migrations.RunPython(backfill_last_message_and_members, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+LAST_MESSAGE_SNIPPET_LENGTH = 100
+
 class Conversation(models.Model):
     participants = models.ManyToManyField(User, related_name='conversations')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -18,18 +21,48 @@ class Conversation(models.Model):
         blank=True
     )
 
+    # Newest message, denormalized by add_message so inbox listings need no per-conversation queries
+    last_message = models.ForeignKey(
+        'Message',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    last_message_snippet = models.CharField(max_length=LAST_MESSAGE_SNIPPET_LENGTH, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         indexes = [
             models.Index(fields=['updated_at']),
+            models.Index(fields=['last_message_at']),
         ]
 
     def __str__(self):
         participant_names = [user.username for user in self.participants.all()]
         return f"Conversation between {', '.join(participant_names)}"
 
-    @property
-    def last_message(self):
-        return self.messages.order_by('-created_at').first()
+    def add_message(self, sender, content, message_type='text'):
+        """Save a message and update the last message and members' unread counts"""
+        with transaction.atomic():
+            message = Message.objects.create(
+                conversation=self,
+                sender=sender,
+                message_type=message_type,
+                content=content
+            )
+            # Skip if a newer message was recorded concurrently
+            Conversation.objects.filter(
+                Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.created_at),
+                id=self.id
+            ).update(
+                last_message=message,
+                last_message_snippet=content[:LAST_MESSAGE_SNIPPET_LENGTH],
+                last_message_at=message.created_at,
+                updated_at=message.created_at
+            )
+            self.members.filter(is_active=True).exclude(user=sender).update(unread_count=F('unread_count') + 1)
+        return message
 
 class Message(models.Model):
     MESSAGE_TYPES = [
@@ -92,6 +125,8 @@ class ConversationMember(models.Model):
         blank=True,
         related_name='+'
     )
+    # Messages from others since last_seen_message, maintained on write
+    unread_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ['conversation', 'user']
@@ -100,10 +135,46 @@ class ConversationMember(models.Model):
         return f"{self.user.username} in {self.conversation}"
 
     def get_unread_count(self):
-        if not self.last_seen_message:
-            return self.conversation.messages.count()
-
-        return self.conversation.messages.filter(
-            created_at__gt=self.last_seen_message.created_at,
+        return self.unread_count
+
+    def mark_seen(self, message):
+        """
+        Mark every message up to and including ``message`` as read.
+
+        Writes the missing ``MessageReadStatus`` rows in one bulk insert,
+        advances ``last_seen_message`` and recounts ``unread_count``. Never
+        moves backwards; returns the number of messages newly marked read.
+        """
+        with transaction.atomic():
+            member = ConversationMember.objects.select_for_update().select_related(
+                'last_seen_message'
+            ).get(id=self.id)
+            seen = member.last_seen_message
+            if seen and (seen.created_at, seen.id) >= (message.created_at, message.id):
+                return 0
+
+            newly_read = list(member.unread_messages().filter(
+                Q(created_at__lt=message.created_at) | Q(created_at=message.created_at, id__lte=message.id)
+            ).values_list('id', flat=True))
+            MessageReadStatus.objects.bulk_create(
+                [MessageReadStatus(message_id=message_id, user_id=member.user_id) for message_id in newly_read],
+                ignore_conflicts=True
+            )
+
+            member.last_seen_message = message
+            member.unread_count = member.unread_messages().count()
+            member.save(update_fields=['last_seen_message', 'unread_count'])
+
+        self.last_seen_message = message
+        self.unread_count = member.unread_count
+        return len(newly_read)
+
+    def unread_messages(self):
+        """Messages from others since the last seen message"""
+        messages = Message.objects.filter(
+            conversation_id=self.conversation_id,
             is_deleted=False
-        ).exclude(sender=self.user).count()
+        ).exclude(sender_id=self.user_id)
+        if self.last_seen_message:
+            messages = messages.filter(created_at__gt=self.last_seen_message.created_at)
+        return messages
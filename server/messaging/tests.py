@@ -1,3 +1,215 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from matching.models import Match
+from pairpad_server.asgi import application
+from .models import Conversation, ConversationMember, Message, MessageReadStatus
+
+User = get_user_model()
+
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ChatConsumerTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com')
+        self.carol = User.objects.create_user(username='carol', email='carol@example.com')
+        self.match = Match.objects.create(user1=self.alice, user2=self.bob, compatibility_score=80, status='mutual')
+        self.conversation = Conversation.objects.create(match=self.match)
+        self.conversation.participants.add(self.alice, self.bob)
+
+    def socket(self, user=None):
+        query_string = f'token={AccessToken.for_user(user)}' if user else ''
+        return ApplicationCommunicator(application, {
+            'type': 'websocket',
+            'path': f'/ws/chat/{self.conversation.id}/',
+            'query_string': query_string.encode(),
+            'headers': [(b'host', b'localhost'), (b'origin', b'http://localhost:3000')],
+            'subprotocols': [],
+        })
+
+    async def connect(self, socket):
+        await socket.send_input({'type': 'websocket.connect'})
+        return await socket.receive_output(timeout=1)
+
+    async def receive_json(self, socket):
+        output = await socket.receive_output(timeout=1)
+        return json.loads(output['text'])
+
+    async def close(self, *sockets):
+        for socket in sockets:
+            await socket.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await socket.wait(timeout=1)
+
+    def send_over_rest(self, content):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        # Messages are pushed once the request's transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.post('/api/messaging/send/', {'match_id': self.match.id, 'content': content}, format='json')
+
+    async def test_messages_are_saved_and_delivered_to_every_participant(self):
+        alice, bob = self.socket(self.alice), self.socket(self.bob)
+        self.assertEqual((await self.connect(alice))['type'], 'websocket.accept')
+        self.assertEqual((await self.connect(bob))['type'], 'websocket.accept')
+
+        await alice.send_input({'type': 'websocket.receive', 'text': json.dumps({'content': 'Hi Bob'})})
+        for socket in (alice, bob):
+            payload = await self.receive_json(socket)
+            self.assertEqual((payload['sender'], payload['content']), ('alice', 'Hi Bob'))
+
+        self.assertTrue(await Message.objects.filter(
+            id=payload['id'], conversation=self.conversation, sender=self.alice
+        ).aexists())
+        await self.close(alice, bob)
+
+    async def test_messages_sent_over_rest_are_pushed_to_open_sockets(self):
+        bob = self.socket(self.bob)
+        await self.connect(bob)
+
+        response = await sync_to_async(self.send_over_rest)('Sent over REST')
+        self.assertEqual(response.status_code, 200)
+
+        payload = await self.receive_json(bob)
+        self.assertEqual((payload['id'], payload['content']), (response.data['id'], 'Sent over REST'))
+        await self.close(bob)
+
+    def test_messages_are_saved_when_the_channel_layer_is_down(self):
+        with mock.patch('messaging.events.get_channel_layer', side_effect=ConnectionError), \
+                self.assertLogs('messaging.events', 'ERROR'):
+            response = self.send_over_rest('Saved anyway')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Message.objects.filter(id=response.data['id'], content='Saved anyway').exists())
+
+    async def test_anonymous_users_and_outsiders_are_rejected(self):
+        self.assertEqual(await self.connect(self.socket()), {'type': 'websocket.close', 'code': 4401})
+        self.assertEqual(await self.connect(self.socket(self.carol)), {'type': 'websocket.close', 'code': 4403})
+
+
+class MessageHistoryTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com')
+        self.match = Match.objects.create(user1=self.alice, user2=self.bob, compatibility_score=80, status='mutual')
+        self.conversation = Conversation.objects.create(match=self.match)
+        self.conversation.participants.add(self.alice, self.bob)
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, sender=sender, content=f'message {i}')
+            for i, sender in enumerate([self.alice, self.bob] * 12)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.url = f'/api/messaging/{self.match.id}/'
+
+    def test_pages_walk_back_from_the_newest_message(self):
+        response = self.client.get(self.url, {'limit': 10})
+        self.assertEqual([m['id'] for m in response.data['messages']], [m.id for m in self.messages[-10:]])
+        after_cursor = response.data['after_cursor']
+
+        seen = []
+        while True:
+            seen[:0] = [m['id'] for m in response.data['messages']]
+            if not response.data['has_more']:
+                break
+            response = self.client.get(self.url, {'limit': 10, 'before': response.data['before_cursor']})
+        self.assertEqual(seen, [m.id for m in self.messages])
+
+        newer = Message.objects.create(conversation=self.conversation, sender=self.bob, content='new')
+        response = self.client.get(self.url, {'after': after_cursor})
+        self.assertEqual([m['id'] for m in response.data['messages']], [newer.id])
+
+    def test_page_is_fetched_in_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(3):
+            self.client.get(self.url, {'limit': 20})
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'before': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ConversationListTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com')
+        self.client = APIClient()
+        self.others = []
+
+    def start_conversation(self):
+        other = User.objects.create_user(username=f'friend{len(self.others)}', email=f'friend{len(self.others)}@example.com')
+        match = Match.objects.create(user1=self.alice, user2=other, compatibility_score=80, status='mutual')
+        self.client.force_authenticate(self.alice)
+        self.client.get(f'/api/messaging/{match.id}/')
+        self.others.append(other)
+        return match, other
+
+    def send(self, user, match, content):
+        self.client.force_authenticate(user)
+        return self.client.post('/api/messaging/send/', {'match_id': match.id, 'content': content}, format='json')
+
+    def test_last_message_and_unread_count_are_listed(self):
+        first_match, first = self.start_conversation()
+        second_match, second = self.start_conversation()
+        self.send(first, first_match, 'Hello')
+        self.send(first, first_match, 'Are you there?')
+        self.send(self.alice, first_match, 'Yes')
+        self.send(second, second_match, 'x' * 300)
+
+        self.client.force_authenticate(self.alice)
+        response = self.client.get('/api/messaging/conversations/')
+        self.assertEqual([c['match_id'] for c in response.data], [second_match.id, first_match.id])
+        self.assertEqual([c['unread_count'] for c in response.data], [1, 2])
+        self.assertEqual(response.data[0]['last_message']['content'], 'x' * 100)
+        self.assertEqual(response.data[1]['last_message']['sender'], 'alice')
+
+        self.client.force_authenticate(first)
+        response = self.client.get('/api/messaging/conversations/')
+        self.assertEqual(response.data[0]['unread_count'], 1)
+
+    def test_query_count_does_not_grow_with_conversations(self):
+        for count in (2, 8):
+            while len(self.others) < count:
+                match, other = self.start_conversation()
+                self.send(other, match, 'Hi')
+            self.client.force_authenticate(self.alice)
+            with self.assertNumQueries(2):
+                response = self.client.get('/api/messaging/conversations/')
+            self.assertEqual(len(response.data), count)
+
+    def test_mark_read_advances_last_seen_and_writes_receipts_in_bulk(self):
+        match, friend = self.start_conversation()
+        sent = [self.send(friend, match, f'message {i}').data['id'] for i in range(6)]
+        self.send(self.alice, match, 'mine')
+
+        self.client.force_authenticate(self.alice)
+        with self.assertNumQueries(9):
+            response = self.client.post('/api/messaging/read/', {'message_id': sent[3]}, format='json')
+        self.assertEqual((response.data['marked_read'], response.data['unread_count']), (4, 2))
+        self.assertEqual(
+            set(MessageReadStatus.objects.filter(user=self.alice).values_list('message_id', flat=True)),
+            set(sent[:4])
+        )
+
+        # Marking an older message read never moves last_seen backwards
+        response = self.client.post('/api/messaging/read/', {'message_id': sent[1]}, format='json')
+        self.assertEqual((response.data['marked_read'], response.data['last_seen_message_id']), (0, sent[3]))
+
+        member = ConversationMember.objects.get(user=self.alice)
+        self.assertEqual(member.get_unread_count(), 2)
+
+    def test_only_members_can_mark_messages_read(self):
+        match, friend = self.start_conversation()
+        message_id = self.send(friend, match, 'private').data['id']
+        outsider = User.objects.create_user(username='outsider', email='outsider@example.com')
+
+        self.client.force_authenticate(outsider)
+        response = self.client.post('/api/messaging/read/', {'message_id': message_id}, format='json')
+        self.assertEqual(response.status_code, 403)
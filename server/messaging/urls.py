@@ -5,4 +5,5 @@ urlpatterns = [
     path('conversations/', views.conversation_list, name='conversation_list'),
     path('<int:match_id>/', views.get_or_create_conversation, name='get_conversation'),
     path('send/', views.send_message, name='send_message'),
+    path('read/', views.mark_read, name='mark_read'),
 ]
\ No newline at end of file
@@ -3,59 +3,139 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from .models import Conversation, Message
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+from pairpad_server.pagination import encode_cursor, decode_cursor
+from .events import broadcast_message
+from .models import Conversation, ConversationMember, Message
 from matching.models import Match
 
 User = get_user_model()
 
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 100
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def conversation_list(request):
-    """Get all conversations for the current user"""
-    conversations = request.user.conversations.all()
-    conversation_data = []
+    """Get all conversations for the current user, most recently active first"""
+    user = request.user
+    unread_count = ConversationMember.objects.filter(
+        conversation=OuterRef('pk'),
+        user=user
+    ).values('unread_count')[:1]
+
+    # Last message fields and unread counters are denormalized, so this is one query plus participants
+    conversations = user.conversations.select_related(
+        'last_message__sender'
+    ).prefetch_related(
+        'participants'
+    ).annotate(
+        unread_count=Coalesce(Subquery(unread_count), 0)
+    ).order_by(F('last_message_at').desc(nulls_last=True), '-updated_at')
 
+    conversation_data = []
     for conv in conversations:
         last_msg = conv.last_message
         conversation_data.append({
             'id': conv.id,
-            'match_id': conv.match.id if conv.match else None,
+            'match_id': conv.match_id,
             'last_message': {
-                'content': last_msg.content if last_msg else None,
-                'timestamp': last_msg.created_at if last_msg else None,
-                'sender': last_msg.sender.username if last_msg else None,
+                'content': conv.last_message_snippet,
+                'timestamp': conv.last_message_at,
+                'sender': last_msg.sender.username,
             } if last_msg else None,
+            'unread_count': conv.unread_count,
             'participants': [p.username for p in conv.participants.all()],
             'updated_at': conv.updated_at,
         })
 
     return Response(conversation_data)
 
+def message_cursor(message):
+    return encode_cursor(message.created_at.isoformat(), message.id)
+
+
+def decode_message_cursor(cursor):
+    """Decode a message cursor into ``(created_at, id)``, or None if empty"""
+    values = decode_cursor(cursor, 2)
+    if values is None:
+        return None
+    created_at = parse_datetime(str(values[0]))
+    if created_at is None:
+        raise ValueError('Invalid cursor')
+    return created_at, int(values[1])
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_or_create_conversation(request, match_id):
-    """Get or create conversation for a match"""
+    """
+    Get or create conversation for a match, with a page of its messages.
+
+    Returns the newest ``limit`` messages by default. Pass ``?before=`` with
+    a ``before_cursor`` to load older messages, or ``?after=`` with an
+    ``after_cursor`` to load messages sent since. Messages in a page are
+    always oldest first.
+    """
+    try:
+        limit = min(int(request.GET.get('limit', MESSAGE_PAGE_SIZE)), MAX_MESSAGE_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        before = decode_message_cursor(request.GET.get('before'))
+        after = decode_message_cursor(request.GET.get('after'))
+    except (TypeError, ValueError):
+        return Response({'error': 'Invalid limit or cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
     try:
         match = Match.objects.get(id=match_id)
-        if request.user not in [match.user1, match.user2]:
+        if request.user.id not in [match.user1_id, match.user2_id]:
             return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
 
         conversation, created = Conversation.objects.get_or_create(match=match)
 
         if created:
-            conversation.participants.add(match.user1, match.user2)
+            conversation.participants.add(match.user1_id, match.user2_id)
+            ConversationMember.objects.bulk_create([
+                ConversationMember(conversation=conversation, user_id=user_id)
+                for user_id in (match.user1_id, match.user2_id)
+            ])
+
+        # Keyset pagination on (created_at, id), served by the (conversation, created_at) index
+        messages = conversation.messages.select_related('sender')
+        if after is not None:
+            created_at, message_id = after
+            messages = messages.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id)
+            ).order_by('created_at', 'id')
+        else:
+            if before is not None:
+                created_at, message_id = before
+                messages = messages.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id)
+                )
+            messages = messages.order_by('-created_at', '-id')
+
+        page = list(messages[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+        if after is None:
+            page.reverse()
 
-        messages = conversation.messages.all()
         message_data = [{
             'id': msg.id,
             'sender': msg.sender.username,
             'content': msg.content,
             'timestamp': msg.created_at,
-        } for msg in messages]
+        } for msg in page]
 
         return Response({
             'conversation_id': conversation.id,
-            'messages': message_data
+            'messages': message_data,
+            'has_more': has_more,
+            'before_cursor': message_cursor(page[0]) if page else None,
+            'after_cursor': message_cursor(page[-1]) if page else request.GET.get('after'),
         })
 
     except Match.DoesNotExist:
@@ -75,11 +155,10 @@ def send_message(request):
 
         conversation = Conversation.objects.get(match=match)
 
-        message = Message.objects.create(
-            conversation=conversation,
-            sender=request.user,
-            content=content
-        )
+        message = conversation.add_message(request.user, content)
+
+        # Deliver to participants connected over WebSocket
+        broadcast_message(message)
 
         return Response({
             'id': message.id,
@@ -90,3 +169,26 @@ def send_message(request):
 
     except (Match.DoesNotExist, Conversation.DoesNotExist):
         return Response({'error': 'Match or conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_read(request):
+    """Mark every message in a conversation up to ``message_id`` as read"""
+    message_id = request.data.get('message_id')
+
+    try:
+        message = Message.objects.get(id=message_id)
+        member = ConversationMember.objects.get(conversation_id=message.conversation_id, user=request.user)
+    except (Message.DoesNotExist, ValueError, TypeError):
+        return Response({'error': 'Message not found'}, status=status.HTTP_404_NOT_FOUND)
+    except ConversationMember.DoesNotExist:
+        return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
+
+    marked = member.mark_seen(message)
+
+    return Response({
+        'conversation_id': message.conversation_id,
+        'last_seen_message_id': member.last_seen_message_id,
+        'marked_read': marked,
+        'unread_count': member.unread_count,
+    })
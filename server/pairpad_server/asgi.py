@@ -9,22 +9,32 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from channels.security.websocket import AllowedHostsOriginValidator
-import messaging.routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pairpad_server.settings')
 
+# Initialize Django before importing consumers that use the ORM
 django_asgi_app = get_asgi_application()
 
+from channels.routing import ChannelNameRouter, ProtocolTypeRouter, URLRouter
+from channels.auth import AuthMiddlewareStack
+from channels.security.websocket import AllowedHostsOriginValidator
+from messaging.middleware import JWTAuthMiddleware
+import messaging.routing
+from matching.consumers import SuggestionDeckConsumer
+from matching.deck import DECK_CHANNEL
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AllowedHostsOriginValidator(
         AuthMiddlewareStack(
-            URLRouter(
-                messaging.routing.websocket_urlpatterns
+            JWTAuthMiddleware(
+                URLRouter(
+                    messaging.routing.websocket_urlpatterns
+                )
             )
         )
     ),
+    "channel": ChannelNameRouter({
+        DECK_CHANNEL: SuggestionDeckConsumer.as_asgi(),
+    }),
 })
@@ -0,0 +1,188 @@
+"""
+Ranked full-text search over free-text columns.
+
+A ``FullTextIndex`` covers some text columns of one table. On SQLite it is
+an external-content FTS5 table kept in sync by triggers; on PostgreSQL it
+is a GIN index over the columns' ``tsvector``. Migrations create it with
+``create`` and drop it with ``drop``, and ``search`` returns matching ids
+best first on either backend.
+
+Queries are reduced to their words, so user input can never be parsed as
+search syntax: every word must match and the last one may be a prefix.
+
+On SQLite, Django applies most ``AlterField`` and every ``RemoveField`` by
+copying the table to a new one, which silently drops its triggers. A
+migration that does so on an indexed table must call ``restore_triggers``
+afterwards; the ``fulltext.E001`` system check (``manage.py check
+--database default``) reports indexes whose triggers are gone.
+"""
+import re
+
+from django.core import checks
+from django.db import NotSupportedError, connection, connections
+
+SEARCH_RESULT_LIMIT = 1000
+SEARCH_CONFIG = 'english'
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    """Split a user query into the words to search for"""
+    return _WORD.findall(query or '')
+
+
+# Every index defined, checked by check_full_text_triggers
+_indexes = {}
+
+
+class FullTextIndex:
+    def __init__(self, table, fields, pk='id'):
+        self.table = table
+        self.fields = list(fields)
+        self.pk = pk
+        _indexes[self.name] = self
+
+    @property
+    def name(self):
+        return f'{self.table}_fts'
+
+    def _document(self):
+        # Must stay identical to the indexed expression for PostgreSQL to use the index
+        columns = " || ' ' || ".join(f"coalesce({field}, '')" for field in self.fields)
+        return f"to_tsvector('{SEARCH_CONFIG}', {columns})"
+
+    def _trigger_names(self):
+        return [f'{self.name}_{trigger}' for trigger in ('insert', 'delete', 'update')]
+
+    def _sqlite_triggers(self):
+        # Dropped along with the table whenever Django rebuilds it (see the
+        # module docstring); restore_triggers puts them back
+        columns = ', '.join(self.fields)
+        new_values = ', '.join(f'new.{field}' for field in self.fields)
+        old_values = ', '.join(f'old.{field}' for field in self.fields)
+        remove = (
+            f"INSERT INTO {self.name}({self.name}, rowid, {columns}) "
+            f"VALUES ('delete', old.{self.pk}, {old_values});"
+        )
+        add = f'INSERT INTO {self.name}(rowid, {columns}) VALUES (new.{self.pk}, {new_values});'
+        insert, delete, update = self._trigger_names()
+        return [
+            f'CREATE TRIGGER {insert} AFTER INSERT ON {self.table} BEGIN {add} END',
+            f'CREATE TRIGGER {delete} AFTER DELETE ON {self.table} BEGIN {remove} END',
+            f'CREATE TRIGGER {update} AFTER UPDATE OF {columns} ON {self.table} BEGIN {remove} {add} END',
+        ]
+
+    def _sqlite_statements(self):
+        columns = ', '.join(self.fields)
+        return [
+            f"CREATE VIRTUAL TABLE {self.name} USING fts5({columns}, content='{self.table}', "
+            f"content_rowid='{self.pk}', tokenize='porter unicode61')",
+            *self._sqlite_triggers(),
+            f"INSERT INTO {self.name}({self.name}) VALUES ('rebuild')",
+        ]
+
+    def create(self, schema_editor):
+        """Create the index for the database ``schema_editor`` works on"""
+        vendor = schema_editor.connection.vendor
+        if vendor == 'sqlite':
+            statements = self._sqlite_statements()
+        elif vendor == 'postgresql':
+            statements = [f'CREATE INDEX {self.name} ON {self.table} USING GIN (({self._document()}))']
+        else:
+            statements = []  # search() is unsupported there
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    def drop(self, schema_editor):
+        """Drop the index created by ``create``"""
+        vendor = schema_editor.connection.vendor
+        if vendor == 'sqlite':
+            for trigger in self._trigger_names():
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {self.name}')
+        elif vendor == 'postgresql':
+            schema_editor.execute(f'DROP INDEX IF EXISTS {self.name}')
+
+    def restore_triggers(self, schema_editor):
+        """
+        Recreate the SQLite triggers after a migration rebuilt the table.
+
+        Rows written in between are picked up by rebuilding the index.
+        """
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for trigger in self._trigger_names():
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        for statement in self._sqlite_triggers():
+            schema_editor.execute(statement)
+        schema_editor.execute(f"INSERT INTO {self.name}({self.name}) VALUES ('rebuild')")
+
+    def missing_triggers(self, using='default'):
+        """Return the names of the SQLite triggers missing from an existing index"""
+        db = connections[using]
+        if db.vendor != 'sqlite':
+            return []
+        with db.cursor() as cursor:
+            cursor.execute("SELECT type, name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)", [
+                self.name, *self._trigger_names(),
+            ])
+            found = {name: kind for kind, name in cursor.fetchall()}
+        if self.name not in found:
+            return []  # Not created yet
+        return [trigger for trigger in self._trigger_names() if found.get(trigger) != 'trigger']
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT, within=None):
+        """
+        Return ``[(id, rank)]`` of rows matching ``query``, best match first.
+
+        ``within`` is a queryset of the indexed table's model. Only its rows
+        are searched, so ``limit`` counts rows that pass its filters.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return []
+        restrict, restrict_params = '', []
+        if within is not None:
+            subquery, restrict_params = within.values('pk').query.sql_with_params()
+
+        if connection.vendor == 'sqlite':
+            # Quoted words are literal; bm25 is lower for better matches
+            match = ' '.join(f'"{term}"' for term in terms) + '*'
+            if within is not None:
+                restrict = f'AND rowid IN ({subquery}) '
+            sql = (
+                f'SELECT rowid, -bm25({self.name}) FROM {self.name} '
+                f'WHERE {self.name} MATCH %s {restrict}ORDER BY bm25({self.name}) LIMIT %s'
+            )
+        elif connection.vendor == 'postgresql':
+            match = ' & '.join(terms) + ':*'
+            if within is not None:
+                restrict = f'AND {self.pk} IN ({subquery}) '
+            sql = (
+                f"SELECT {self.pk}, ts_rank({self._document()}, query) "
+                f"FROM {self.table}, to_tsquery('{SEARCH_CONFIG}', %s) query "
+                f"WHERE {self._document()} @@ query {restrict}ORDER BY 2 DESC, {self.pk} LIMIT %s"
+            )
+        else:
+            raise NotSupportedError(f'Full-text search is not available on {connection.vendor}')
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [match, *restrict_params, limit])
+            return [(row_id, float(rank)) for row_id, rank in cursor.fetchall()]
+
+
+@checks.register(checks.Tags.database)
+def check_full_text_triggers(app_configs=None, databases=None, **kwargs):
+    errors = []
+    for alias in databases or []:
+        for index in _indexes.values():
+            missing = index.missing_triggers(alias)
+            if missing:
+                errors.append(checks.Error(
+                    f'Full-text index {index.name} is missing its triggers {", ".join(missing)} '
+                    f'on database {alias!r}, so it no longer follows changes to {index.table}.',
+                    hint='A migration rebuilt the table; call restore_triggers() on the index in a later migration.',
+                    id='fulltext.E001',
+                ))
+    return errors
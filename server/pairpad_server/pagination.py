@@ -0,0 +1,34 @@
+"""
+Opaque cursors for keyset pagination.
+
+A cursor is the sort key of the last item on a page, serialized as
+URL-safe base64 JSON so clients can pass it back unchanged.
+"""
+import base64
+import json
+
+
+def encode_cursor(*values):
+    """Encode the sort key values of the last returned item"""
+    payload = json.dumps(list(values), separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    """
+    Decode a cursor produced by ``encode_cursor`` into a list of ``length`` values.
+
+    Returns None for an empty cursor and raises ValueError for a malformed one.
+    """
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError('Invalid cursor')
+    return values
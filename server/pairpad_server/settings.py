@@ -165,6 +165,9 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Cursor pagination headers readable by the frontend
+CORS_EXPOSE_HEADERS = ['X-Next-Cursor']
+
 # Channels Configuration
 ASGI_APPLICATION = 'pairpad_server.asgi.application'
 
@@ -177,5 +180,16 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache (shared dashboard snapshots); use Redis when configured so every
+# worker sees the same snapshots and invalidations
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_CACHE_URL'),
+    } if os.getenv('REDIS_CACHE_URL') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 # Custom User Model
 AUTH_USER_MODEL = 'authentication.User'
@@ -0,0 +1,53 @@
+"""
+Compact encoding of lifestyle assessment answers.
+
+``PersonalityProfile.lifestyle_data`` holds the raw answers as JSON. On
+save, they are also encoded into ``lifestyle_codes``: one byte per question
+in ``LIFESTYLE_CHOICES`` order, holding the answer's 1-based position in
+that question's choices. Scoring can then work on small integer arrays
+instead of walking the JSON dict for every pair.
+"""
+
+# Answer choices per question, in the order offered by the assessment.
+# Codes are positional, so only ever append new choices.
+LIFESTYLE_CHOICES = {
+    'early_bird': ['early_bird', 'balanced', 'night_owl'],
+    'cooking_frequency': ['daily', 'few_times_week', 'rarely', 'never'],
+    'hosting_visitors': ['frequently', 'occasionally', 'rarely', 'never'],
+    'smoking_drinking': ['both', 'drink_only', 'smoke_only', 'neither'],
+    'noise_preference': ['very_quiet', 'moderate', 'dont_mind'],
+    'chore_frequency': ['daily', 'weekly', 'as_needed', 'rarely'],
+    'sharing_items': ['happy_to_share', 'some_items', 'prefer_separate'],
+    'bill_splitting': ['equally', 'by_usage', 'flexible'],
+    'cost_sharing': ['yes_all', 'some_items', 'no_separate'],
+    'bill_payment': ['very_strict', 'usually_on_time', 'flexible'],
+    'roommate_relationship': ['close_friends', 'friendly', 'cotenants'],
+    'group_activities': ['love_it', 'occasionally', 'rarely', 'prefer_not'],
+    'gender_preference': ['any_gender', 'same_gender', 'specific'],
+    'pets': ['have_pets', 'love_pets', 'okay_with_pets', 'no_pets', 'allergic'],
+    'allergies': ['none', 'dust', 'pets', 'food', 'multiple'],
+    'ideal_personality': ['quiet_respectful', 'social_outgoing', 'independent', 'collaborative'],
+}
+
+LIFESTYLE_MISSING = 0  # question not answered
+LIFESTYLE_OTHER = 255  # answer outside the known choices; read it from lifestyle_data
+
+_CODES = {
+    question: {answer: code for code, answer in enumerate(choices, start=1)}
+    for question, choices in LIFESTYLE_CHOICES.items()
+}
+
+
+def encode_lifestyle(lifestyle_data):
+    """Encode lifestyle answers as bytes, or b'' when there are none"""
+    if not lifestyle_data or not isinstance(lifestyle_data, dict):
+        return b''
+
+    codes = []
+    for question, choices in _CODES.items():
+        if question not in lifestyle_data:
+            codes.append(LIFESTYLE_MISSING)
+        else:
+            answer = lifestyle_data[question]
+            codes.append(choices.get(answer, LIFESTYLE_OTHER) if isinstance(answer, str) else LIFESTYLE_OTHER)
+    return bytes(codes)
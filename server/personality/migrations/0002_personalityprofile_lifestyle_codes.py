@@ -0,0 +1,67 @@
+# Generated by Django 5.2.6 on 2026-10-17 04:24
+
+from django.db import migrations, models
+
+# Frozen copy of personality.lifestyle as of this migration, so that later
+# changes to the live encoding can't change what it does
+LIFESTYLE_CHOICES = {
+    'early_bird': ['early_bird', 'balanced', 'night_owl'],
+    'cooking_frequency': ['daily', 'few_times_week', 'rarely', 'never'],
+    'hosting_visitors': ['frequently', 'occasionally', 'rarely', 'never'],
+    'smoking_drinking': ['both', 'drink_only', 'smoke_only', 'neither'],
+    'noise_preference': ['very_quiet', 'moderate', 'dont_mind'],
+    'chore_frequency': ['daily', 'weekly', 'as_needed', 'rarely'],
+    'sharing_items': ['happy_to_share', 'some_items', 'prefer_separate'],
+    'bill_splitting': ['equally', 'by_usage', 'flexible'],
+    'cost_sharing': ['yes_all', 'some_items', 'no_separate'],
+    'bill_payment': ['very_strict', 'usually_on_time', 'flexible'],
+    'roommate_relationship': ['close_friends', 'friendly', 'cotenants'],
+    'group_activities': ['love_it', 'occasionally', 'rarely', 'prefer_not'],
+    'gender_preference': ['any_gender', 'same_gender', 'specific'],
+    'pets': ['have_pets', 'love_pets', 'okay_with_pets', 'no_pets', 'allergic'],
+    'allergies': ['none', 'dust', 'pets', 'food', 'multiple'],
+    'ideal_personality': ['quiet_respectful', 'social_outgoing', 'independent', 'collaborative'],
+}
+LIFESTYLE_MISSING = 0
+LIFESTYLE_OTHER = 255
+
+
+def encode_lifestyle(lifestyle_data):
+    if not lifestyle_data or not isinstance(lifestyle_data, dict):
+        return b''
+
+    codes = []
+    for question, choices in LIFESTYLE_CHOICES.items():
+        if question not in lifestyle_data:
+            codes.append(LIFESTYLE_MISSING)
+        else:
+            answer = lifestyle_data[question]
+            if isinstance(answer, str) and answer in choices:
+                codes.append(choices.index(answer) + 1)
+            else:
+                codes.append(LIFESTYLE_OTHER)
+    return bytes(codes)
+
+
+def encode_existing_lifestyle_data(apps, schema_editor):
+    PersonalityProfile = apps.get_model('personality', 'PersonalityProfile')
+    profiles = list(PersonalityProfile.objects.only('id', 'lifestyle_data'))
+    for profile in profiles:
+        profile.lifestyle_codes = encode_lifestyle(profile.lifestyle_data)
+    PersonalityProfile.objects.bulk_update(profiles, ['lifestyle_codes'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personality', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='personalityprofile',
+            name='lifestyle_codes',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.RunPython(encode_existing_lifestyle_data, migrations.RunPython.noop),
+    ]
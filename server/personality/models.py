@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .lifestyle import encode_lifestyle
+
 User = get_user_model()
 
 class PersonalityProfile(models.Model):
@@ -36,6 +38,8 @@ class PersonalityProfile(models.Model):
 
     # Complete lifestyle data as JSON
     lifestyle_data = models.JSONField(default=dict, blank=True)
+    # lifestyle_data encoded for scoring, kept in step on save (see personality.lifestyle)
+    lifestyle_codes = models.BinaryField(default=b'', blank=True)
 
     # Assessment metadata
     completed_at = models.DateTimeField(auto_now_add=True)
@@ -44,6 +48,13 @@ class PersonalityProfile(models.Model):
     def __str__(self):
         return f"Personality Profile for {self.user.username}"
 
+    def save(self, *args, **kwargs):
+        self.lifestyle_codes = encode_lifestyle(self.lifestyle_data)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'lifestyle_data' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'lifestyle_codes'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Personality Profile"
         verbose_name_plural = "Personality Profiles"